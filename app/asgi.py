@@ -84,3 +84,15 @@ def startup_event():
     # Pre-load AI models in background for faster task processing
     from app.services.model_manager import setup_model_preloading
     setup_model_preloading(models=["sentence_transformer", "clip"])
+
+    # Keep the offline material library index current
+    if config.app.get("library_directory", ""):
+        from app.services.material_library import MaterialLibrary
+        try:
+            MaterialLibrary.get_instance().start_indexer()
+        except ValueError as e:
+            logger.warning(f"material library disabled: {str(e)}")
+
+    # Pre-download popular terms during off-peak hours (no-op unless enabled)
+    from app.services.cache_warmer import CacheWarmer
+    CacheWarmer.get_instance().start()
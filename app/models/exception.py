@@ -26,3 +26,7 @@ class HttpException(Exception):
 
 class FileNotFoundException(Exception):
     pass
+
+
+class DownloadCancelledException(Exception):
+    pass
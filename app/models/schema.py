@@ -53,6 +53,8 @@ class MaterialInfo:
     url: str = ""
     duration: int = 0
     search_term: str = ""
+    size: int = 0  # Expected file size in bytes (0 = unknown), used to schedule downloads
+    score: float = 0.0  # Relevance in a federated result pool (higher is better)
     # Image data for similarity comparison
     thumbnail_url: str = ""  # Main thumbnail image
     preview_images: list = None  # List of preview frame URLs
@@ -121,6 +123,7 @@ class VideoParams(BaseModel):
     max_video_reuse: Optional[int] = 1  # Reduced from 2 to prevent duplicates
     search_pool_size: Optional[int] = 100  # Increased from 50 for more video choices
     semantic_model: Optional[str] = "all-mpnet-base-v2"
+    semantic_assignment: Optional[str] = "greedy"  # "greedy" (segment by segment) or "global" (whole-script solver, opt-in)
     
     # Image similarity settings (only when semantic mode is enabled)
     enable_image_similarity: Optional[bool] = True  # Enable by default for better visual matching
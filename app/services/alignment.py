@@ -0,0 +1,198 @@
+"""
+Forced alignment - word timings for a known script against its audio.
+
+Benefits:
+- No ASR decode: the script is aligned directly against the frame-level
+  character posteriors of a CTC acoustic model (wav2vec2, loaded through
+  whisperx.load_align_model), so there is no transcription to validate or
+  correct against the script afterwards
+- One Viterbi pass over the whole recording; long audio is run through the
+  acoustic model in windows and the log-probabilities are concatenated
+- Alignment models are loaded once per (language, device)
+
+Usage:
+    words = align_file(audio_file, script, language="en")
+    # [("Hello", 0.12, 0.48), ("world.", 0.52, 0.97), ...]
+"""
+
+import re
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+from loguru import logger
+
+try:
+    import torch
+    import whisperx
+
+    ALIGNMENT_AVAILABLE = True
+except ImportError:
+    ALIGNMENT_AVAILABLE = False
+
+SAMPLE_RATE = 16000
+# Audio per acoustic-model forward pass (attention cost grows with the square of the length)
+WINDOW_SECONDS = 30
+
+# whisperx aligns these per character, everything else per space-separated word
+LANGUAGES_WITHOUT_SPACES = {"ja", "zh"}
+
+_CJK_PATTERN = re.compile(r"[一-鿿㐀-䶿]")
+_KANA_PATTERN = re.compile(r"[぀-ヿ]")
+_HANGUL_PATTERN = re.compile(r"[가-힯]")
+
+# Alignment models per (language, device)
+_align_models: Dict[Tuple[str, str], tuple] = {}
+_align_models_lock = threading.Lock()
+
+
+def get_align_model(language: str, device: str):
+    """Alignment model and its metadata, loaded once per (language, device)."""
+    key = (language, device)
+    with _align_models_lock:
+        if key not in _align_models:
+            logger.info(f"Loading alignment model: {language} on {device}")
+            _align_models[key] = whisperx.load_align_model(language_code=language, device=device)
+        return _align_models[key]
+
+
+def guess_language(text: str, voice_name: str = "") -> str:
+    """Language code for alignment: the locale of Azure/Edge voices, else guessed from the script."""
+    match = re.match(r"^([a-z]{2,3})-[A-Z]{2}-", voice_name or "")
+    if match:
+        return match.group(1)
+    if _KANA_PATTERN.search(text):
+        return "ja"
+    if _CJK_PATTERN.search(text):
+        return "zh"
+    if _HANGUL_PATTERN.search(text):
+        return "ko"
+    return "en"
+
+
+def split_words(text: str, language: str) -> List[str]:
+    if language in LANGUAGES_WITHOUT_SPACES:
+        return [char for char in text if not char.isspace()]
+    return text.split()
+
+
+def ctc_forced_align(log_probs: np.ndarray, targets: List[int], blank: int = 0) -> List[Tuple[int, int]]:
+    """
+    Viterbi alignment of a token sequence against CTC log-probabilities (frames x vocab).
+
+    Returns (first_frame, last_frame + 1) for every target token. Raises
+    ValueError when the audio has too few frames for the tokens.
+    """
+    num_frames = log_probs.shape[0]
+    # blank-interleaved label sequence: _ y1 _ y2 _ ... yL _
+    labels = np.full(2 * len(targets) + 1, blank, dtype=np.int64)
+    labels[1::2] = targets
+    states = len(labels)
+    # skipping a blank is allowed between two different tokens
+    can_skip = np.zeros(states, dtype=bool)
+    can_skip[3::2] = labels[3::2] != labels[1:-2:2]
+
+    emissions = log_probs[:, labels]
+    alpha = np.full(states, -np.inf)
+    alpha[:2] = emissions[0, :2]
+    backpointers = np.zeros((num_frames, states), dtype=np.uint8)
+    for t in range(1, num_frames):
+        stay = alpha
+        step = np.concatenate(([-np.inf], alpha[:-1]))
+        skip = np.where(can_skip, np.concatenate(([-np.inf, -np.inf], alpha[:-2])), -np.inf)
+        candidates = np.stack((stay, step, skip))
+        choice = np.argmax(candidates, axis=0)
+        backpointers[t] = choice
+        alpha = candidates[choice, np.arange(states)] + emissions[t]
+
+    end_states = [states - 1, states - 2] if states > 1 else [0]
+    state = max(end_states, key=lambda s: alpha[s])
+    if not np.isfinite(alpha[state]):
+        raise ValueError(f"cannot align {len(targets)} tokens to {num_frames} frames")
+
+    spans = [[-1, -1] for _ in targets]
+    for t in range(num_frames - 1, -1, -1):
+        if state % 2 == 1:
+            span = spans[state // 2]
+            span[0] = t
+            if span[1] < 0:
+                span[1] = t + 1
+        state -= int(backpointers[t, state])
+    return [tuple(span) for span in spans]
+
+
+def _emissions(audio: np.ndarray, model, metadata: Dict, device: str) -> np.ndarray:
+    """Log-probabilities per ~20ms frame over the whole recording."""
+    window = WINDOW_SECONDS * SAMPLE_RATE
+    bounds = list(range(0, len(audio), window))
+    if len(bounds) > 1 and len(audio) - bounds[-1] < SAMPLE_RATE:
+        # a too short tail is folded into the previous window
+        bounds.pop()
+    bounds.append(len(audio))
+
+    frames = []
+    with torch.inference_mode():
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            waveform = torch.from_numpy(np.ascontiguousarray(audio[start:end], dtype=np.float32))[None].to(device)
+            if metadata.get("type") == "torchaudio":
+                logits, _ = model(waveform)
+            else:
+                logits = model(waveform).logits
+            frames.append(torch.log_softmax(logits, dim=-1)[0].float().cpu().numpy())
+    return np.concatenate(frames)
+
+
+def align_words(audio: np.ndarray, text: str, language: str, device: str = "cpu") -> List[Tuple[str, float, float]]:
+    """
+    (word, start, end) in seconds for every word of text, aligned against
+    16kHz mono audio. Words the acoustic model has no characters for (digits,
+    symbols) take the gap between their neighbours.
+    """
+    words = split_words(text, language)
+    if not words:
+        return []
+    model, metadata = get_align_model(language, device)
+    dictionary = {char.lower(): index for char, index in metadata["dictionary"].items()}
+    blank = dictionary.get("[pad]", dictionary.get("<pad>", 0))
+    separator = dictionary.get("|") if language not in LANGUAGES_WITHOUT_SPACES else None
+
+    targets = []
+    owners = []  # word index per target token, -1 for separators
+    for index, word in enumerate(words):
+        if targets and separator is not None:
+            targets.append(separator)
+            owners.append(-1)
+        for char in word.lower():
+            if char in dictionary and dictionary[char] != blank:
+                targets.append(dictionary[char])
+                owners.append(index)
+    if not any(owner >= 0 for owner in owners):
+        raise ValueError("no alignable characters in text")
+
+    log_probs = _emissions(audio, model, metadata, device)
+    spans = ctc_forced_align(log_probs, targets, blank)
+    seconds_per_frame = len(audio) / SAMPLE_RATE / log_probs.shape[0]
+
+    timings: List[List[float]] = [[None, None] for _ in words]
+    for owner, (first, last) in zip(owners, spans):
+        if owner < 0:
+            continue
+        timing = timings[owner]
+        timing[0] = first * seconds_per_frame if timing[0] is None else timing[0]
+        timing[1] = last * seconds_per_frame
+
+    # words without alignable characters sit between their neighbours
+    previous_end = 0.0
+    for index, timing in enumerate(timings):
+        if timing[0] is None:
+            next_start = next((t[0] for t in timings[index + 1:] if t[0] is not None), None)
+            timing[0] = previous_end
+            timing[1] = next_start if next_start is not None else len(audio) / SAMPLE_RATE
+            timing[1] = max(timing[0], timing[1])
+        previous_end = timing[1]
+    return [(word, round(start, 3), round(end, 3)) for word, (start, end) in zip(words, timings)]
+
+
+def align_file(audio_file: str, text: str, language: str, device: str = "cpu") -> List[Tuple[str, float, float]]:
+    """align_words for an audio file (decoded and resampled to 16kHz mono by ffmpeg)."""
+    return align_words(whisperx.load_audio(audio_file), text, language, device)
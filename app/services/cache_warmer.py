@@ -0,0 +1,262 @@
+"""
+CacheWarmer - pre-downloads footage for popular search terms during off-peak hours.
+
+Benefits:
+- Term popularity comes from the script.json (search terms + params) of past
+  tasks, recent tasks weigh more
+- Top-N terms per video aspect are searched and downloaded into the material cache
+  before peak-time tasks ask for them
+- Runs only inside configured hour windows, one download at a time, under a
+  bandwidth cap, and stops before it would push the cache over its quota
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from loguru import logger
+
+from app.config import config
+from app.models.schema import VideoAspect
+from app.utils import utils
+
+# Older tasks count less: a task's weight halves every this many days
+_half_life_days = 14
+
+# How often the background thread checks whether it may run
+_poll_seconds = 300
+
+# Terms warmed within this many hours are not warmed again
+_rewarm_hours = 24
+
+STATE_FILE = "cache_warmer.json"
+
+
+def parse_hour_windows(spec: str) -> List[Tuple[int, int]]:
+    """Parse "1-6,13-14" into [(1, 6), (13, 14)] (end hour exclusive, may wrap past midnight)."""
+    windows = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        windows.append((int(start) % 24, int(end or int(start) + 1) % 24))
+    return windows
+
+
+def in_hour_windows(windows: List[Tuple[int, int]], hour: int) -> bool:
+    for start, end in windows:
+        if start < end and start <= hour < end:
+            return True
+        if start >= end and (hour >= start or hour < end):
+            return True
+    return False
+
+
+def collect_term_frequency(tasks_dir: str = "", now: float = None) -> Dict[str, Dict[str, float]]:
+    """
+    Score search terms per video aspect from past tasks' script.json files.
+
+    script.json is the task history used here: it holds the generated search
+    terms next to the task params. The state store is not read, since it
+    keeps only each task's state, progress and results (no params, no
+    timestamps) and the memory backend loses them on restart.
+
+    Returns {aspect: {term: score}} where each task adds a weight that decays
+    with its age (half-life of _half_life_days).
+    """
+    tasks_dir = tasks_dir or utils.task_dir()
+    now = now or time.time()
+    frequency: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for script_file in glob.glob(os.path.join(tasks_dir, "*", "script.json")):
+        try:
+            with open(script_file, "r", encoding="utf-8") as f:
+                script_data = json.load(f)
+            age_days = max(0.0, now - os.path.getmtime(script_file)) / 86400
+        except Exception as e:
+            logger.debug(f"skipping unreadable {script_file}: {str(e)}")
+            continue
+        terms = script_data.get("search_terms") or []
+        params = script_data.get("params") or {}
+        if isinstance(terms, str):
+            terms = [t.strip() for t in terms.split(",")]
+        if params.get("video_source", "pexels") in ("local", "library"):
+            continue
+        aspect = params.get("video_aspect") or VideoAspect.portrait.value
+        weight = 0.5 ** (age_days / _half_life_days)
+        for term in terms:
+            term = str(term).strip().lower()
+            if term:
+                frequency[aspect][term] += weight
+    return {aspect: dict(terms) for aspect, terms in frequency.items()}
+
+
+class CacheWarmer:
+    """
+    Background job that keeps the material cache warm for popular terms.
+
+    Usage:
+        CacheWarmer.get_instance().start()   # no-op unless cache_warmer_enabled
+        CacheWarmer.get_instance().run_once(force=True)
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.top_terms = int(config.app.get("cache_warmer_top_terms", 20))
+        self.clips_per_term = int(config.app.get("cache_warmer_clips_per_term", 5))
+        self.max_mbps = float(config.app.get("cache_warmer_max_mbps", 20))
+        self.hour_windows = parse_hour_windows(config.app.get("cache_warmer_hours", "1-6"))
+        self.quota_fraction = float(config.app.get("cache_warmer_quota_fraction", 0.8))
+        self.clip_duration = int(config.app.get("cache_warmer_clip_duration", 5))
+        self.state_path = os.path.join(utils.storage_dir("cache_videos", create=True), STATE_FILE)
+        self._thread = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def get_instance(cls) -> "CacheWarmer":
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = CacheWarmer()
+        return cls._instance
+
+    def start(self) -> "CacheWarmer":
+        if not config.app.get("cache_warmer_enabled", False):
+            return self
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="CacheWarmer")
+                self._thread.start()
+                logger.info(f"🔥 cache warmer started (hours {config.app.get('cache_warmer_hours', '1-6')})")
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"❌ cache warming failed: {str(e)}")
+            self._stop.wait(_poll_seconds)
+
+    def _off_peak(self) -> bool:
+        return in_hour_windows(self.hour_windows, datetime.now().hour)
+
+    def _load_state(self) -> Dict[str, float]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _save_state(self, state: Dict[str, float]):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _room_in_quota(self, cache, expected_size: float) -> bool:
+        if cache.max_size <= 0:
+            return True
+        stats = cache.get_stats()
+        return stats["total_size"] + expected_size <= cache.max_size * self.quota_fraction
+
+    def _throttle(self, size: int, elapsed: float):
+        """Sleep so the average download rate stays under cache_warmer_max_mbps."""
+        if self.max_mbps <= 0 or size <= 0:
+            return
+        minimum = size * 8 / (self.max_mbps * 1_000_000)
+        if minimum > elapsed:
+            self._stop.wait(minimum - elapsed)
+
+    def run_once(self, force: bool = False) -> int:
+        """Warm the top terms for every aspect. Returns the number of clips downloaded."""
+        from app.services import material
+        from app.services.material_cache import MaterialCache
+
+        if not force and not self._off_peak():
+            return 0
+        source = config.app.get("video_source", "pexels")
+        if source not in ("pexels", "pixabay", "federated"):
+            return 0
+
+        cache_dir = config.app.get("material_directory", "").strip()
+        if cache_dir == "task" or (cache_dir and not os.path.isdir(cache_dir)):
+            cache_dir = ""
+        cache_dir = cache_dir or utils.storage_dir("cache_videos", create=True)
+        cache = MaterialCache.get_instance(cache_dir)
+
+        state = self._load_state()
+        now = time.time()
+        downloaded = 0
+        for aspect, terms in collect_term_frequency(now=now).items():
+            ranked = sorted(terms, key=terms.get, reverse=True)[:self.top_terms]
+            for term in ranked:
+                state_key = f"{aspect}|{term}"
+                if now - state.get(state_key, 0) < _rewarm_hours * 3600:
+                    continue
+                if self._stop.is_set() or (not force and not self._off_peak()):
+                    self._save_state(state)
+                    return downloaded
+                count, quota_reached = self._warm_term(material, cache, cache_dir, source, term, VideoAspect(aspect))
+                downloaded += count
+                if quota_reached:
+                    logger.info(
+                        f"🔥 cache warmer stopped: material cache is close to its quota ({downloaded} clips downloaded)"
+                    )
+                    self._save_state(state)
+                    return downloaded
+                state[state_key] = now
+        self._save_state(state)
+        if downloaded:
+            logger.success(f"🔥 cache warmer downloaded {downloaded} clips")
+        return downloaded
+
+    def _warm_term(
+        self, material, cache, cache_dir: str, source: str, term: str, aspect: VideoAspect
+    ) -> Tuple[int, bool]:
+        """Make sure clips_per_term clips are cached for a term.
+
+        Returns (new downloads, whether the quota stopped warming).
+        """
+        partial = config.app.get("partial_download", False)
+        videos_by_term = material.search_materials([term], source, aspect, self.clip_duration)
+        items = material.schedule_downloads(videos_by_term.get(term, []), self.clip_duration, partial)
+        count = 0
+        fetched = 0
+        quota_reached = False
+        for item in items:
+            if count >= self.clips_per_term or self._stop.is_set():
+                break
+            if item.provider in ("cache", "library") or cache.has_url(item.url):
+                count += 1
+                continue
+            # partial downloads only store the window
+            if not self._room_in_quota(cache, material.expected_download_size(item, self.clip_duration, partial)):
+                quota_reached = True
+                break
+            start_time = time.time()
+            path = material.save_video(
+                video_url=item.url,
+                save_dir=cache_dir,
+                search_term=term,
+                thumbnail_url=item.thumbnail_url,
+                preview_images=item.preview_images,
+                window_duration=self.clip_duration,
+            )
+            if path:
+                count += 1
+                fetched += 1
+                self._throttle(os.path.getsize(path), time.time() - start_time)
+        logger.info(f"🔥 warmed '{term}' ({aspect.value}): {count} clips cached, {fetched} new")
+        return fetched, quota_reached
@@ -0,0 +1,369 @@
+"""
+EmbeddingStore - disk-backed embeddings shared by tasks and worker processes.
+
+Benefits:
+- One partition per model and kind (storage/embeddings/<model> for texts,
+  <model>-image for images), so vectors of different spaces never mix
+- Vectors live in a memory-mapped float16 matrix, a SQLite index maps the
+  content hash to its row
+- Aliases map other names (e.g. image URLs) to a content hash, so the same
+  image served under several CDN URLs is embedded once
+- Appends are serialised across processes with a file lock; readers never block
+- LRU compaction keeps the most recently used rows once the partition is full;
+  read accesses are collected in memory and written with the next append,
+  compaction or at most every _touch_flush_interval seconds
+
+Usage:
+    store = EmbeddingStore.get_instance("all-mpnet-base-v2")
+    vectors = store.encode(["business meeting", "sunset"], lambda texts: model.encode(texts))
+
+    images = EmbeddingStore.get_instance("clip-vit-base-patch32", kind="image")
+    images.put_keys([content_key(data)], vectors)
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.config import config
+from app.utils import utils
+
+# Rows added per growth of the vector file
+_grow_rows = 1024
+
+# Compaction keeps this fraction of max_entries (most recently used first)
+_compact_keep = 0.8
+
+# Seconds between writes of batched read accesses (LRU state)
+_touch_flush_interval = 60
+
+# Keys per "IN (...)" query, below SQLite's bound-parameter limit
+_query_chunk = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    row INTEGER NOT NULL,
+    last_access REAL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT PRIMARY KEY,
+    key TEXT NOT NULL
+);
+"""
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def content_key(data: bytes) -> str:
+    """Store key for binary content (images are keyed by the SHA-256 of their bytes)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class EmbeddingStore:
+    """Persistent key -> vector store for one embedding model and kind (one instance each)."""
+
+    _instances: Dict[Tuple[str, str], "EmbeddingStore"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model_name: str, store_dir: str = "", kind: str = "text"):
+        self.model_name = model_name
+        self.kind = kind
+        partition = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        if kind != "text":
+            partition = f"{partition}-{kind}"
+        self.store_dir = store_dir or os.path.join(utils.storage_dir("embeddings", create=True), partition)
+        os.makedirs(self.store_dir, exist_ok=True)
+        self.db_path = os.path.join(self.store_dir, "index.db")
+        self.lock_path = os.path.join(self.store_dir, "store.lock")
+        self.max_entries = int(config.app.get("embedding_store_max_entries", 200000))
+
+        self._local_lock = threading.Lock()
+        self._memmap: Optional[np.memmap] = None
+        self._mapped_generation = -1
+        self._hits = 0
+        self._misses = 0
+        # key -> last read time, not yet written to the index
+        self._touches: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @classmethod
+    def get_instance(cls, model_name: str, kind: str = "text") -> "EmbeddingStore":
+        if (model_name, kind) not in cls._instances:
+            with cls._lock:
+                if (model_name, kind) not in cls._instances:
+                    cls._instances[(model_name, kind)] = EmbeddingStore(model_name, kind=kind)
+        return cls._instances[(model_name, kind)]
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _meta(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        meta = {k: int(v) for k, v in conn.execute("SELECT key, value FROM meta")}
+        meta.setdefault("dim", 0)
+        meta.setdefault("rows", 0)
+        meta.setdefault("capacity", 0)
+        meta.setdefault("generation", 0)
+        return meta
+
+    def _set_meta(self, conn: sqlite3.Connection, **values):
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [(k, str(v)) for k, v in values.items()]
+        )
+
+    def _vectors_path(self, generation: int) -> str:
+        return os.path.join(self.store_dir, f"vectors.{generation}.f16")
+
+    def _map(self, meta: Dict[str, int]) -> Optional[np.memmap]:
+        """Memory-map the current vector file (remapped after growth or compaction)."""
+        if not meta["dim"] or not meta["capacity"]:
+            return None
+        with self._local_lock:
+            mapped = self._memmap
+            if (
+                mapped is None
+                or self._mapped_generation != meta["generation"]
+                or mapped.shape[0] < meta["capacity"]
+            ):
+                mapped = np.memmap(
+                    self._vectors_path(meta["generation"]),
+                    dtype=np.float16,
+                    mode="r+",
+                    shape=(meta["capacity"], meta["dim"]),
+                )
+                self._memmap = mapped
+                self._mapped_generation = meta["generation"]
+            return mapped
+
+    # ========================================================================
+    # LOOKUP & STORE
+    # ========================================================================
+
+    def _find_rows(self, conn: sqlite3.Connection, keys: List[str]) -> Dict[str, int]:
+        rows = {}
+        for i in range(0, len(keys), _query_chunk):
+            chunk = keys[i:i + _query_chunk]
+            placeholders = ",".join("?" * len(chunk))
+            rows.update(conn.execute(f"SELECT key, row FROM embeddings WHERE key IN ({placeholders})", chunk))
+        return rows
+
+    def _record_touches(self, keys):
+        now = time.time()
+        with self._local_lock:
+            for key in keys:
+                self._touches[key] = now
+            due = time.monotonic() - self._last_flush >= _touch_flush_interval
+        if due:
+            try:
+                with self._connect() as conn:
+                    self._flush_touches(conn)
+            except sqlite3.Error as e:
+                # kept in memory and written with the next append
+                logger.debug(f"embedding store access flush deferred: {str(e)}")
+
+    def _flush_touches(self, conn: sqlite3.Connection):
+        """Write the batched read accesses (rows dropped meanwhile are simply not updated)."""
+        with self._local_lock:
+            touches, self._touches = self._touches, {}
+            self._last_flush = time.monotonic()
+        if touches:
+            try:
+                conn.executemany(
+                    "UPDATE embeddings SET last_access = MAX(last_access, ?) WHERE key = ?",
+                    [(at, key) for key, at in touches.items()],
+                )
+            except sqlite3.Error:
+                with self._local_lock:
+                    for key, at in touches.items():
+                        self._touches.setdefault(key, at)
+                raise
+
+    def get_keys(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """Stored vectors (float32, read from the memory map) for known keys; refreshes their LRU state."""
+        if not keys:
+            return {}
+        keys = list(dict.fromkeys(keys))
+        with self._connect() as conn:
+            meta = self._meta(conn)
+            rows = self._find_rows(conn, keys)
+        if rows:
+            self._record_touches(rows)
+        found = {}
+        try:
+            mapped = self._map(meta)
+        except OSError as e:
+            # compacted by another process between the index read and the map
+            logger.debug(f"embedding store remapped during lookup: {str(e)}")
+            mapped = None
+        if mapped is not None:
+            for key, row in rows.items():
+                found[key] = np.asarray(mapped[row], dtype=np.float32)
+        self._hits += len(found)
+        self._misses += len(keys) - len(found)
+        return found
+
+    def get_many(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """Stored vectors (float32) for the texts that are known; refreshes their LRU state."""
+        keys = {_text_key(t): t for t in texts}
+        return {keys[key]: vector for key, vector in self.get_keys(list(keys)).items()}
+
+    def put_keys(self, keys: List[str], vectors: np.ndarray):
+        """Append vectors for new keys (keys already stored are skipped)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+        with utils.file_lock(self.lock_path), self._connect() as conn:
+            self._flush_touches(conn)
+            meta = self._meta(conn)
+            if meta["dim"] and meta["dim"] != vectors.shape[1]:
+                raise ValueError(
+                    f"embedding dimension mismatch for {self.model_name}: {vectors.shape[1]} != {meta['dim']}"
+                )
+            known = self._find_rows(conn, list(keys))
+            pending = {}
+            for key, vector in zip(keys, vectors):
+                if key not in known:
+                    pending[key] = vector
+            if not pending:
+                return
+
+            dim = vectors.shape[1]
+            rows = meta["rows"]
+            capacity = meta["capacity"]
+            needed = rows + len(pending)
+            if needed > capacity:
+                capacity = max(needed, capacity + _grow_rows)
+                with open(self._vectors_path(meta["generation"]), "ab") as f:
+                    f.truncate(capacity * dim * 2)
+            meta.update(dim=dim, capacity=capacity)
+            mapped = self._map(meta)
+            now = time.time()
+            for i, (key, vector) in enumerate(pending.items()):
+                mapped[rows + i] = vector
+            mapped.flush()
+            conn.executemany(
+                "INSERT INTO embeddings (key, row, last_access) VALUES (?, ?, ?)",
+                [(key, rows + i, now) for i, key in enumerate(pending)],
+            )
+            self._set_meta(conn, dim=dim, rows=needed, capacity=capacity)
+
+        if self.max_entries and needed > self.max_entries:
+            self.compact()
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """Append vectors for new texts (texts already stored are skipped)."""
+        self.put_keys([_text_key(t) for t in texts], vectors)
+
+    def resolve_aliases(self, aliases: List[str]) -> Dict[str, str]:
+        """Content keys recorded for aliases (e.g. image URLs), unknown aliases are left out."""
+        resolved = {}
+        if not aliases:
+            return resolved
+        aliases = list(dict.fromkeys(aliases))
+        with self._connect() as conn:
+            for i in range(0, len(aliases), _query_chunk):
+                chunk = aliases[i:i + _query_chunk]
+                placeholders = ",".join("?" * len(chunk))
+                resolved.update(conn.execute(f"SELECT alias, key FROM aliases WHERE alias IN ({placeholders})", chunk))
+        return resolved
+
+    def add_aliases(self, aliases: Dict[str, str]):
+        """Record alias -> content key pairs."""
+        if not aliases:
+            return
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO aliases (alias, key) VALUES (?, ?)", list(aliases.items()))
+
+    def encode(self, texts: List[str], encoder: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Vectors for texts in order. Only texts missing from the store are passed
+        to encoder (as one batch) and the results are stored for everyone else.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        found = self.get_many(texts)
+        missing = list(dict.fromkeys(t for t in texts if t not in found))
+        if missing:
+            encoded = np.asarray(encoder(missing), dtype=np.float32)
+            try:
+                self.put_many(missing, encoded)
+            except Exception as e:
+                logger.warning(f"failed to store embeddings for {self.model_name}: {str(e)}")
+            found.update(zip(missing, encoded))
+        return np.stack([found[t] for t in texts])
+
+    # ========================================================================
+    # COMPACTION & STATUS
+    # ========================================================================
+
+    def compact(self) -> int:
+        """Keep the most recently used rows in a fresh vector file. Returns rows dropped."""
+        with utils.file_lock(self.lock_path), self._connect() as conn:
+            self._flush_touches(conn)
+            meta = self._meta(conn)
+            keep = int(self.max_entries * _compact_keep)
+            rows = conn.execute("SELECT key, row FROM embeddings ORDER BY last_access DESC").fetchall()
+            if len(rows) <= keep:
+                return 0
+            kept, dropped = rows[:keep], rows[keep:]
+            old = self._map(meta)
+            generation = meta["generation"] + 1
+            capacity = keep + _grow_rows
+            new = np.memmap(self._vectors_path(generation), dtype=np.float16, mode="w+", shape=(capacity, meta["dim"]))
+            for i, (_, row) in enumerate(kept):
+                new[i] = old[row]
+            new.flush()
+            del new
+            conn.executemany("DELETE FROM embeddings WHERE key = ?", [(key,) for key, _ in dropped])
+            conn.executemany("UPDATE embeddings SET row = ? WHERE key = ?", [(i, key) for i, (key, _) in enumerate(kept)])
+            conn.execute("DELETE FROM aliases WHERE key NOT IN (SELECT key FROM embeddings)")
+            self._set_meta(conn, rows=len(kept), capacity=capacity, generation=generation)
+
+        # other processes may still map the old file; on Windows it is removed on a later compaction
+        for name in os.listdir(self.store_dir):
+            if name.startswith("vectors.") and name != os.path.basename(self._vectors_path(generation)):
+                try:
+                    os.remove(os.path.join(self.store_dir, name))
+                except OSError:
+                    pass
+        logger.info(f"🧹 EmbeddingStore[{self.model_name}] compacted: kept {len(kept)}, dropped {len(dropped)}")
+        return len(dropped)
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._connect() as conn:
+            meta = self._meta(conn)
+        lookups = self._hits + self._misses
+        return {
+            "model": self.model_name,
+            "kind": self.kind,
+            "entries": meta["rows"],
+            "dim": meta["dim"],
+            "max_entries": self.max_entries,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+        }
@@ -9,6 +9,7 @@ import requests
 import warnings
 import time
 import gc
+import queue
 import threading
 import logging
 try:
@@ -19,9 +20,14 @@ except ImportError:
 from typing import List, Dict, Optional
 from PIL import Image
 import io
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import numpy as np
 from loguru import logger
 from app.config import config
+from app.services.embedding_store import content_key
+from app.services.ingest_embeddings import stored_embedding
+from app.services.memory_cache import MemoryCache
+from app.services.utils import keyframes
 
 # Suppress transformers warnings about slow processors
 warnings.filterwarnings("ignore", message=".*slow.*processor.*")
@@ -34,17 +40,17 @@ _model_load_fails = 0  # Track model loading failures
 _max_load_retries = 3  # Maximum retries before giving up
 _force_cpu_only = False  # Auto-detect GPU via ModelManager (GPU priority, CPU fallback)
 
-# Add embedding cache to avoid reprocessing same images/text
-_image_embedding_cache = {}
-_text_embedding_cache = {}
-_cache_max_size = 100  # Limit cache size to prevent memory issues
+# Add embedding cache to avoid reprocessing same images/text (byte-budgeted LRU)
+_cache_max_bytes = int(config.app.get("clip_cache_mb", 64)) * 1024 * 1024
+_image_embedding_cache = MemoryCache("clip_image", _cache_max_bytes)
+_text_embedding_cache = MemoryCache("clip_text", _cache_max_bytes // 4)
 _caching_enabled = True  # Can be disabled for testing or if memory is limited
 
-# Rate limiting to prevent memory issues
-_last_inference_time = 0
-_inference_count = 0
-INFERENCE_DELAY = 0.05  # Reduced delay for better throughput (was 0.15)
+# Shared inference queue: requests from all tasks are run together in micro-batches
 MAX_BATCH_SIZE = 50    # Larger batches for better throughput (was 10)
+INFERENCE_TIMEOUT = 30  # Seconds a caller waits for its embeddings
+MAX_IMAGE_BYTES = 10 * 1024 * 1024  # 10MB limit per downloaded image
+PREFETCH_WORKERS = 8  # Concurrent thumbnail downloads for batch scoring
 
 def check_image_similarity_dependencies() -> bool:
     """Check if image similarity dependencies are available"""
@@ -58,45 +64,6 @@ def check_image_similarity_dependencies() -> bool:
 # Set availability flag
 IMAGE_SIMILARITY_AVAILABLE = check_image_similarity_dependencies()
 
-def timeout_wrapper(timeout_seconds=30):
-    """Thread-safe decorator to add timeout protection to functions"""
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            class TimeoutException(Exception):
-                pass
-            
-            result = [None]
-            exception = [None]
-            
-            def target():
-                try:
-                    result[0] = func(*args, **kwargs)
-                except Exception as e:
-                    exception[0] = e
-            
-            # Create and start thread
-            thread = threading.Thread(target=target)
-            thread.daemon = True
-            thread.start()
-            
-            # Wait for completion or timeout
-            thread.join(timeout_seconds)
-            
-            if thread.is_alive():
-                # Thread is still running - timeout occurred
-                logger.error(f"⏰ Function {func.__name__} timed out after {timeout_seconds} seconds")
-                return 0.0  # Return default similarity score
-            
-            if exception[0]:
-                # Exception occurred in the thread
-                logger.error(f"❌ Exception in {func.__name__}: {exception[0]}")
-                return 0.0
-                
-            return result[0] if result[0] is not None else 0.0
-                
-        return wrapper
-    return decorator
-
 def load_clip_model(model_name: str = "clip-vit-base-patch32"):
     """Load CLIP model for text-image similarity via ModelManager (cached singleton)"""
     global _clip_model, _clip_processor, _model_load_fails
@@ -133,125 +100,286 @@ def load_clip_model(model_name: str = "clip-vit-base-patch32"):
         
         raise
 
-@timeout_wrapper(timeout_seconds=30)  # Re-enable timeout protection
-def calculate_text_image_similarity(text: str, image_url: str, model_name: str = "clip-vit-base-patch32") -> float:
-    """Calculate similarity between text and image using CLIP"""
-    global _last_inference_time, _inference_count, _image_embedding_cache, _text_embedding_cache
+def _encode_batches(items: List, encode) -> np.ndarray:
+    """Run a CLIP tower over items in chunks of MAX_BATCH_SIZE; returns normalised float32 rows"""
+    import torch
     
-    if not IMAGE_SIMILARITY_AVAILABLE:
-        safe_log("warning", "Image similarity not available - missing dependencies")
-        return 0.0
+    vectors = []
+    for start in range(0, len(items), MAX_BATCH_SIZE):
+        with torch.no_grad():
+            features = encode(items[start:start + MAX_BATCH_SIZE])
+        features = getattr(features, "pooler_output", features)
+        features = features / features.norm(p=2, dim=-1, keepdim=True)
+        vectors.append(features.float().cpu().numpy())
+    return np.concatenate(vectors)
+
+def _run_tower(kind: str, model_name: str, items: List) -> np.ndarray:
+    """Embed texts (kind "text") or PIL images (kind "image") with the CLIP model"""
+    model, processor = load_clip_model(model_name)
+    if kind == "text":
+        return _encode_batches(items, lambda batch: model.get_text_features(
+            **processor(text=batch, return_tensors="pt", padding=True, truncation=True).to(model.device)
+        ))
+    return _encode_batches(items, lambda batch: model.get_image_features(
+        **processor(images=batch, return_tensors="pt").to(model.device)
+    ))
+
+class _InferenceRequest:
+    __slots__ = ("kind", "model_name", "item", "deadline", "future")
     
-    try:
-        # Minimal logging - only log device info once per session
-        if not hasattr(calculate_text_image_similarity, '_device_logged'):
-            import torch
-            device_info = "CPU-only" if _force_cpu_only else ("CUDA" if torch.cuda.is_available() else "CPU")
-            safe_log("info", f"🖥️  Image similarity mode: {device_info}")
-            calculate_text_image_similarity._device_logged = True
-        
-        import torch
-        
-        # Check cache first
-        text_cache_key = f"{model_name}:{text}"
-        image_cache_key = f"{model_name}:{image_url}"
-        
-        # If both embeddings are cached, calculate similarity directly
-        if _caching_enabled and text_cache_key in _text_embedding_cache and image_cache_key in _image_embedding_cache:
-            try:
-                text_embeds = _text_embedding_cache[text_cache_key]
-                image_embeds = _image_embedding_cache[image_cache_key]
-                
-                with torch.no_grad():
-                    similarity = torch.cosine_similarity(text_embeds, image_embeds, dim=-1).item()
-                    similarity = (similarity + 1) / 2  # Convert from (-1, 1) to (0, 1)
-                    
-                return float(similarity)
-            except Exception as cache_error:
-                safe_log("error", f"❌ Error calculating from cache: {cache_error}")
-                # Continue with fresh calculation
-        
-        # Rate limiting to prevent overwhelming the system
-        current_time = time.time()
-        if current_time - _last_inference_time < INFERENCE_DELAY:
-            time.sleep(INFERENCE_DELAY)
-        _last_inference_time = time.time()
-        _inference_count += 1
-        
-        # Periodic cleanup every 200 inferences - minimal logging
-        if _inference_count % 200 == 0:
-            try:
-                clear_cache_if_needed()
-                gc.collect()
-                if torch.cuda.is_available():
-                    torch.cuda.empty_cache()
-            except Exception as cleanup_error:
-                safe_log("error", f"❌ Error during cleanup: {cleanup_error}")
-        
-        # Load model - reduced logging
+    def __init__(self, kind: str, model_name: str, item, deadline: float, future: Future):
+        self.kind = kind
+        self.model_name = model_name
+        self.item = item
+        self.deadline = deadline
+        self.future = future
+
+class ClipInferenceQueue:
+    """
+    Single CLIP inference worker per process, shared by every task.
+    
+    Requests are gathered into micro-batches of up to MAX_BATCH_SIZE items,
+    waiting at most clip_batch_wait_ms for a batch to fill, and each batch
+    runs through the text or image tower in one forward pass. Callers get
+    futures; requests whose deadline passed before they were picked up are
+    failed with TimeoutError instead of being computed.
+    
+    Usage:
+        vectors = ClipInferenceQueue.get_instance().encode("text", model_name, ["a red car"])
+    """
+    
+    _instance = None
+    _lock = threading.Lock()
+    
+    def __init__(self):
+        self.max_batch_size = MAX_BATCH_SIZE
+        self.max_wait = float(config.app.get("clip_batch_wait_ms", 10)) / 1000
+        self._queue: "queue.Queue[_InferenceRequest]" = queue.Queue()
+        self._thread = None
+        self.batches = 0
+        self.items = 0
+        self.expired = 0
+    
+    @classmethod
+    def get_instance(cls) -> "ClipInferenceQueue":
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = ClipInferenceQueue()
+        return cls._instance
+    
+    def submit(self, kind: str, model_name: str, item, timeout: float = INFERENCE_TIMEOUT) -> Future:
+        """Queue one text or image; the future resolves to its normalised embedding"""
+        future = Future()
+        self._queue.put(_InferenceRequest(kind, model_name, item, time.monotonic() + timeout, future))
+        self._start()
+        return future
+    
+    def encode(self, kind: str, model_name: str, items: List, timeout: float = INFERENCE_TIMEOUT) -> np.ndarray:
+        """Embeddings for items in order; raises TimeoutError once timeout seconds have passed"""
+        deadline = time.monotonic() + timeout
+        futures = [self.submit(kind, model_name, item, timeout) for item in items]
         try:
-            model, processor = load_clip_model(model_name)
-        except Exception as model_error:
-            safe_log("error", f"❌ Error loading CLIP model: {model_error}")
-            
-            # Try to reset and reload model once
+            return np.stack([f.result(timeout=max(0.0, deadline - time.monotonic())) for f in futures])
+        except FuturesTimeoutError:
+            for f in futures:
+                f.cancel()
+            raise TimeoutError(f"CLIP inference timed out after {timeout}s")
+    
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="ClipInference")
+                self._thread.start()
+    
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            fill_until = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = fill_until - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._run(batch)
+    
+    def _run(self, batch: List[_InferenceRequest]):
+        now = time.monotonic()
+        groups: Dict[tuple, List[_InferenceRequest]] = {}
+        for request in batch:
+            # cancelled by a caller that stopped waiting
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            if request.deadline < now:
+                self.expired += 1
+                request.future.set_exception(TimeoutError("CLIP request expired before it was scheduled"))
+                continue
+            groups.setdefault((request.model_name, request.kind), []).append(request)
+        
+        for (model_name, kind), requests in groups.items():
             try:
-                safe_log("warning", "🔄 Attempting model reset and reload...")
-                reset_clip_model()
-                model, processor = load_clip_model(model_name)
-                safe_log("success", "✅ Model reset and reload successful")
-            except Exception as retry_error:
-                safe_log("error", f"❌ Model reset and reload failed: {retry_error}")
-                return 0.0
+                vectors = _run_tower(kind, model_name, [request.item for request in requests])
+            except Exception as e:
+                safe_log("error", f"❌ Failed during model inference: {e}")
+                for request in requests:
+                    request.future.set_exception(e)
+                if "CUDA" in str(e) or "memory" in str(e).lower():
+                    safe_log("warning", "🔄 Memory/CUDA error detected, resetting model...")
+                    try:
+                        reset_clip_model()
+                    except Exception:
+                        pass
+                continue
+            self.batches += 1
+            self.items += len(requests)
+            for request, vector in zip(requests, vectors):
+                request.future.set_result(vector)
+    
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "expired": self.expired,
+            "average_batch": self.items / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+def _load_stored_text_embedding(model_name: str, text: str) -> Optional[np.ndarray]:
+    """CLIP text embedding from the persistent store, or None"""
+    try:
+        from app.services.embedding_store import EmbeddingStore
         
-        # Download and process image with timeout and size limits (only if not cached)
-        image_embeds = None
-        image = None
+        return EmbeddingStore.get_instance(model_name).get_many([text]).get(text)
+    except Exception as e:
+        safe_log("debug", f"embedding store lookup failed: {e}")
+    return None
+
+def _save_stored_text_embedding(model_name: str, text: str, vector: np.ndarray):
+    try:
+        from app.services.embedding_store import EmbeddingStore
         
-        if _caching_enabled and image_cache_key in _image_embedding_cache:
-            image_embeds = _image_embedding_cache[image_cache_key]
+        EmbeddingStore.get_instance(model_name).put_many([text], vector[None, :])
+    except Exception as e:
+        safe_log("debug", f"embedding store write failed: {e}")
+
+def _image_store(model_name: str):
+    from app.services.embedding_store import EmbeddingStore
+    
+    return EmbeddingStore.get_instance(model_name, kind="image")
+
+def _load_stored_image_embeddings(model_name: str, image_urls: List[str]) -> Dict[str, np.ndarray]:
+    """Image embeddings for URLs seen before (no download, no forward pass)"""
+    try:
+        store = _image_store(model_name)
+        keys = store.resolve_aliases(image_urls)
+        vectors = store.get_keys(list(keys.values()))
+        return {url: vectors[key] for url, key in keys.items() if key in vectors}
+    except Exception as e:
+        safe_log("debug", f"image embedding store lookup failed: {e}")
+        return {}
+
+def _load_stored_image_keys(model_name: str, url_keys: Dict[str, str]) -> Dict[str, np.ndarray]:
+    """Image embeddings by content hash for freshly downloaded URLs; the URLs become aliases"""
+    try:
+        store = _image_store(model_name)
+        vectors = store.get_keys(list(url_keys.values()))
+        found = {url: vectors[key] for url, key in url_keys.items() if key in vectors}
+        store.add_aliases({url: url_keys[url] for url in found})
+        return found
+    except Exception as e:
+        safe_log("debug", f"image embedding store lookup failed: {e}")
+        return {}
+
+def _save_stored_image_embeddings(model_name: str, url_keys: Dict[str, str], vectors: Dict[str, np.ndarray]):
+    """Store vectors (by content hash) and record the URLs they were downloaded from"""
+    if not vectors:
+        return
+    try:
+        store = _image_store(model_name)
+        store.put_keys([url_keys[url] for url in vectors], np.stack(list(vectors.values())))
+        store.add_aliases({url: url_keys[url] for url in vectors})
+    except Exception as e:
+        safe_log("debug", f"image embedding store write failed: {e}")
+
+def _fetch_image_bytes(image_url: str) -> bytes:
+    """Download an image body, b"" when it exceeds MAX_IMAGE_BYTES"""
+    with requests.get(
+        image_url, 
+        timeout=(5, 10),  # 5s connect, 10s read timeout
+        stream=True,
+        headers={'User-Agent': 'Mozilla/5.0 (compatible; ImageBot/1.0)'}
+    ) as response:
+        response.raise_for_status()
         
-        # Always download image if we don't have cached embeddings or if we need it for processing
-        if image_embeds is None or not _caching_enabled or text_cache_key not in _text_embedding_cache:
+        # Check content size to prevent memory issues
+        content_length = response.headers.get('content-length')
+        if content_length and int(content_length) > MAX_IMAGE_BYTES:
+            safe_log("warning", f"Image too large ({content_length} bytes), skipping: {image_url}")
+            return b""
+        
+        # Chunks are joined once at the end; appending to bytes would copy on every chunk
+        chunks = []
+        downloaded = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            if chunk:
+                downloaded += len(chunk)
+                if downloaded > MAX_IMAGE_BYTES:
+                    safe_log("warning", f"Image download exceeded size limit, stopping at {downloaded} bytes")
+                    break
+                chunks.append(chunk)
+        return b"".join(chunks)
+
+def _load_image(image_data: bytes) -> Image.Image:
+    image = Image.open(io.BytesIO(image_data)).convert('RGB')
+    
+    # Resize large images to prevent memory issues
+    max_size = 512
+    if max(image.size) > max_size:
+        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    return image
+
+def encode_text_embedding(text: str, model_name: str = "clip-vit-base-patch32", timeout: float = INFERENCE_TIMEOUT) -> np.ndarray:
+    """Normalised CLIP text embedding (memory cache, then the embedding store, then the inference queue)"""
+    text_cache_key = f"{model_name}:{text}"
+    vector = _text_embedding_cache.get(text_cache_key) if _caching_enabled else None
+    if vector is None:
+        vector = _load_stored_text_embedding(model_name, text)
+    if vector is None:
+        vector = ClipInferenceQueue.get_instance().encode("text", model_name, [text], timeout)[0]
+        _save_stored_text_embedding(model_name, text, vector)
+    if _caching_enabled:
+        _text_embedding_cache.put(text_cache_key, vector)
+    return vector
+
+def calculate_text_image_similarity(text: str, image_url: str, model_name: str = "clip-vit-base-patch32") -> float:
+    """Calculate similarity between text and image using CLIP
+    
+    Both towers run on the shared ClipInferenceQueue, batched with requests
+    from other tasks; the call gives up after INFERENCE_TIMEOUT seconds.
+    """
+    if not IMAGE_SIMILARITY_AVAILABLE:
+        safe_log("warning", "Image similarity not available - missing dependencies")
+        return 0.0
+    
+    deadline = time.monotonic() + INFERENCE_TIMEOUT
+    image_cache_key = f"{model_name}:{image_url}"
+    try:
+        image_vector = _image_embedding_cache.get(image_cache_key) if _caching_enabled else None
+        if image_vector is None:
+            image_vector = _load_stored_image_embeddings(model_name, [image_url]).get(image_url)
+        image_future = None
+        if image_vector is None:
             try:
-                # Use shorter timeout and add more robust error handling
-                response = requests.get(
-                    image_url, 
-                    timeout=(5, 10),  # 5s connect, 10s read timeout
-                    stream=True,
-                    headers={'User-Agent': 'Mozilla/5.0 (compatible; ImageBot/1.0)'}
-                )
-                response.raise_for_status()
-                
-                # Check content size to prevent memory issues
-                content_length = response.headers.get('content-length')
-                if content_length and int(content_length) > 10 * 1024 * 1024:  # 10MB limit
-                    safe_log("warning", f"Image too large ({content_length} bytes), skipping: {image_url}")
-                    return 0.0
-                
-                # Download with size limit
-                image_data = b""
-                downloaded = 0
-                max_size = 10 * 1024 * 1024  # 10MB limit
-                
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        downloaded += len(chunk)
-                        if downloaded > max_size:
-                            safe_log("warning", f"Image download exceeded size limit, stopping at {downloaded} bytes")
-                            break
-                        image_data += chunk
+                image_data = _fetch_image_bytes(image_url)
                 
                 if len(image_data) == 0:
                     safe_log("warning", f"Empty image data received from: {image_url}")
                     return 0.0
                 
-                image = Image.open(io.BytesIO(image_data)).convert('RGB')
-                
-                # Resize large images to prevent memory issues
-                max_size = 512
-                if max(image.size) > max_size:
-                    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+                url_keys = {image_url: content_key(image_data)}
+                image_vector = _load_stored_image_keys(model_name, url_keys).get(image_url)
+                image = _load_image(image_data) if image_vector is None else None
                     
             except requests.exceptions.Timeout:
                 safe_log("error", f"❌ Timeout downloading image from: {image_url}")
@@ -265,128 +393,59 @@ def calculate_text_image_similarity(text: str, image_url: str, model_name: str =
             except Exception as img_error:
                 safe_log("error", f"❌ Failed to load image {image_url}: {img_error}")
                 return 0.0
+            
+            # queued before the text so both can land in the same micro-batch window
+            if image is not None:
+                image_future = ClipInferenceQueue.get_instance().submit(
+                    "image", model_name, image, deadline - time.monotonic()
+                )
         
-        # Process text (only if not cached)
-        text_embeds = None
-        if _caching_enabled and text_cache_key in _text_embedding_cache:
-            text_embeds = _text_embedding_cache[text_cache_key]
+        text_vector = encode_text_embedding(text, model_name, timeout=max(0.0, deadline - time.monotonic()))
         
-        # Process inputs with error handling - minimal logging
-        try:
-            if text_embeds is None or image_embeds is None:
-                # We need both text and image for the processor, so we'll process them together
-                # but only cache what we don't have
-                inputs = processor(text=[text], images=image, return_tensors="pt", padding=True)
-                    
-        except AttributeError as attr_error:
-            if "_valid_processor_keys" in str(attr_error):
-                safe_log("warning", f"⚠️  Processor compatibility issue ({attr_error}), reloading model...")
-                # Clear global cache and reload
-                global _clip_model, _clip_processor
-                _clip_model = None
-                _clip_processor = None
-                model, processor = load_clip_model(model_name)
-                inputs = processor(text=[text], images=image, return_tensors="pt", padding=True)
-            else:
-                safe_log("error", f"❌ Attribute error in processor: {attr_error}")
-                raise
-        except Exception as proc_error:
-            safe_log("error", f"❌ Failed to process inputs: {proc_error}")
-            return 0.0
-        
-        # Get embeddings with no_grad to save memory - minimal logging
-        similarity = 0.0
-        try:
-            with torch.no_grad():
-                if text_embeds is None or image_embeds is None:
-                    
-                    # Ensure inputs are on the correct device
-                    if _force_cpu_only:
-                        # Move all inputs to CPU explicitly
-                        inputs = {k: v.to("cpu") if hasattr(v, 'to') else v for k, v in inputs.items()}
-                    
-                    outputs = model(**inputs)
-                    
-                    if text_embeds is None:
-                        text_embeds = outputs.text_embeds / outputs.text_embeds.norm(p=2, dim=-1, keepdim=True)
-                        # Cache the text embedding
-                        if _caching_enabled:
-                            _text_embedding_cache[text_cache_key] = text_embeds.clone()
-                        
-                    if image_embeds is None:
-                        image_embeds = outputs.image_embeds / outputs.image_embeds.norm(p=2, dim=-1, keepdim=True)
-                        # Cache the image embedding
-                        if _caching_enabled:
-                            _image_embedding_cache[image_cache_key] = image_embeds.clone()
-                
-                # Calculate cosine similarity
-                similarity = torch.cosine_similarity(text_embeds, image_embeds, dim=-1).item()
-                
-                # Convert from (-1, 1) to (0, 1) range
-                similarity = (similarity + 1) / 2
-                
-        except Exception as inference_error:
-            safe_log("error", f"❌ Failed during model inference: {inference_error}")
-            import traceback
-            safe_log("error", f"❌ Traceback: {traceback.format_exc()}")
-            
-            # Try to reset model if inference fails repeatedly
-            global _model_load_fails
-            if "CUDA" in str(inference_error) or "memory" in str(inference_error).lower():
-                safe_log("warning", "🔄 Memory/CUDA error detected, resetting model...")
-                try:
-                    reset_clip_model()
-                except:
-                    pass
-            
-            return 0.0
-        finally:
-            # Aggressive cleanup to prevent memory leaks - no debug logging
+        if image_future is not None:
             try:
-                if 'inputs' in locals():
-                    del inputs
-                if 'outputs' in locals():
-                    del outputs
-                if 'text_embeds' in locals() and text_cache_key not in _text_embedding_cache:
-                    del text_embeds
-                if 'image_embeds' in locals() and image_cache_key not in _image_embedding_cache:
-                    del image_embeds
-                if 'image' in locals():
-                    del image
-                if 'image_data' in locals():
-                    del image_data
-                    
-                # Force garbage collection for this inference
-                gc.collect()
-                
-                # Clear CUDA cache if available and not in CPU-only mode
-                if torch.cuda.is_available() and not _force_cpu_only:
-                    torch.cuda.empty_cache()
-                    
-            except Exception as cleanup_error:
-                safe_log("error", f"❌ Cleanup warning: {cleanup_error}")
-            
-        return float(similarity)
-            
+                image_vector = image_future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FuturesTimeoutError:
+                image_future.cancel()
+                raise TimeoutError(f"CLIP inference timed out after {INFERENCE_TIMEOUT}s")
+            _save_stored_image_embeddings(model_name, url_keys, {image_url: image_vector})
+        if _caching_enabled and image_cache_key not in _image_embedding_cache:
+            _image_embedding_cache.put(image_cache_key, image_vector)
+        
+        # Convert cosine similarity from (-1, 1) to (0, 1) range
+        return float((np.dot(text_vector, image_vector) + 1) / 2)
+    
+    except TimeoutError as e:
+        safe_log("error", f"⏰ {e} for {image_url}")
+        return 0.0
     except Exception as e:
         safe_log("error", f"❌ Failed to calculate text-image similarity: {e}")
-        import traceback
-        safe_log("error", f"❌ Full traceback: {traceback.format_exc()}")
-        # Emergency cleanup
-        try:
-            gc.collect()
-            if 'torch' in locals():
-                import torch
-                if torch.cuda.is_available():
-                    torch.cuda.empty_cache()
-        except:
-            pass
         return 0.0
 
 def calculate_video_image_similarity(text: str, video_metadata: Dict, model_name: str = "clip-vit-base-patch32") -> float:
-    """Calculate similarity between text and video images (thumbnail + preview frames)"""
+    """Calculate similarity between text and video images (ingest embedding, local keyframes, or thumbnail + preview frames)"""
     if not IMAGE_SIMILARITY_AVAILABLE:
         return 0.0
+    
+    # Clips embedded at ingest time only need the text side encoded
+    image_vector = stored_embedding(video_metadata, model_name)
+    if image_vector is not None:
+        try:
+            text_vector = encode_text_embedding(text, model_name)
+            if text_vector.shape == image_vector.shape:
+                return float((np.dot(text_vector, image_vector) + 1) / 2)
+        except Exception as e:
+            logger.warning(f"Failed to use ingest-time image embedding: {e}")
+    
+    # Local clip: pooled keyframes from the mp4 instead of a thumbnail download
+    video_path = video_metadata.get('video_path', '')
+    if keyframe_embeddings_enabled() and video_path and os.path.isfile(video_path):
+        try:
+            image_vector = encode_video_keyframes([video_path], model_name).get(video_path)
+            if image_vector is not None:
+                return float((np.dot(encode_text_embedding(text, model_name), image_vector) + 1) / 2)
+        except Exception as e:
+            logger.warning(f"Failed to use keyframe embedding for {video_path}: {e}")
         
     # Get image URLs from video metadata
     image_urls = []
@@ -420,6 +479,211 @@ def calculate_video_image_similarity(text: str, video_metadata: Dict, model_name
     
     return max_similarity
 
+def _prefetch_images(image_urls: List[str]) -> Dict[str, tuple]:
+    """Download images concurrently; returns url -> (content hash, image bytes), failed URLs are left out"""
+    def load(url):
+        try:
+            image_data = _fetch_image_bytes(url)
+            return url, (content_key(image_data), image_data) if image_data else None
+        except Exception as e:
+            safe_log("warning", f"Failed to fetch image {url}: {e}")
+            return url, None
+    
+    with ThreadPoolExecutor(max_workers=min(PREFETCH_WORKERS, len(image_urls))) as executor:
+        return {url: fetched for url, fetched in executor.map(load, image_urls) if fetched is not None}
+
+def _encode_texts_batched(texts: List[str], model_name: str) -> np.ndarray:
+    """Normalised CLIP text embeddings, only texts missing from the embedding store are encoded"""
+    from app.services.embedding_store import EmbeddingStore
+    
+    def encode(missing: List[str]) -> np.ndarray:
+        return ClipInferenceQueue.get_instance().encode("text", model_name, missing)
+    
+    try:
+        return EmbeddingStore.get_instance(model_name).encode(texts, encode)
+    except TimeoutError:
+        raise
+    except Exception as e:
+        safe_log("debug", f"embedding store unavailable, encoding directly: {e}")
+        return encode(texts)
+
+def encode_image_urls(image_urls: List[str], model_name: str = "clip-vit-base-patch32") -> Dict[str, np.ndarray]:
+    """Normalised CLIP image embeddings per URL.
+    
+    Lookups go memory cache -> image embedding store by URL -> download and
+    store by content hash (same image under another URL) -> batched forward pass.
+    URLs that cannot be downloaded or decoded are left out.
+    """
+    vectors = {}
+    for url in dict.fromkeys(image_urls):
+        cached = _image_embedding_cache.get(f"{model_name}:{url}") if _caching_enabled else None
+        if cached is not None:
+            vectors[url] = cached
+    pending = [url for url in dict.fromkeys(image_urls) if url not in vectors]
+    if pending:
+        vectors.update(_load_stored_image_embeddings(model_name, pending))
+        pending = [url for url in pending if url not in vectors]
+    
+    if pending:
+        fetched = _prefetch_images(pending)
+        url_keys = {url: key for url, (key, _) in fetched.items()}
+        vectors.update(_load_stored_image_keys(model_name, url_keys))
+        
+        images = {}
+        for url, (key, image_data) in fetched.items():
+            if url in vectors:
+                continue
+            try:
+                images[url] = _load_image(image_data)
+            except Exception as e:
+                safe_log("warning", f"Failed to decode image {url}: {e}")
+        if images:
+            urls = list(images)
+            encoded = ClipInferenceQueue.get_instance().encode("image", model_name, [images[url] for url in urls])
+            computed = dict(zip(urls, encoded))
+            _save_stored_image_embeddings(model_name, url_keys, computed)
+            vectors.update(computed)
+    
+    if _caching_enabled:
+        for url, vector in vectors.items():
+            if f"{model_name}:{url}" not in _image_embedding_cache:
+                _image_embedding_cache.put(f"{model_name}:{url}", vector)
+    return vectors
+
+def keyframe_embeddings_enabled() -> bool:
+    return bool(config.app.get("clip_keyframe_embeddings", False))
+
+def _clip_duration(video_path: str) -> float:
+    from app.services import material
+    
+    return float(material.probe_clip(video_path).get("duration", 0))
+
+def _keyframe_store_key(video_path: str, count: int) -> str:
+    # clips are immutable once stored, path + size + mtime identify the content
+    stat = os.stat(video_path)
+    return content_key(f"keyframes:{count}:{os.path.realpath(video_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+
+def _extract_clip_keyframes(video_path: str, count: int) -> List[Image.Image]:
+    from moviepy.config import FFMPEG_BINARY
+    
+    return keyframes.extract_keyframes(video_path, _clip_duration(video_path), FFMPEG_BINARY, count)
+
+def encode_video_keyframes(video_paths: List[str], model_name: str = "clip-vit-base-patch32", count: int = 0) -> Dict[str, np.ndarray]:
+    """Mean-pooled CLIP embedding of a few keyframes per local clip.
+    
+    Frames come straight from the mp4 (fast seek), so this works offline and
+    for local or library clips without thumbnails. Pooled vectors are kept in
+    the image embedding store; clips without decodable frames are left out.
+    """
+    count = count or int(config.app.get("clip_keyframes", 3))
+    store_keys = {}
+    for path in dict.fromkeys(video_paths):
+        try:
+            store_keys[path] = _keyframe_store_key(path, count)
+        except OSError:
+            continue
+    if not store_keys:
+        return {}
+    
+    try:
+        stored = _image_store(model_name).get_keys(list(store_keys.values()))
+    except Exception as e:
+        safe_log("debug", f"image embedding store lookup failed: {e}")
+        stored = {}
+    vectors = {path: stored[key] for path, key in store_keys.items() if key in stored}
+    pending = [path for path in store_keys if path not in vectors]
+    if not pending:
+        return vectors
+    
+    with ThreadPoolExecutor(max_workers=min(PREFETCH_WORKERS, len(pending))) as executor:
+        frames = dict(zip(pending, executor.map(lambda path: _extract_clip_keyframes(path, count), pending)))
+    flat = [(path, frame) for path in pending for frame in frames[path]]
+    if not flat:
+        return vectors
+    
+    # every frame of every clip goes through the image tower in one queued batch
+    encoded = ClipInferenceQueue.get_instance().encode("image", model_name, [frame for _, frame in flat])
+    pooled: Dict[str, List[np.ndarray]] = {}
+    for (path, _), vector in zip(flat, encoded):
+        pooled.setdefault(path, []).append(vector)
+    computed = {}
+    for path, frame_vectors in pooled.items():
+        mean = np.mean(frame_vectors, axis=0)
+        computed[path] = mean / (np.linalg.norm(mean) or 1)
+    try:
+        _image_store(model_name).put_keys([store_keys[path] for path in computed], np.stack(list(computed.values())))
+    except Exception as e:
+        safe_log("debug", f"image embedding store write failed: {e}")
+    vectors.update(computed)
+    return vectors
+
+def calculate_image_similarity_matrix(
+    texts: List[str], 
+    video_metadata: List[Dict], 
+    model_name: str = "clip-vit-base-patch32"
+) -> np.ndarray:
+    """CLIP similarity (0..1) of every text against every video's representative image.
+    
+    Returns a len(texts) x len(video_metadata) matrix, videos without a usable image
+    score 0. Thumbnails are downloaded concurrently, both CLIP towers run in batches
+    of MAX_BATCH_SIZE, and clips embedded at ingest time are not downloaded at all.
+    With clip_keyframe_embeddings, local clips are scored from their own keyframes.
+    """
+    matrix = np.zeros((len(texts), len(video_metadata)), dtype=np.float32)
+    if not IMAGE_SIMILARITY_AVAILABLE or not texts or not video_metadata:
+        return matrix
+    
+    start_time = time.time()
+    try:
+        text_vectors = _encode_texts_batched(texts, model_name)
+        dimension = text_vectors.shape[1]
+        
+        image_vectors = []
+        for video_meta in video_metadata:
+            vector = stored_embedding(video_meta, model_name)
+            image_vectors.append(vector if vector is not None and vector.shape == (dimension,) else None)
+        
+        # local clips: pooled keyframes, no network needed
+        keyframe_paths = {}
+        if keyframe_embeddings_enabled():
+            keyframe_paths = {
+                v_index: video_meta['video_path']
+                for v_index, video_meta in enumerate(video_metadata)
+                if image_vectors[v_index] is None and video_meta.get('video_path')
+            }
+            if keyframe_paths:
+                by_path = encode_video_keyframes(list(keyframe_paths.values()), model_name)
+                for v_index, path in keyframe_paths.items():
+                    image_vectors[v_index] = by_path.get(path)
+        
+        image_urls = {}
+        for v_index, video_meta in enumerate(video_metadata):
+            if image_vectors[v_index] is None:
+                candidates = [video_meta['thumbnail_url']] if video_meta.get('thumbnail_url') else []
+                candidates.extend(video_meta.get('preview_images') or [])
+                selected = select_representative_images(candidates, max_images=1)
+                if selected:
+                    image_urls[v_index] = selected[0]
+        
+        if image_urls:
+            by_url = encode_image_urls(list(image_urls.values()), model_name)
+            for v_index, url in image_urls.items():
+                image_vectors[v_index] = by_url.get(url)
+        
+        columns = [v_index for v_index, vector in enumerate(image_vectors) if vector is not None]
+        if columns:
+            images = np.stack([image_vectors[v_index] for v_index in columns])
+            # Convert cosine similarity from (-1, 1) to (0, 1) like calculate_text_image_similarity
+            matrix[:, columns] = (text_vectors @ images.T + 1) / 2
+        safe_log(
+            "info",
+            f"🖼️  Image similarity matrix: {len(texts)} texts × {len(video_metadata)} videos "
+            f"({len(columns)} with images, {len(keyframe_paths)} from keyframes, {len(image_urls)} from thumbnails) in {time.time() - start_time:.2f}s"
+        )
+    except Exception as e:
+        safe_log("error", f"❌ Failed to calculate image similarity matrix: {e}")
+    return matrix
+
 def download_image(image_url: str) -> Optional[Image.Image]:
     """Download and load image from URL"""
     try:
@@ -476,28 +740,8 @@ def select_representative_images(image_urls: List[str], max_images: int = 1) ->
     
     return selected[:max_images]
 
-def clear_cache_if_needed():
-    """Clear caches if they exceed maximum size"""
-    global _image_embedding_cache, _text_embedding_cache
-    
-    if len(_image_embedding_cache) > _cache_max_size:
-        # Remove oldest entries (simple FIFO)
-        to_remove = len(_image_embedding_cache) - _cache_max_size + 10  # Remove a few extra
-        for _ in range(to_remove):
-            if _image_embedding_cache:
-                _image_embedding_cache.popitem(last=False)
-    
-    if len(_text_embedding_cache) > _cache_max_size:
-        # Remove oldest entries (simple FIFO)
-        to_remove = len(_text_embedding_cache) - _cache_max_size + 10  # Remove a few extra
-        for _ in range(to_remove):
-            if _text_embedding_cache:
-                _text_embedding_cache.popitem(last=False)
-
 def clear_all_caches():
     """Clear all embedding caches"""
-    global _image_embedding_cache, _text_embedding_cache
-    
     logger.info(f"🧹 Clearing all caches (image: {len(_image_embedding_cache)}, text: {len(_text_embedding_cache)})")
     _image_embedding_cache.clear()
     _text_embedding_cache.clear()
@@ -507,9 +751,11 @@ def get_cache_stats():
     return {
         'text_cache_size': len(_text_embedding_cache),
         'image_cache_size': len(_image_embedding_cache),
-        'cache_max_size': _cache_max_size,
+        'text_cache': _text_embedding_cache.get_stats(),
+        'image_cache': _image_embedding_cache.get_stats(),
         'caching_enabled': _caching_enabled,
-        'inference_count': _inference_count,
+        'inference_count': ClipInferenceQueue.get_instance().items,
+        'inference': ClipInferenceQueue.get_instance().get_stats(),
         'model_load_fails': _model_load_fails
     }
 
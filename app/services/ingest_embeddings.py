@@ -0,0 +1,222 @@
+"""
+IngestEmbedder - computes clip embeddings when a clip is stored, off the render path.
+
+Benefits:
+- save_video queues every stored clip; a background worker embeds its search
+  term (sentence transformer) and, optionally, its keyframes or thumbnail (CLIP)
+- Vectors are written into the clip's metadata file, keyed by model name, so
+  semantic selection only has to embed the script segments
+- Work is batched: one encoder pass per model for everything that is queued
+
+Usage:
+    IngestEmbedder.get_instance().submit(video_path)
+    IngestEmbedder.get_instance().wait_for(video_paths, timeout=30)
+"""
+
+import base64
+import queue
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from app.config import config
+
+# Defaults of the semantic_search_model / image_similarity_model settings
+TEXT_MODEL = "all-mpnet-base-v2"
+CLIP_MODEL = "clip-vit-base-patch32"
+
+# Metadata key holding {model_name: base64 float16 vector}
+EMBEDDINGS_KEY = "embeddings"
+
+# Clips embedded per encoder pass
+_batch_size = 32
+
+
+def encode_vector(vector: np.ndarray) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float16).tobytes()).decode("ascii")
+
+
+def decode_vector(value: Optional[str]) -> Optional[np.ndarray]:
+    if not value:
+        return None
+    try:
+        return np.frombuffer(base64.b64decode(value), dtype=np.float16).astype(np.float32)
+    except Exception:
+        return None
+
+
+def text_model_name() -> str:
+    """Sentence transformer semantic selection uses (embeddings for any other model would go unused)."""
+    return config.app.get("semantic_search_model", "") or TEXT_MODEL
+
+
+def clip_model_name() -> str:
+    return config.app.get("image_similarity_model", "") or CLIP_MODEL
+
+
+def stored_embedding(video_metadata: Dict, model_name: str) -> Optional[np.ndarray]:
+    """Embedding computed at ingest time for model_name, None when missing."""
+    return decode_vector((video_metadata.get(EMBEDDINGS_KEY) or {}).get(model_name))
+
+
+class IngestEmbedder:
+    """Background worker embedding freshly stored clips (one per process)."""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.enabled = config.app.get("ingest_embeddings", True)
+        self.clip_enabled = config.app.get("ingest_clip_embeddings", False)
+        self.text_model = text_model_name()
+        self.clip_model = clip_model_name()
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._pending = set()
+        self._idle = threading.Condition()
+        self._thread = None
+
+    @classmethod
+    def get_instance(cls) -> "IngestEmbedder":
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = IngestEmbedder()
+        return cls._instance
+
+    def submit(self, video_path: str) -> bool:
+        """Queue a stored clip for embedding. Returns False when disabled or already queued."""
+        if not self.enabled or not video_path:
+            return False
+        with self._idle:
+            if video_path in self._pending:
+                return False
+            self._pending.add(video_path)
+        self._queue.put(video_path)
+        self._start()
+        return True
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Block until the queue is drained. Returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending, timeout)
+
+    def wait_for(self, video_paths: List[str], timeout: float = None) -> bool:
+        """Block until these clips are embedded (clips queued by other tasks are not waited on). False on timeout."""
+        paths = set(video_paths)
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending.isdisjoint(paths), timeout)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="IngestEmbedder")
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < _batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.embed_clips(batch)
+            except Exception as e:
+                logger.warning(f"ingest embeddings failed: {str(e)}")
+            finally:
+                with self._idle:
+                    self._pending.difference_update(batch)
+                    self._idle.notify_all()
+
+    # ========================================================================
+    # EMBEDDING
+    # ========================================================================
+
+    def embed_clips(self, video_paths: List[str]) -> int:
+        """Embed the clips whose metadata lacks vectors. Returns the number of clips updated."""
+        from app.services import semantic_video
+
+        updates: Dict[str, Dict[str, str]] = {}
+        entries = []
+        for path in dict.fromkeys(video_paths):
+            metadata = semantic_video.load_video_metadata(path)
+            if metadata:
+                entries.append((path, metadata))
+
+        missing_text = [
+            (path, metadata)
+            for path, metadata in entries
+            if metadata.get("search_term") and stored_embedding(metadata, self.text_model) is None
+        ]
+        if missing_text:
+            vectors = self._encode_texts([metadata["search_term"] for _, metadata in missing_text])
+            if vectors is not None:
+                for (path, _), vector in zip(missing_text, vectors):
+                    updates.setdefault(path, {})[self.text_model] = encode_vector(vector)
+
+        if self.clip_enabled:
+            missing_image = [
+                (path, metadata)
+                for path, metadata in entries
+                if stored_embedding(metadata, self.clip_model) is None
+            ]
+            if missing_image:
+                for path, vector in self._encode_images(missing_image).items():
+                    updates.setdefault(path, {})[self.clip_model] = encode_vector(vector)
+
+        for path, vectors in updates.items():
+            # re-read: the metadata may have been rewritten while we were encoding
+            metadata = semantic_video.load_video_metadata(path)
+            if not metadata:
+                continue
+            metadata[EMBEDDINGS_KEY] = {**(metadata.get(EMBEDDINGS_KEY) or {}), **vectors}
+            semantic_video.save_video_metadata(path, metadata.get("search_term", ""), metadata)
+        if updates:
+            logger.debug(f"ingest embeddings stored for {len(updates)} clips")
+        return len(updates)
+
+    @staticmethod
+    def _image_url(metadata: Dict) -> str:
+        # the image calculate_video_image_similarity compares against
+        return metadata.get("thumbnail_url") or (metadata.get("preview_images") or [""])[0]
+
+    def _encode_texts(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Normalised search-term embeddings, shared with the persistent embedding store."""
+        try:
+            from app.services.embedding_store import EmbeddingStore
+            from app.services.model_manager import ModelManager
+
+            model = ModelManager.get_instance().get_sentence_transformer(self.text_model)
+            return EmbeddingStore.get_instance(self.text_model).encode(
+                texts,
+                lambda missing: model.encode(
+                    missing, batch_size=64, normalize_embeddings=True, show_progress_bar=False
+                ),
+            )
+        except Exception as e:
+            logger.warning(f"ingest text embeddings unavailable: {str(e)}")
+            return None
+
+    def _encode_images(self, entries: List[tuple]) -> Dict[str, np.ndarray]:
+        """Normalised CLIP image embeddings per clip: pooled keyframes when enabled, else the thumbnail."""
+        from app.services import image_similarity
+
+        vectors = {}
+        try:
+            # shares the image embedding store and the CLIP inference queue with selection
+            if image_similarity.keyframe_embeddings_enabled():
+                vectors.update(image_similarity.encode_video_keyframes([path for path, _ in entries], self.clip_model))
+            urls = {
+                path: self._image_url(metadata)
+                for path, metadata in entries
+                if path not in vectors and self._image_url(metadata)
+            }
+            if urls:
+                by_url = image_similarity.encode_image_urls(list(urls.values()), self.clip_model)
+                vectors.update({path: by_url[url] for path, url in urls.items() if url in by_url})
+        except Exception as e:
+            logger.warning(f"ingest CLIP embeddings unavailable: {str(e)}")
+        return vectors
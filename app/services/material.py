@@ -1,21 +1,39 @@
+import json
 import os
 import random
+import shutil
+import subprocess
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List
 from urllib.parse import urlencode
 
 import requests
 from loguru import logger
+from moviepy.config import FFMPEG_BINARY
 from moviepy.video.io.VideoFileClip import VideoFileClip
 
 from app.config import config
+from app.models.exception import DownloadCancelledException
 from app.models.schema import MaterialInfo, VideoAspect, VideoConcatMode
 from app.utils import utils
 from app.services import semantic_video
+from app.services.ingest_embeddings import IngestEmbedder
+from app.services.material_cache import MaterialCache
+from app.services.material_library import MaterialLibrary
+from app.services.memory_cache import MemoryCache
+from app.services.utils import mp4, phash
 
 requested_count = 0
 
+# In-flight downloads in this process, keyed by cache directory + clip id
+_inflight_downloads: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+# Seconds between cancel checks while waiting on another caller's download
+_flight_poll_interval = 0.5
+
 
 def get_api_key(cfg_key: str):
     api_keys = config.app.get(cfg_key)
@@ -34,6 +52,11 @@ def get_api_key(cfg_key: str):
     return api_keys[requested_count % len(api_keys)]
 
 
+def estimate_video_size(width: int, height: int, fps: float, duration: float) -> int:
+    """Rough byte size of an H.264 stock clip (~0.1 bit per pixel per frame)."""
+    return int(width * height * float(fps) * duration * 0.1 / 8)
+
+
 def search_videos_pexels(
     search_term: str,
     minimum_duration: int,
@@ -82,6 +105,9 @@ def search_videos_pexels(
                     item.provider = "pexels"
                     item.url = video["link"]
                     item.duration = duration
+                    item.size = int(video.get("size") or 0) or estimate_video_size(
+                        w, h, video.get("fps") or 30, duration
+                    )
                     
                     # Capture image data for similarity comparison
                     if "image" in v:
@@ -146,6 +172,10 @@ def search_videos_pixabay(
                     item.provider = "pixabay"
                     item.url = video["url"]
                     item.duration = duration
+                    item.size = int(video.get("size") or 0) or estimate_video_size(
+                        w, int(video.get("height") or w), 30, duration
+                    )
+                    item.thumbnail_url = video.get("thumbnail", "")
                     video_items.append(item)
                     break
         return video_items
@@ -155,7 +185,463 @@ def search_videos_pixabay(
     return []
 
 
-def save_video(video_url: str, save_dir: str = "", search_term: str = "", thumbnail_url: str = "", preview_images: list = None) -> str:
+def search_videos_cache(
+    search_term: str,
+    minimum_duration: int,
+    video_aspect: VideoAspect = VideoAspect.portrait,
+) -> List[MaterialInfo]:
+    """Clips already in the material cache for this term; downloading them is free."""
+    aspect = VideoAspect(video_aspect)
+    video_width, video_height = aspect.to_resolution()
+    portrait = video_height > video_width
+
+    material_directory = config.app.get("material_directory", "").strip()
+    if material_directory == "task":
+        # per-task directories are not indexed
+        return []
+    if material_directory and not os.path.isdir(material_directory):
+        material_directory = ""
+    cache = _get_material_cache(material_directory or utils.storage_dir("cache_videos", create=True))
+    if cache is None:
+        return []
+    video_items = []
+    for entry in cache.find_by_term(search_term):
+        # rows adopted from disk have no source url and cannot be re-resolved by save_video
+        if not entry.get("url") or entry.get("duration", 0) < minimum_duration:
+            continue
+        if entry.get("width") and entry.get("height") and (entry["height"] > entry["width"]) != portrait:
+            continue
+        item = MaterialInfo()
+        item.provider = "cache"
+        item.url = entry["url"]
+        item.duration = int(entry["duration"])
+        item.size = entry.get("size", 0)
+        video_items.append(item)
+    return video_items
+
+
+def search_videos_library(
+    search_term: str,
+    minimum_duration: int,
+    video_aspect: VideoAspect = VideoAspect.portrait,
+) -> List[MaterialInfo]:
+    """Clips from the indexed local library (library_directory), no network access."""
+    try:
+        library = MaterialLibrary.get_instance().start_indexer()
+    except ValueError as e:
+        logger.error(f"search library failed: {str(e)}")
+        return []
+    return library.search(search_term, minimum_duration, video_aspect)
+
+
+# Providers queried by federated search: (name, search function, required setting)
+_federated_providers = [
+    ("pexels", search_videos_pexels, "pexels_api_keys"),
+    ("pixabay", search_videos_pixabay, "pixabay_api_keys"),
+    ("library", search_videos_library, "library_directory"),
+    ("cache", search_videos_cache, ""),
+]
+
+# Provider scores are added to the normalised rank so local and exact-size clips win ties
+_provider_bonus = {"cache": 0.5, "library": 0.5, "pexels": 0.1, "pixabay": 0.0}
+
+# Shared by all federated searches; a provider that misses its budget keeps running
+# here in the background but its results are discarded
+_search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="material-search")
+
+
+def search_videos_federated(
+    search_term: str,
+    minimum_duration: int,
+    video_aspect: VideoAspect = VideoAspect.portrait,
+) -> List[MaterialInfo]:
+    """
+    Query every configured provider concurrently and merge the results into one pool.
+
+    Each provider gets `federated_search_timeout` seconds; results arriving later
+    are dropped. Items are scored by their rank within their provider (so the
+    providers interleave) plus a small provider bonus, and deduplicated by URL.
+    """
+    budget = float(config.app.get("federated_search_timeout", 8))
+    futures = {}
+    for name, search_videos, key_setting in _federated_providers:
+        if key_setting and not config.app.get(key_setting):
+            continue
+        futures[_search_executor.submit(search_videos, search_term, minimum_duration, video_aspect)] = name
+
+    done, not_done = wait(futures, timeout=budget)
+    if not_done:
+        logger.warning(
+            f"⏱️  federated search for '{search_term}' dropped slow providers: "
+            f"{', '.join(sorted(futures[f] for f in not_done))} (budget {budget:.0f}s)"
+        )
+
+    pool: Dict[str, MaterialInfo] = {}
+    for future in done:
+        name = futures[future]
+        try:
+            items = future.result()
+        except Exception as e:
+            logger.error(f"federated search failed for {name}: {str(e)}")
+            continue
+        for rank, item in enumerate(items):
+            item.score = 1.0 - rank / len(items) + _provider_bonus.get(name, 0.0)
+            key = item.url.split("?")[0]
+            if key not in pool or pool[key].score < item.score:
+                pool[key] = item
+
+    video_items = sorted(pool.values(), key=lambda item: item.score, reverse=True)
+    counts = {futures[f]: 0 for f in done}
+    for item in video_items:
+        counts[item.provider] = counts.get(item.provider, 0) + 1
+    logger.info(f"federated search for '{search_term}': {counts}")
+    return video_items
+
+
+_download_headers = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
+}
+
+# First request of a partial fetch; large enough for ftyp + moov of most stock clips
+_range_probe_size = 256 * 1024
+
+
+def _save_metadata(video_path: str, search_term: str, thumbnail_url: str = "", preview_images: list = None, extra: dict = None):
+    additional_info = dict(extra or {})
+    if thumbnail_url:
+        additional_info["thumbnail_url"] = thumbnail_url
+    if preview_images:
+        additional_info["preview_images"] = preview_images
+    semantic_video.save_video_metadata(video_path, search_term, additional_info)
+
+
+def _remove_quietly(path: str):
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except Exception:
+        pass
+
+
+def _ffprobe_binary() -> str:
+    """ffprobe next to the configured ffmpeg, or on PATH ("" when unavailable)."""
+    sibling = os.path.join(os.path.dirname(FFMPEG_BINARY), "ffprobe" + (".exe" if os.name == "nt" else ""))
+    if os.path.dirname(FFMPEG_BINARY) and os.path.isfile(sibling):
+        return sibling
+    return shutil.which("ffprobe") or ""
+
+
+def _probe_mp4_header(video_path: str):
+    """Read duration/fps/size/codec from the moov box without decoding any frame.
+
+    Returns the probe dict, {} when the file is a broken or truncated MP4, and
+    None when it is not an MP4 at all (caller falls back to a decoder probe).
+    """
+    with open(video_path, "rb") as f:
+        head = f.read(8)
+    if len(head) < 8 or head[4:8] != b"ftyp":
+        return None
+    try:
+        movie, mdat_complete = mp4.parse_file(video_path)
+    except mp4.Mp4Error as e:
+        logger.warning(f"invalid video file: {video_path} => {str(e)}")
+        return {}
+    video = movie.video_track
+    if not mdat_complete or video is None or not video.sample_sizes:
+        logger.warning(f"invalid video file: {video_path} => truncated or missing video track")
+        return {}
+    # a file cut inside the last box still declares every sample; make sure they are on disk
+    file_size = os.path.getsize(video_path)
+    if video.sample_offsets and video.sample_offsets[-1] + video.sample_sizes[-1] > file_size:
+        logger.warning(f"invalid video file: {video_path} => samples past end of file")
+        return {}
+    duration = movie.duration_seconds or video.duration_seconds
+    return {
+        "duration": duration,
+        "fps": video.fps,
+        "width": video.width,
+        "height": video.height,
+        "codec": video.codec.strip(),
+    }
+
+
+def _probe_with_ffprobe(video_path: str):
+    """Probe a non-MP4 clip with one ffprobe call (None when ffprobe is unavailable)."""
+    ffprobe = _ffprobe_binary()
+    if not ffprobe:
+        return None
+    cmd = [
+        ffprobe, "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=codec_name,width,height,avg_frame_rate:format=duration",
+        "-of", "json", video_path,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        info = json.loads(result.stdout or "{}")
+        stream = (info.get("streams") or [{}])[0]
+        num, _, den = stream.get("avg_frame_rate", "0/1").partition("/")
+        return {
+            "duration": float(info.get("format", {}).get("duration", 0) or 0),
+            "fps": float(num) / float(den) if den and float(den) else 0.0,
+            "width": int(stream.get("width", 0)),
+            "height": int(stream.get("height", 0)),
+            "codec": stream.get("codec_name", ""),
+        }
+    except Exception as e:
+        logger.warning(f"invalid video file: {video_path} => {str(e)}")
+        return {}
+
+
+def _probe_with_moviepy(video_path: str) -> dict:
+    try:
+        clip = VideoFileClip(video_path)
+        probe = {"duration": clip.duration, "fps": clip.fps, "width": clip.size[0], "height": clip.size[1], "codec": ""}
+        clip.close()
+        return probe
+    except Exception as e:
+        logger.warning(f"invalid video file: {video_path} => {str(e)}")
+        return {}
+
+
+# Probes of stored clips, keyed by path + size + mtime (stored clips are never rewritten in place)
+_probe_cache = MemoryCache("clip_probe", 4 * 1024 * 1024)
+
+
+def probe_clip(video_path: str) -> dict:
+    """Duration/fps/size/codec of a stored clip ({} when unreadable), without decoding it.
+
+    Unlike _probe_video this never removes the file, so it is safe for library
+    footage; results are cached in memory.
+    """
+    try:
+        stat = os.stat(video_path)
+    except OSError:
+        return {}
+    key = (os.path.realpath(video_path), stat.st_size, stat.st_mtime_ns)
+    probe = _probe_cache.get(key)
+    if probe is None:
+        probe = _probe_mp4_header(video_path)
+        if probe is None:
+            probe = _probe_with_ffprobe(video_path)
+        probe = probe or {}
+        _probe_cache.put(key, probe)
+    return dict(probe)
+
+
+def _probe_video(video_path: str, expected_size: int = 0) -> dict:
+    """Validate a downloaded clip, returns its duration/fps/size/codec or an empty dict (file removed).
+
+    MP4s are checked from their header alone (moov present, mdat complete, a
+    video track with samples); other containers fall back to ffprobe, then to
+    opening the clip with moviepy. ``expected_size`` is the Content-Length of
+    the response, a short file is rejected before anything is parsed.
+    """
+    if not os.path.exists(video_path) or os.path.getsize(video_path) == 0:
+        return {}
+    file_size = os.path.getsize(video_path)
+    if expected_size and file_size != expected_size:
+        logger.warning(f"truncated download: {video_path} ({file_size}/{expected_size} bytes)")
+        _remove_quietly(video_path)
+        return {}
+
+    probe = _probe_mp4_header(video_path)
+    if probe is None:
+        probe = _probe_with_ffprobe(video_path)
+    if probe is None:
+        probe = _probe_with_moviepy(video_path)
+
+    if probe and probe.get("duration", 0) > 0 and probe.get("fps", 0) > 0:
+        return probe
+    _remove_quietly(video_path)
+    return {}
+
+
+def _thumbnail_hash(thumbnail_url: str, video_url: str = "", save_dir: str = ""):
+    """
+    pHash of a provider thumbnail, None when it cannot be fetched.
+
+    Clips already in the material index reuse the hash stored when they were
+    first downloaded, so their thumbnail is not fetched again.
+    """
+    if video_url:
+        cache = _get_material_cache(save_dir or utils.storage_dir("cache_videos", create=True))
+        cached = phash.from_hex(cache.get_thumb_hash(video_url)) if cache else None
+        if cached is not None:
+            return cached
+    try:
+        r = requests.get(
+            thumbnail_url, headers=_download_headers, proxies=config.proxy, verify=False, timeout=(10, 20)
+        )
+        if r.status_code != 200:
+            return None
+        return phash.hash_image_bytes(r.content)
+    except Exception as e:
+        logger.debug(f"thumbnail fetch failed: {thumbnail_url[:60]} => {str(e)}")
+        return None
+
+
+def clip_fingerprint(video_path: str, thumb_hash: str = ""):
+    """
+    Frame pHash of a stored clip (from the material index when known).
+
+    A newly computed hash, and the thumbnail hash it was selected with, are
+    written back to the index so the frames are only decoded once per clip.
+    """
+    cache = _get_material_cache(os.path.dirname(video_path))
+    entry = cache.get(video_path, count=False) if cache else None
+    frame_hash = phash.from_hex(entry.get("frame_hash", "")) if entry else None
+    if frame_hash is None:
+        duration = entry.get("duration", 0) if entry else 0
+        if not duration:
+            duration = probe_clip(video_path).get("duration", 0)
+        frame_hash = phash.hash_video(video_path, duration, ffmpeg=FFMPEG_BINARY)
+    if cache and entry:
+        cache.set_fingerprint(video_path, thumb_hash=thumb_hash, frame_hash=phash.to_hex(frame_hash))
+    return frame_hash
+
+
+def _get_material_cache(save_dir: str):
+    """Cache index for a shared material directory, None for per-task directories."""
+    if os.path.realpath(save_dir).startswith(os.path.realpath(utils.task_dir())):
+        return None
+    try:
+        return MaterialCache.get_instance(save_dir)
+    except Exception as e:
+        logger.warning(f"material cache index unavailable: {str(e)}")
+        return None
+
+
+def _read_content(response, cancel_event: threading.Event = None) -> bytes:
+    """Read a streamed response body, aborting as soon as cancel_event is set."""
+    data = bytearray()
+    for chunk in response.iter_content(chunk_size=256 * 1024):
+        if cancel_event is not None and cancel_event.is_set():
+            raise DownloadCancelledException("download cancelled")
+        if chunk:
+            data.extend(chunk)
+    return bytes(data)
+
+
+def _fetch_range(video_url: str, first_byte: int, last_byte: int, cancel_event: threading.Event = None):
+    """GET an inclusive byte range, returns (data, total_size) or (None, 0) if ranges are unsupported."""
+    headers = dict(_download_headers)
+    headers["Range"] = f"bytes={first_byte}-{last_byte}"
+    with requests.get(
+        video_url,
+        headers=headers,
+        proxies=config.proxy,
+        verify=False,
+        timeout=(30, 120),
+        stream=True,
+    ) as r:
+        # 200 means the server ignored the Range header, don't pull the whole file here
+        if r.status_code != 206:
+            return None, 0
+        content_range = r.headers.get("Content-Range", "")
+        total_size = int(content_range.split("/")[-1]) if "/" in content_range and not content_range.endswith("*") else 0
+        return _read_content(r, cancel_event), total_size
+
+
+def save_video_window(
+    video_url: str, segment_path: str, window_duration: float, cancel_event: threading.Event = None
+) -> dict:
+    """Fetch only a `window_duration` slice of a faststart MP4 and remux it to `segment_path`.
+
+    The moov atom is read with a small Range request and mapped to the byte
+    span covering the window (starting at the preceding keyframe). That span is
+    written at its original offset into a sparse copy of the file, so ffmpeg can
+    stream-copy the window out of it without the rest of the media data.
+    Returns window info on success, an empty dict when a full download is needed.
+    """
+    head, total_size = _fetch_range(video_url, 0, _range_probe_size - 1, cancel_event)
+    if not head or not total_size:
+        logger.debug(f"range requests not supported, full download: {video_url[:60]}")
+        return {}
+
+    moov_offset, moov_size, faststart = mp4.locate_moov(head)
+    if not faststart or moov_offset is None:
+        logger.debug(f"not a faststart mp4, full download: {video_url[:60]}")
+        return {}
+    moov_end = moov_offset + moov_size
+    if moov_end > len(head):
+        rest, _ = _fetch_range(video_url, len(head), moov_end - 1, cancel_event)
+        if not rest:
+            return {}
+        head += rest
+
+    movie = mp4.parse_moov(head[moov_offset:moov_end])
+    duration = movie.duration_seconds
+    if duration <= window_duration * 2:
+        # short clips are cheaper to fetch whole than to remux
+        return {}
+
+    window_start = random.uniform(0, duration - window_duration)
+    # pad the end so the demuxer never reads past the fetched span
+    window_end = min(duration, window_start + window_duration + 1)
+    keyframe_time, first_byte, last_byte = mp4.window_byte_range(movie, window_start, window_end)
+
+    span, _ = _fetch_range(video_url, first_byte, last_byte, cancel_event)
+    if not span or len(span) != last_byte - first_byte + 1:
+        return {}
+
+    sparse_path = f"{segment_path}.sparse"
+    try:
+        with open(sparse_path, "wb") as f:
+            f.write(head[:moov_end])
+            f.truncate(total_size)
+            f.seek(first_byte)
+            f.write(span)
+
+        cmd = [
+            FFMPEG_BINARY, "-y", "-hide_banner", "-loglevel", "error",
+            "-ss", f"{keyframe_time:.3f}",
+            "-i", sparse_path,
+            "-t", f"{window_end - keyframe_time:.3f}",
+            "-c", "copy",
+            "-avoid_negative_ts", "make_zero",
+            "-movflags", "+faststart",
+            segment_path,
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        if result.returncode != 0 or not os.path.exists(segment_path):
+            logger.warning(f"remux of partial download failed: {result.stderr.strip()[:200]}")
+            return {}
+    finally:
+        if os.path.exists(sparse_path):
+            try:
+                os.remove(sparse_path)
+            except Exception:
+                pass
+
+    fetched = len(head) + len(span)
+    logger.info(
+        f"📦 partial download: {fetched / 1024 / 1024:.1f}/{total_size / 1024 / 1024:.1f} MB "
+        f"for {window_end - keyframe_time:.1f}s of {duration:.1f}s"
+    )
+    return {
+        "partial": True,
+        "source_url": video_url,
+        "source_duration": duration,
+        "window_start": keyframe_time,
+        "window_duration": window_end - keyframe_time,
+    }
+
+
+def save_video(
+    video_url: str,
+    save_dir: str = "",
+    search_term: str = "",
+    thumbnail_url: str = "",
+    preview_images: list = None,
+    window_duration: float = 0,
+    cancel_event: threading.Event = None,
+) -> str:
+    """Download a clip into the material cache and return its path ("" if invalid).
+
+    Setting ``cancel_event`` aborts the transfer cooperatively with
+    DownloadCancelledException; the partial file is discarded. A caller
+    waiting on another caller's download of the same clip returns "" instead.
+    """
     if not save_dir:
         save_dir = utils.storage_dir("cache_videos")
 
@@ -165,81 +651,178 @@ def save_video(video_url: str, save_dir: str = "", search_term: str = "", thumbn
     url_without_query = video_url.split("?")[0]
     url_hash = utils.md5(url_without_query)
     video_id = f"vid-{url_hash}"
+
+    # Single-flight: the first caller for a clip downloads it, concurrent callers
+    # in this process wait on its future, other processes wait on the file lock
+    flight_key = f"{os.path.realpath(save_dir)}/{video_id}:{int(window_duration)}"
+    while True:
+        with _inflight_lock:
+            flight = _inflight_downloads.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = Future()
+                _inflight_downloads[flight_key] = flight
+
+        if leader:
+            break
+        logger.info(f"⏳ waiting for in-flight download: {video_id}")
+        while not flight.done():
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info(f"🛑 stopped waiting for in-flight download: {video_id}")
+                return ""
+            wait([flight], timeout=_flight_poll_interval)
+        try:
+            return flight.result()
+        except DownloadCancelledException:
+            # the task that owned the download gave up on it; take over unless we did too
+            if cancel_event is not None and cancel_event.is_set():
+                return ""
+
+    try:
+        with utils.file_lock(os.path.join(save_dir, ".locks", f"{video_id}.lock"), remove=True):
+            saved_path = _save_video(
+                video_url,
+                save_dir,
+                video_id,
+                search_term,
+                thumbnail_url,
+                preview_images,
+                window_duration,
+                cancel_event,
+            )
+        flight.set_result(saved_path)
+        return saved_path
+    except BaseException as e:
+        flight.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight_downloads.pop(flight_key, None)
+
+
+def _save_video(
+    video_url: str,
+    save_dir: str,
+    video_id: str,
+    search_term: str = "",
+    thumbnail_url: str = "",
+    preview_images: list = None,
+    window_duration: float = 0,
+    cancel_event: threading.Event = None,
+) -> str:
     video_path = f"{save_dir}/{video_id}.mp4"
 
-    # if video already exists, return the path
-    if os.path.exists(video_path) and os.path.getsize(video_path) > 0:
-        logger.info(f"video already exists: {video_path}")
-        # Save metadata if search_term is provided and metadata doesn't exist
-        if search_term and not semantic_video.load_video_metadata(video_path):
-            additional_info = {}
-            if thumbnail_url:
-                additional_info["thumbnail_url"] = thumbnail_url
-            if preview_images:
-                additional_info["preview_images"] = preview_images
-            semantic_video.save_video_metadata(video_path, search_term, additional_info)
-        return video_path
+    partial = config.app.get("partial_download", False) and window_duration > 0
+    segment_path = f"{save_dir}/{video_id}-{int(window_duration)}s.mp4"
+    # Downloads land in a private part file and are renamed into place once valid,
+    # so readers never see a partial clip
+    part_path = f"{save_dir}/{video_id}.{os.getpid()}.{threading.get_ident()}.part.mp4"
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
-    }
+    cache = _get_material_cache(save_dir)
+
+    # if video already exists, return the path; a full file also serves any window
+    candidates = [video_path, segment_path] if partial else [video_path]
+    for cached_path in candidates:
+        if os.path.exists(cached_path) and os.path.getsize(cached_path) > 0:
+            logger.info(f"video already exists: {cached_path}")
+            if cache:
+                cache.get(cached_path)
+            # Save metadata if search_term is provided and metadata doesn't exist
+            if search_term and not semantic_video.load_video_metadata(cached_path):
+                _save_metadata(cached_path, search_term, thumbnail_url, preview_images, {"source_url": video_url})
+            if search_term:
+                IngestEmbedder.get_instance().submit(cached_path)
+            return cached_path
+
+    if cache:
+        cache.record_miss()
+
+    stored_path = ""
+    probe = {}
+    extra = {"source_url": video_url}
+    if partial:
+        try:
+            window_info = save_video_window(video_url, part_path, window_duration, cancel_event)
+            if window_info:
+                probe = _probe_video(part_path)
+                if probe:
+                    os.replace(part_path, segment_path)
+                    stored_path = segment_path
+                    extra.update(window_info)
+        except DownloadCancelledException:
+            raise
+        except Exception as e:
+            logger.warning(f"partial download failed, falling back to full download: {str(e)}")
+        finally:
+            _remove_quietly(part_path)
 
-    # if video does not exist, download it
-    with open(video_path, "wb") as f:
-        f.write(
-            requests.get(
+    if not stored_path:
+        # if video does not exist, download it
+        try:
+            with requests.get(
                 video_url,
-                headers=headers,
+                headers=_download_headers,
                 proxies=config.proxy,
                 verify=False,
                 timeout=(60, 240),
-            ).content
-        )
+                stream=True,
+            ) as r, open(part_path, "wb") as f:
+                # compressed bodies are decoded on the fly, their length doesn't match the file
+                expected_size = 0 if r.headers.get("Content-Encoding") else int(r.headers.get("Content-Length", 0) or 0)
+                for chunk in r.iter_content(chunk_size=256 * 1024):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise DownloadCancelledException("download cancelled")
+                    if chunk:
+                        f.write(chunk)
+            probe = _probe_video(part_path, expected_size)
+            if not probe:
+                return ""
+            os.replace(part_path, video_path)
+            stored_path = video_path
+        finally:
+            _remove_quietly(part_path)
 
-    if os.path.exists(video_path) and os.path.getsize(video_path) > 0:
-        try:
-            clip = VideoFileClip(video_path)
-            duration = clip.duration
-            fps = clip.fps
-            clip.close()
-            if duration > 0 and fps > 0:
-                # Save metadata with search term and image data
-                if search_term:
-                    additional_info = {}
-                    if thumbnail_url:
-                        additional_info["thumbnail_url"] = thumbnail_url
-                    if preview_images:
-                        additional_info["preview_images"] = preview_images
-                    semantic_video.save_video_metadata(video_path, search_term, additional_info)
-                return video_path
-        except Exception as e:
-            try:
-                os.remove(video_path)
-            except Exception:
-                pass
-            logger.warning(f"invalid video file: {video_path} => {str(e)}")
-    return ""
+    extra.update(probe)
+    # Save metadata with search term and image data
+    if search_term:
+        _save_metadata(stored_path, search_term, thumbnail_url, preview_images, extra)
+        # embeddings are computed off the render path and land in the metadata file
+        IngestEmbedder.get_instance().submit(stored_path)
+    if cache:
+        cache.put(
+            stored_path,
+            url=video_url,
+            search_term=search_term,
+            duration=probe.get("duration", 0),
+            width=probe.get("width", 0),
+            height=probe.get("height", 0),
+            fps=probe.get("fps", 0),
+            codec=probe.get("codec", ""),
+        )
+    return stored_path
 
 
-def download_videos(
-    task_id: str,
+def search_materials(
     search_terms: List[str],
     source: str = "pexels",
     video_aspect: VideoAspect = VideoAspect.portrait,
-    video_contact_mode: VideoConcatMode = VideoConcatMode.random,
-    audio_duration: float = 0.0,
     max_clip_duration: int = 5,
-) -> List[str]:
+) -> Dict[str, List[MaterialInfo]]:
+    """Search every term and group unique results by term (URLs are deduplicated across terms)."""
     # Group videos by search term for balanced sampling
     videos_by_term = {}
     found_duration = 0.0
     search_videos = search_videos_pexels
     if source == "pixabay":
         search_videos = search_videos_pixabay
+    elif source == "federated":
+        search_videos = search_videos_federated
+    elif source == "library":
+        search_videos = search_videos_library
 
     # Global URL tracking to prevent duplicates across all search terms
     global_video_urls = set()
-    
+
     for search_term in search_terms:
         video_items = search_videos(
             search_term=search_term,
@@ -251,7 +834,7 @@ def download_videos(
         # Filter out duplicates and associate with search term
         unique_videos = []
         duplicates_removed = 0
-        
+
         for item in video_items:
             # Check for URL duplicates across all search terms
             if item.url not in global_video_urls:
@@ -261,18 +844,28 @@ def download_videos(
                 found_duration += item.duration
             else:
                 duplicates_removed += 1
-        
+
         if duplicates_removed > 0:
             logger.info(f"removed {duplicates_removed} duplicate URLs for '{search_term}'")
-        
+
         if unique_videos:
             videos_by_term[search_term] = unique_videos
 
     logger.info(
-        f"found videos from {len(videos_by_term)} search terms, total duration: {found_duration} seconds, required: {audio_duration} seconds"
+        f"found videos from {len(videos_by_term)} search terms, total duration: {found_duration} seconds"
     )
     logger.info(f"total unique video URLs: {len(global_video_urls)}")
+    return videos_by_term
+
 
+def select_materials(
+    videos_by_term: Dict[str, List[MaterialInfo]],
+    search_terms: List[str],
+    audio_duration: float,
+    max_clip_duration: int = 5,
+    video_contact_mode: VideoConcatMode = VideoConcatMode.random,
+) -> List[MaterialInfo]:
+    """Pick a balanced, round-robin set of candidates large enough to cover audio_duration."""
     # Calculate needed clips for quality checks
     needed_clips = int(audio_duration / max_clip_duration) if max_clip_duration > 0 else 1
 
@@ -324,119 +917,400 @@ def download_videos(
     else:
         logger.info(f"   ✅ Good pool size: {len(valid_video_items)} videos for ~{needed_clips} clips")
 
-    # Helper function for parallel downloads
-    def download_single_video(item):
-        """Download a single video (for parallel execution)"""
+    return valid_video_items
+
+
+def expected_download_size(item: MaterialInfo, max_clip_duration: int = 5, partial: bool = False) -> float:
+    """Bytes a download of item is expected to transfer (estimated when the provider gives no size)."""
+    size = item.size or estimate_video_size(1080, 1920, 30, item.duration or max_clip_duration)
+    if partial and item.duration > max_clip_duration * 2:
+        # only the window (plus a GOP of slack) is fetched
+        size = size * min(1.0, (max_clip_duration + 2) / item.duration)
+    return size
+
+
+def schedule_downloads(
+    candidates: List[MaterialInfo],
+    max_clip_duration: int = 5,
+    partial: bool = False,
+) -> List[MaterialInfo]:
+    """
+    Order downloads so the cheapest footage lands first.
+
+    Cost is the expected bytes per usable second: a clip contributes at most
+    max_clip_duration seconds, so a long 4K file is a poor deal compared with a
+    short 1080p one. Terms are still interleaved round-robin to keep the pool
+    balanced; within each term (and each round) the cheapest clips go first.
+    """
+    def cost(item: MaterialInfo) -> float:
+        if item.provider in ("cache", "library"):
+            return 0.0
+        usable = min(max_clip_duration, item.duration) or 1
+        return expected_download_size(item, max_clip_duration, partial) / usable
+
+    by_term: Dict[str, List[MaterialInfo]] = {}
+    for item in candidates:
+        by_term.setdefault(item.search_term, []).append(item)
+    for items in by_term.values():
+        items.sort(key=cost)
+
+    scheduled = []
+    for round_num in range(max((len(v) for v in by_term.values()), default=0)):
+        wave = [items[round_num] for items in by_term.values() if round_num < len(items)]
+        wave.sort(key=cost)
+        scheduled.extend(wave)
+    return scheduled
+
+
+class MaterialPrefetch:
+    """
+    Searches and downloads materials against a target duration that may change while it runs.
+
+    task.start launches it as soon as search terms exist, with a target estimated from the
+    script, and corrects the target once TTS reports the real audio duration: downloads
+    that are no longer needed are not started, missing footage is topped up.
+
+    Usage:
+        prefetch = MaterialPrefetch(task_id, terms, target_duration=estimate, final=False).start()
+        ...
+        prefetch.set_target(audio_duration)
+        video_paths = prefetch.result()
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        search_terms: List[str],
+        source: str = "pexels",
+        video_aspect: VideoAspect = VideoAspect.portrait,
+        video_contact_mode: VideoConcatMode = VideoConcatMode.random,
+        target_duration: float = 0.0,
+        max_clip_duration: int = 5,
+        final: bool = True,
+    ):
+        self.task_id = task_id
+        self.search_terms = search_terms
+        self.source = source
+        self.video_aspect = video_aspect
+        self.video_contact_mode = video_contact_mode
+        self.max_clip_duration = max_clip_duration
+
+        self._cond = threading.Condition()
+        self._target = target_duration
+        self._target_final = final
+        self._cancelled = False
+        self._thread = None
+        self._video_paths: List[str] = []
+
+        # Perceptual hashes claimed by this task's downloads (thumbnails before, frames after)
+        self._near_duplicate_threshold = int(config.app.get("near_duplicate_threshold", 6))
+        self._fingerprint_lock = threading.Lock()
+        self._thumb_hashes: Dict[str, int] = {}
+        self._frame_hashes: Dict[str, int] = {}
+
+    def start(self) -> "MaterialPrefetch":
+        """Run in a background thread."""
+        self._thread = threading.Thread(
+            target=self._run_in_background, daemon=True, name=f"MaterialPrefetch-{self.task_id[:8]}"
+        )
+        self._thread.start()
+        return self
+
+    def _run_in_background(self):
         try:
-            item_search_term = getattr(item, 'search_term', 'unknown')
-            logger.info(f"📥 Downloading: {item.url[:60]}...")
-            
-            saved_video_path = save_video(
-                video_url=item.url,
-                save_dir=material_directory,
-                search_term=item_search_term,
-                thumbnail_url=item.thumbnail_url,
-                preview_images=item.preview_images
-            )
-            
-            if saved_video_path:
-                return {
-                    'path': saved_video_path,
-                    'url': item.url,
-                    'duration': min(max_clip_duration, item.duration),
-                    'search_term': item_search_term
-                }
+            self.run()
         except Exception as e:
-            logger.error(f"❌ Failed to download {item.url[:60]}: {str(e)}")
-        return None
-    
-    # Setup directory
-    video_paths = []
-    material_directory = config.app.get("material_directory", "").strip()
-    if material_directory == "task":
-        material_directory = utils.task_dir(task_id)
-    elif material_directory and not os.path.isdir(material_directory):
-        material_directory = ""
+            logger.error(f"❌ material prefetch failed: {str(e)}")
 
-    total_duration = 0.0
-    downloaded_urls = set()
-    
-    # Get max workers from config or use default
-    max_workers = config.app.get("max_download_workers", 5)
-    logger.info(f"🚀 Starting parallel downloads with {max_workers} workers")
-    logger.info(f"📊 Target: {audio_duration:.1f}s from {len(valid_video_items)} videos")
-    
-    start_time = time.time()
-    successful = 0
-    failed = 0
-    
-    # Parallel download with ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all download tasks
-        future_to_item = {
-            executor.submit(download_single_video, item): item
-            for item in valid_video_items
-        }
-        
-        # Process completed downloads as they finish
-        for future in as_completed(future_to_item):
-            # Check if we already have enough duration
-            if total_duration >= audio_duration:
-                logger.info(f"✓ Target duration reached, stopping downloads...")
-                # Cancel remaining futures
-                for f in future_to_item:
-                    if not f.done():
-                        f.cancel()
-                break
-            
+    def set_target(self, target_duration: float, final: bool = True):
+        """Replace the target duration (e.g. once the real audio duration is known)."""
+        with self._cond:
+            if target_duration != self._target:
+                logger.info(f"🎯 material target adjusted: {self._target:.1f}s → {target_duration:.1f}s")
+            self._target = target_duration
+            self._target_final = final
+            self._cond.notify_all()
+
+    def cancel(self):
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify_all()
+
+    def result(self, timeout: float = None) -> List[str]:
+        """
+        Wait for the background run and return the downloaded paths.
+
+        A run still going after timeout seconds is cancelled and whatever
+        landed so far is returned.
+        """
+        if self._thread:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning(f"material prefetch still running after {timeout:.0f}s, cancelling it")
+                self.cancel()
+                self._thread.join(5)
+        return list(self._video_paths)
+
+    def _claim_fingerprint(self, claimed: Dict[str, int], url: str, value) -> bool:
+        """Reserve a hash for url unless a near-duplicate is already claimed."""
+        if value is None or self._near_duplicate_threshold <= 0:
+            return True
+        with self._fingerprint_lock:
+            if phash.is_near_duplicate(value, claimed.values(), self._near_duplicate_threshold):
+                return False
+            claimed[url] = value
+            return True
+
+    def _release_fingerprints(self, url: str):
+        with self._fingerprint_lock:
+            self._thumb_hashes.pop(url, None)
+            self._frame_hashes.pop(url, None)
+
+    def _material_directory(self) -> str:
+        material_directory = config.app.get("material_directory", "").strip()
+        if material_directory == "task":
+            material_directory = utils.task_dir(self.task_id)
+        elif material_directory and not os.path.isdir(material_directory):
+            material_directory = ""
+        return material_directory
+
+    def run(self) -> List[str]:
+        videos_by_term = search_materials(
+            search_terms=self.search_terms,
+            source=self.source,
+            video_aspect=self.video_aspect,
+            max_clip_duration=self.max_clip_duration,
+        )
+
+        planned_for = self._target
+        candidates = select_materials(
+            videos_by_term, self.search_terms, planned_for, self.max_clip_duration, self.video_contact_mode
+        )
+        candidate_urls = {item.url for item in candidates}
+        max_clip_duration = self.max_clip_duration
+        partial = config.app.get("partial_download", False)
+        candidates = schedule_downloads(candidates, max_clip_duration, partial)
+
+        # Helper function for parallel downloads
+        def download_single_video(item):
+            """Download a single video (for parallel execution)"""
             try:
-                result = future.result(timeout=120)  # 2 min timeout per download
-                
-                if result and result['url'] not in downloaded_urls:
-                    video_paths.append(result['path'])
-                    downloaded_urls.add(result['url'])
-                    total_duration += result['duration']
-                    successful += 1
-                    
-                    progress = (total_duration / audio_duration) * 100 if audio_duration > 0 else 0
-                    logger.info(
-                        f"✅ Progress: {total_duration:.1f}/{audio_duration:.1f}s "
-                        f"({progress:.0f}%) | {len(video_paths)} videos"
-                    )
-                else:
-                    failed += 1
-                    
+                item_search_term = getattr(item, 'search_term', 'unknown')
+
+                if item.provider == "library":
+                    # library clips are used in place, nothing to download
+                    return {
+                        'path': item.url,
+                        'url': item.url,
+                        'duration': min(max_clip_duration, item.duration),
+                        'search_term': item_search_term
+                    }
+
+                # Same footage under another ID/rendition: skip it before spending bandwidth
+                thumb_hash = None
+                if dedupe and item.thumbnail_url:
+                    thumb_hash = _thumbnail_hash(item.thumbnail_url, item.url, material_directory)
+                    if not self._claim_fingerprint(self._thumb_hashes, item.url, thumb_hash):
+                        logger.info(f"♻️  Skipping near-duplicate (thumbnail): {item.url[:60]}")
+                        return {'skipped': True, 'url': item.url}
+
+                logger.info(f"📥 Downloading: {item.url[:60]}...")
+
+                saved_video_path = save_video(
+                    video_url=item.url,
+                    save_dir=material_directory,
+                    search_term=item_search_term,
+                    thumbnail_url=item.thumbnail_url,
+                    preview_images=item.preview_images,
+                    window_duration=max_clip_duration,
+                    cancel_event=cancel_event,
+                )
+
+                if saved_video_path and dedupe:
+                    # confirm from decoded frames, thumbnails can differ for the same shot
+                    frame_hash = clip_fingerprint(saved_video_path, phash.to_hex(thumb_hash))
+                    if not self._claim_fingerprint(self._frame_hashes, item.url, frame_hash):
+                        logger.info(f"♻️  Skipping near-duplicate (frames): {item.url[:60]}")
+                        self._release_fingerprints(item.url)
+                        return {'skipped': True, 'url': item.url}
+
+                if saved_video_path:
+                    return {
+                        'path': saved_video_path,
+                        'url': item.url,
+                        'duration': min(max_clip_duration, item.duration),
+                        'search_term': item_search_term
+                    }
+            except DownloadCancelledException:
+                logger.debug(f"download cancelled: {item.url[:60]}")
             except Exception as e:
-                failed += 1
-                logger.error(f"❌ Download exception: {str(e)}")
-    
-    elapsed_time = time.time() - start_time
-    
-    # Summary statistics
-    logger.success(f"\n{'='*60}")
-    logger.success(f"📊 DOWNLOAD SUMMARY")
-    logger.success(f"{'='*60}")
-    logger.success(f"✅ Successful:       {successful} videos")
-    logger.success(f"❌ Failed:           {failed} videos")
-    logger.success(f"⏱️  Total time:       {elapsed_time:.1f}s")
-    logger.success(f"📹 Total duration:   {total_duration:.1f}s (target: {audio_duration:.1f}s)")
-    
-    if successful > 0:
-        avg_time = elapsed_time / successful
-        logger.success(f"⚡ Avg per video:    {avg_time:.1f}s")
-        
-        # Calculate theoretical speedup vs sequential
-        sequential_time = successful * avg_time
-        speedup = sequential_time / elapsed_time if elapsed_time > 0 else 1
-        logger.success(f"🚀 Speedup:          {speedup:.1f}× faster than sequential")
-    
-    logger.success(f"{'='*60}\n")
-    
-    # Final diversity report
-    logger.success(f"downloaded {len(video_paths)} videos")
-    logger.info(f"🎯 Final diversity: {len(downloaded_urls)} unique URLs downloaded")
-    
-    return video_paths
+                logger.error(f"❌ Failed to download {item.url[:60]}: {str(e)}")
+            self._release_fingerprints(item.url)
+            return None
+
+        # Setup directory
+        video_paths = self._video_paths
+        material_directory = self._material_directory()
+        dedupe = self._near_duplicate_threshold > 0
+
+        total_duration = 0.0
+        downloaded_urls = set()
+
+        # Get max workers from config or use default
+        max_workers = config.app.get("max_download_workers", 5)
+        logger.info(f"🚀 Starting parallel downloads with {max_workers} workers")
+        logger.info(f"📊 Target: {self._target:.1f}s from {len(candidates)} videos")
+
+        start_time = time.time()
+        successful = 0
+        failed = 0
+        skipped = 0
+        next_index = 0
+        future_to_item = {}
+
+        # Parallel download with ThreadPoolExecutor. Downloads are fed to the pool only
+        # while landed + in-flight footage is short of the (possibly moving) target.
+        # Once enough has landed, in-flight transfers are cancelled cooperatively and
+        # the stage returns without waiting for them.
+        cancel_event = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            while True:
+                with self._cond:
+                    if self._cancelled:
+                        logger.info("material download cancelled")
+                        break
+                    target = self._target
+                    final = self._target_final
+
+                # Check if we already have enough duration
+                if total_duration >= target and final:
+                    logger.info(f"✓ Target duration reached, stopping downloads...")
+                    break
+
+                # Top up the candidate pool when the target grew past what was planned
+                if target > planned_for:
+                    planned_for = target
+                    extra_candidates = []
+                    for item in select_materials(
+                        videos_by_term, self.search_terms, planned_for, max_clip_duration, self.video_contact_mode
+                    ):
+                        if item.url not in candidate_urls:
+                            extra_candidates.append(item)
+                            candidate_urls.add(item.url)
+                    candidates.extend(schedule_downloads(extra_candidates, max_clip_duration, partial))
+
+                in_flight = sum(min(max_clip_duration, i.duration) for i in future_to_item.values())
+                while (
+                    next_index < len(candidates)
+                    and len(future_to_item) < max_workers
+                    and total_duration + in_flight < target
+                ):
+                    item = candidates[next_index]
+                    next_index += 1
+                    future_to_item[executor.submit(download_single_video, item)] = item
+                    in_flight += min(max_clip_duration, item.duration)
+
+                if not future_to_item:
+                    if final and (next_index >= len(candidates) or total_duration >= target):
+                        break
+                    # Estimated target already covered (or nothing left): wait for a new target
+                    with self._cond:
+                        if not self._cancelled and self._target == target and self._target_final == final:
+                            self._cond.wait(timeout=1)
+                    continue
+
+                done, _ = wait(future_to_item, timeout=1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future_to_item.pop(future)
+                    try:
+                        result = future.result()
+
+                        if result and result.get('skipped'):
+                            skipped += 1
+                        elif result and result['url'] not in downloaded_urls:
+                            video_paths.append(result['path'])
+                            downloaded_urls.add(result['url'])
+                            total_duration += result['duration']
+                            successful += 1
+
+                            progress = (total_duration / target) * 100 if target > 0 else 0
+                            logger.info(
+                                f"✅ Progress: {total_duration:.1f}/{target:.1f}s "
+                                f"({progress:.0f}%) | {len(video_paths)} videos"
+                            )
+                        else:
+                            failed += 1
+
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"❌ Download exception: {str(e)}")
+        finally:
+            cancel_event.set()
+            if future_to_item:
+                logger.info(f"🛑 cancelling {len(future_to_item)} in-flight downloads")
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        elapsed_time = time.time() - start_time
+        target = self._target
+
+        # Summary statistics
+        logger.success(f"\n{'='*60}")
+        logger.success(f"📊 DOWNLOAD SUMMARY")
+        logger.success(f"{'='*60}")
+        logger.success(f"✅ Successful:       {successful} videos")
+        logger.success(f"❌ Failed:           {failed} videos")
+        if skipped:
+            logger.success(f"♻️  Near-duplicates:  {skipped} videos skipped")
+        logger.success(f"⏱️  Total time:       {elapsed_time:.1f}s")
+        logger.success(f"📹 Total duration:   {total_duration:.1f}s (target: {target:.1f}s)")
+
+        if successful > 0:
+            avg_time = elapsed_time / successful
+            logger.success(f"⚡ Avg per video:    {avg_time:.1f}s")
+
+            # Calculate theoretical speedup vs sequential
+            sequential_time = successful * avg_time
+            speedup = sequential_time / elapsed_time if elapsed_time > 0 else 1
+            logger.success(f"🚀 Speedup:          {speedup:.1f}× faster than sequential")
+
+        logger.success(f"{'='*60}\n")
+
+        # Final diversity report
+        logger.success(f"downloaded {len(video_paths)} videos")
+        logger.info(f"🎯 Final diversity: {len(downloaded_urls)} unique URLs downloaded")
+
+        cache = _get_material_cache(material_directory or utils.storage_dir("cache_videos"))
+        if cache:
+            cache_stats = cache.get_stats()
+            logger.info(
+                f"🗄️  Material cache: {cache_stats['entries']} clips, "
+                f"{cache_stats['total_size'] / 1024 / 1024:.0f} MB, "
+                f"hit rate {cache_stats['hit_rate'] * 100:.0f}% "
+                f"({cache_stats['hits']} hits / {cache_stats['misses']} misses)"
+            )
+
+        return list(video_paths)
+
+
+def download_videos(
+    task_id: str,
+    search_terms: List[str],
+    source: str = "pexels",
+    video_aspect: VideoAspect = VideoAspect.portrait,
+    video_contact_mode: VideoConcatMode = VideoConcatMode.random,
+    audio_duration: float = 0.0,
+    max_clip_duration: int = 5,
+) -> List[str]:
+    return MaterialPrefetch(
+        task_id=task_id,
+        search_terms=search_terms,
+        source=source,
+        video_aspect=video_aspect,
+        video_contact_mode=video_contact_mode,
+        target_duration=audio_duration,
+        max_clip_duration=max_clip_duration,
+    ).run()
 
 
 if __name__ == "__main__":
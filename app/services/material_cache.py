@@ -0,0 +1,395 @@
+"""
+MaterialCache - SQLite index over the downloaded material cache.
+
+Benefits:
+- One row per cached clip: URL, hash, size, duration, resolution, search terms,
+  last access and hit count
+- Byte quota with LRU or LFU eviction (files + metadata sidecars are removed)
+- Reconciles with files that were downloaded before the index existed
+- Hit-rate statistics that survive restarts
+- Header probe results (fps, codec) so clips are never re-opened to be inspected
+- Perceptual fingerprints (thumbnail and decoded-frame pHash) for near-duplicate checks
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from app.config import config
+from app.utils import utils
+
+INDEX_FILE = "material_index.db"
+
+# Entries touched this recently may belong to a running task and are never evicted
+_eviction_grace_seconds = 600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS materials (
+    path TEXT PRIMARY KEY,
+    url TEXT DEFAULT '',
+    url_hash TEXT DEFAULT '',
+    size INTEGER DEFAULT 0,
+    duration REAL DEFAULT 0,
+    width INTEGER DEFAULT 0,
+    height INTEGER DEFAULT 0,
+    search_terms TEXT DEFAULT '[]',
+    created_at REAL DEFAULT 0,
+    last_access REAL DEFAULT 0,
+    hit_count INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_materials_url_hash ON materials (url_hash);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value INTEGER DEFAULT 0
+);
+"""
+
+# Columns added after the first release, created on open for older index files
+_MIGRATIONS = {
+    "fps": "REAL DEFAULT 0",
+    "codec": "TEXT DEFAULT ''",
+    "thumb_hash": "TEXT DEFAULT ''",
+    "frame_hash": "TEXT DEFAULT ''",
+}
+
+
+def _url_hash(url: str) -> str:
+    """Hash of a source URL without its query string (signed links change per request)."""
+    return utils.md5(url.split("?")[0]) if url else ""
+
+
+def _terms_json(terms: List[str]) -> str:
+    # Stored unescaped so find_by_term can match non-ASCII terms
+    return json.dumps(terms, ensure_ascii=False)
+
+
+def _like_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class MaterialCache:
+    """
+    Size-bounded index over one material directory (one instance per directory).
+
+    Usage:
+        cache = MaterialCache.get_instance()
+        entry = cache.get(video_path)        # counts a hit/miss, touches LRU state
+        cache.put(video_path, url=..., search_term=..., duration=...)
+        cache.get_stats()
+    """
+
+    _instances: Dict[str, "MaterialCache"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = os.path.realpath(cache_dir)
+        self.db_path = os.path.join(self.cache_dir, INDEX_FILE)
+        self.max_size = int(config.app.get("material_cache_max_size_mb", 0)) * 1024 * 1024
+        self.eviction_policy = config.app.get("material_cache_eviction", "lru").strip().lower()
+        self._db_lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            self._migrate(conn)
+
+        added, removed = self.reconcile()
+        stats = self.get_stats()
+        logger.info(
+            f"🗄️  MaterialCache ready: {stats['entries']} clips, "
+            f"{stats['total_size'] / 1024 / 1024:.0f} MB "
+            f"(quota: {self.max_size / 1024 / 1024:.0f} MB, policy={self.eviction_policy}, "
+            f"reconciled +{added}/-{removed})"
+        )
+
+    @classmethod
+    def get_instance(cls, cache_dir: str = "") -> "MaterialCache":
+        """Get the cache for a directory (thread-safe, defaults to storage/cache_videos)."""
+        if not cache_dir:
+            cache_dir = utils.storage_dir("cache_videos", create=True)
+        key = os.path.realpath(cache_dir)
+        if key not in cls._instances:
+            with cls._lock:
+                if key not in cls._instances:
+                    cls._instances[key] = MaterialCache(key)
+        return cls._instances[key]
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            # WAL lets API workers and the webui share the index
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _migrate(self, conn: sqlite3.Connection):
+        columns = {r["name"] for r in conn.execute("PRAGMA table_info(materials)")}
+        for column, definition in _MIGRATIONS.items():
+            if column not in columns:
+                conn.execute(f"ALTER TABLE materials ADD COLUMN {column} {definition}")
+        # Rows adopted from disk by older versions were stored without their URL hash
+        for row in conn.execute("SELECT path, url FROM materials WHERE url_hash = '' AND url != ''").fetchall():
+            conn.execute("UPDATE materials SET url_hash = ? WHERE path = ?", (_url_hash(row["url"]), row["path"]))
+
+    def _key(self, path: str) -> str:
+        return os.path.basename(path)
+
+    def _row_to_entry(self, row: sqlite3.Row) -> Dict[str, Any]:
+        entry = dict(row)
+        entry["search_terms"] = json.loads(entry.get("search_terms") or "[]")
+        entry["video_path"] = os.path.join(self.cache_dir, entry["path"])
+        return entry
+
+    def _bump_stat(self, conn: sqlite3.Connection, key: str, amount: int = 1):
+        conn.execute(
+            "INSERT INTO stats (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+            (key, amount),
+        )
+
+    # ========================================================================
+    # LOOKUP & STORE
+    # ========================================================================
+
+    def get(self, path: str, count: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached clip by path. A hit refreshes its LRU/LFU state.
+        Rows whose file disappeared are dropped; files missing from the index are adopted.
+        """
+        key = self._key(path)
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        now = time.time()
+        with self._db_lock, self._connect() as conn:
+            row = conn.execute("SELECT * FROM materials WHERE path = ?", (key,)).fetchone()
+            if not exists:
+                if row:
+                    conn.execute("DELETE FROM materials WHERE path = ?", (key,))
+                if count:
+                    self._bump_stat(conn, "misses")
+                return None
+            if row is None:
+                self._insert_from_disk(conn, path)
+            conn.execute(
+                "UPDATE materials SET last_access = ?, hit_count = hit_count + ? WHERE path = ?",
+                (now, 1 if count else 0, key),
+            )
+            if count:
+                self._bump_stat(conn, "hits")
+            row = conn.execute("SELECT * FROM materials WHERE path = ?", (key,)).fetchone()
+        return self._row_to_entry(row)
+
+    def record_miss(self):
+        with self._db_lock, self._connect() as conn:
+            self._bump_stat(conn, "misses")
+
+    def put(
+        self,
+        path: str,
+        url: str = "",
+        search_term: str = "",
+        duration: float = 0,
+        width: int = 0,
+        height: int = 0,
+        fps: float = 0,
+        codec: str = "",
+    ) -> Dict[str, Any]:
+        """Record a newly stored clip and enforce the quota."""
+        key = self._key(path)
+        now = time.time()
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        url_hash = _url_hash(url)
+        with self._db_lock, self._connect() as conn:
+            row = conn.execute("SELECT search_terms FROM materials WHERE path = ?", (key,)).fetchone()
+            terms = json.loads(row["search_terms"]) if row else []
+            if search_term and search_term not in terms:
+                terms.append(search_term)
+            conn.execute(
+                "INSERT INTO materials (path, url, url_hash, size, duration, width, height, fps, codec, "
+                "search_terms, created_at, last_access, hit_count) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0) "
+                "ON CONFLICT(path) DO UPDATE SET url = excluded.url, url_hash = excluded.url_hash, "
+                "size = excluded.size, duration = excluded.duration, width = excluded.width, "
+                "height = excluded.height, fps = excluded.fps, codec = excluded.codec, "
+                "search_terms = excluded.search_terms, last_access = excluded.last_access",
+                (key, url, url_hash, size, duration, width, height, fps, codec, _terms_json(terms), now, now),
+            )
+            row = conn.execute("SELECT * FROM materials WHERE path = ?", (key,)).fetchone()
+        self.enforce_quota(protect={key})
+        return self._row_to_entry(row)
+
+    def set_fingerprint(self, path: str, thumb_hash: str = "", frame_hash: str = ""):
+        """Store perceptual hashes (hex) for an indexed clip; empty values are left untouched."""
+        with self._db_lock, self._connect() as conn:
+            if thumb_hash:
+                conn.execute("UPDATE materials SET thumb_hash = ? WHERE path = ?", (thumb_hash, self._key(path)))
+            if frame_hash:
+                conn.execute("UPDATE materials SET frame_hash = ? WHERE path = ?", (frame_hash, self._key(path)))
+
+    def has_url(self, url: str) -> bool:
+        """Whether a clip downloaded from this URL (query string ignored) is indexed."""
+        url_hash = _url_hash(url)
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM materials WHERE url_hash = ? LIMIT 1", (url_hash,)).fetchone()
+        return row is not None
+
+    def get_thumb_hash(self, url: str) -> str:
+        """Thumbnail pHash (hex) stored for a clip downloaded from this URL, "" if unknown."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT thumb_hash FROM materials WHERE url_hash = ? AND thumb_hash != '' LIMIT 1",
+                (_url_hash(url),),
+            ).fetchone()
+        return row["thumb_hash"] if row else ""
+
+    def find_by_term(self, search_term: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Cached clips previously downloaded for a search term, most used first."""
+        # Match the term as one JSON string element; rows written before terms were
+        # stored unescaped hold the ASCII-escaped form
+        patterns = [
+            "%" + _like_escape(json.dumps(search_term, ensure_ascii=ascii_only)) + "%"
+            for ascii_only in (False, True)
+        ]
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM materials WHERE search_terms LIKE ? ESCAPE '\\' OR search_terms LIKE ? ESCAPE '\\' "
+                "ORDER BY hit_count DESC, last_access DESC LIMIT ?",
+                (*patterns, limit),
+            ).fetchall()
+        return [self._row_to_entry(r) for r in rows]
+
+    # ========================================================================
+    # EVICTION & RECONCILIATION
+    # ========================================================================
+
+    def remove(self, path: str):
+        """Delete a clip, its metadata sidecar and its index row."""
+        from app.services import semantic_video
+
+        full_path = os.path.join(self.cache_dir, self._key(path))
+        for p in (full_path, semantic_video.get_metadata_path(full_path)):
+            try:
+                if os.path.exists(p):
+                    os.remove(p)
+            except Exception as e:
+                logger.warning(f"failed to remove cached file {p}: {e}")
+        with self._db_lock, self._connect() as conn:
+            conn.execute("DELETE FROM materials WHERE path = ?", (self._key(path),))
+
+    def enforce_quota(self, protect: set = None) -> int:
+        """Evict clips until the cache fits in its byte quota. Returns the number evicted."""
+        if self.max_size <= 0:
+            return 0
+        protect = protect or set()
+        order = "hit_count ASC, last_access ASC" if self.eviction_policy == "lfu" else "last_access ASC"
+        cutoff = time.time() - _eviction_grace_seconds
+
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM materials").fetchone()[0]
+            if total <= self.max_size:
+                return 0
+            candidates = conn.execute(
+                f"SELECT path, size FROM materials WHERE last_access < ? ORDER BY {order}",
+                (cutoff,),
+            ).fetchall()
+
+        evicted = 0
+        freed = 0
+        for row in candidates:
+            if total - freed <= self.max_size:
+                break
+            if row["path"] in protect:
+                continue
+            self.remove(row["path"])
+            freed += row["size"]
+            evicted += 1
+
+        if evicted:
+            with self._db_lock, self._connect() as conn:
+                self._bump_stat(conn, "evictions", evicted)
+            logger.info(f"🧹 MaterialCache evicted {evicted} clips ({freed / 1024 / 1024:.1f} MB)")
+        if total - freed > self.max_size:
+            logger.warning("⚠️  MaterialCache is over quota but remaining clips are in use")
+        return evicted
+
+    def _insert_from_disk(self, conn: sqlite3.Connection, path: str):
+        from app.services import semantic_video
+
+        metadata = semantic_video.load_video_metadata(path) or {}
+        search_term = metadata.get("search_term", "")
+        source_url = metadata.get("source_url", "")
+        stat = os.stat(path)
+        conn.execute(
+            "INSERT OR IGNORE INTO materials (path, url, url_hash, size, duration, width, height, fps, codec, "
+            "search_terms, created_at, last_access, hit_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+            (
+                self._key(path),
+                source_url,
+                _url_hash(source_url),
+                stat.st_size,
+                metadata.get("duration", 0),
+                metadata.get("width", 0),
+                metadata.get("height", 0),
+                metadata.get("fps", 0),
+                metadata.get("codec", ""),
+                _terms_json([search_term] if search_term else []),
+                stat.st_mtime,
+                stat.st_atime,
+            ),
+        )
+
+    def reconcile(self):
+        """Sync the index with the directory. Returns (added, removed)."""
+        on_disk = set()
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".mp4") and ".part" not in name:
+                path = os.path.join(self.cache_dir, name)
+                if os.path.isfile(path) and os.path.getsize(path) > 0:
+                    on_disk.add(name)
+
+        with self._db_lock, self._connect() as conn:
+            indexed = {r["path"] for r in conn.execute("SELECT path FROM materials").fetchall()}
+            missing = indexed - on_disk
+            untracked = on_disk - indexed
+            for name in missing:
+                conn.execute("DELETE FROM materials WHERE path = ?", (name,))
+            for name in untracked:
+                self._insert_from_disk(conn, os.path.join(self.cache_dir, name))
+
+        self.enforce_quota()
+        return len(untracked), len(missing)
+
+    # ========================================================================
+    # STATUS
+    # ========================================================================
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get entry count, size, quota and hit-rate statistics."""
+        with self._connect() as conn:
+            entries, total_size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM materials"
+            ).fetchone()
+            counters = {r["key"]: r["value"] for r in conn.execute("SELECT key, value FROM stats")}
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "cache_dir": self.cache_dir,
+            "entries": entries,
+            "total_size": total_size,
+            "max_size": self.max_size,
+            "eviction_policy": self.eviction_policy,
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
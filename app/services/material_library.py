@@ -0,0 +1,442 @@
+"""
+MaterialLibrary - offline video source over a pre-indexed local directory tree.
+
+Benefits:
+- Searches a licensed footage library (or the download cache) without network access
+- One row per clip: probe data, text tags, sentence embedding of the tags and a
+  CLIP embedding of a keyframe
+- Incremental background indexing: only new or modified files are processed
+- The index lives under storage/library, the library directory is never written to
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+from moviepy.config import FFMPEG_BINARY
+
+from app.config import config
+from app.models.schema import MaterialInfo, VideoAspect
+from app.services.embedding_store import EmbeddingStore
+from app.services.ingest_embeddings import clip_model_name, text_model_name
+from app.services.utils import keyframes
+from app.utils import utils
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".mkv", ".webm")
+
+# Embedding matches below this cosine similarity are not returned
+_min_text_score = 0.25
+
+# Files indexed per batch (one embedding call per batch)
+_index_batch_size = 32
+
+_TOKEN_SPLIT = re.compile(r"[\W_]+", re.UNICODE)
+_HASH_TOKEN = re.compile(r"^[0-9a-f]{12,}$")
+_STOPWORDS = {"vid", "video", "clip", "stock", "footage", "the", "and", "of", "mp4", "mov"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    path TEXT PRIMARY KEY,
+    mtime REAL DEFAULT 0,
+    size INTEGER DEFAULT 0,
+    duration REAL DEFAULT 0,
+    fps REAL DEFAULT 0,
+    width INTEGER DEFAULT 0,
+    height INTEGER DEFAULT 0,
+    codec TEXT DEFAULT '',
+    tags TEXT DEFAULT '[]',
+    text_embedding BLOB,
+    clip_embedding BLOB,
+    indexed_at REAL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT DEFAULT ''
+);
+"""
+
+
+def extract_tags(relative_path: str, metadata: Optional[Dict] = None) -> List[str]:
+    """Tags of a clip: words of its folder and file names plus the search term it was downloaded for."""
+    stem = os.path.splitext(relative_path)[0]
+    tags = []
+    for token in _TOKEN_SPLIT.split(stem.lower()):
+        if len(token) < 3 or token.isdigit() or _HASH_TOKEN.match(token) or token in _STOPWORDS:
+            continue
+        if token not in tags:
+            tags.append(token)
+    search_term = (metadata or {}).get("search_term", "").strip().lower()
+    if search_term and search_term not in tags:
+        tags.insert(0, search_term)
+    return tags
+
+
+def _to_blob(vector: Optional[np.ndarray]) -> Optional[bytes]:
+    return np.asarray(vector, dtype=np.float16).tobytes() if vector is not None else None
+
+
+def _from_blob(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    return np.frombuffer(blob, dtype=np.float16).astype(np.float32) if blob else None
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-8)
+
+
+class MaterialLibrary:
+    """
+    Searchable index over one library directory (one instance per directory).
+
+    Usage:
+        library = MaterialLibrary.get_instance().start_indexer()
+        items = library.search("city at night", minimum_duration=5)
+    """
+
+    _instances: Dict[str, "MaterialLibrary"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, root_dir: str):
+        self.root_dir = os.path.realpath(root_dir)
+        index_dir = utils.storage_dir("library", create=True)
+        self.db_path = os.path.join(index_dir, f"{utils.md5(self.root_dir)}.db")
+        self.clip_embeddings = config.app.get("library_clip_embeddings", True)
+        # same models as semantic selection, so one set of embeddings serves both
+        self.text_model = text_model_name()
+        self.clip_model = clip_model_name()
+        self._db_lock = threading.Lock()
+        self._indexer = None
+        self._stop = threading.Event()
+
+        # Search matrices, rebuilt when the indexer bumps the version
+        self._version = 0
+        self._loaded_version = -1
+        self._vectors: Tuple[List[Dict[str, Any]], Optional[np.ndarray], Optional[np.ndarray]] = ([], None, None)
+        self._vectors_lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            self._check_models(conn)
+
+    @classmethod
+    def get_instance(cls, root_dir: str = "") -> "MaterialLibrary":
+        """Get the library for a directory (defaults to the library_directory setting)."""
+        root_dir = root_dir or config.app.get("library_directory", "").strip()
+        if not root_dir or not os.path.isdir(root_dir):
+            raise ValueError(f"library_directory is not a directory: '{root_dir}'")
+        key = os.path.realpath(root_dir)
+        if key not in cls._instances:
+            with cls._lock:
+                if key not in cls._instances:
+                    cls._instances[key] = MaterialLibrary(key)
+        return cls._instances[key]
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _check_models(self, conn: sqlite3.Connection):
+        """Drop embeddings made with other models; the clips are re-indexed by the next pass."""
+        models = json.dumps([self.text_model, self.clip_model])
+        row = conn.execute("SELECT value FROM meta WHERE key = 'models'").fetchone()
+        if row and row["value"] != models:
+            logger.info(f"📚 library embedding models changed, re-indexing: {row['value']} → {models}")
+            conn.execute("UPDATE clips SET mtime = 0, text_embedding = NULL, clip_embedding = NULL")
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('models', ?)", (models,))
+
+    # ========================================================================
+    # INDEXING
+    # ========================================================================
+
+    def start_indexer(self, interval: float = None) -> "MaterialLibrary":
+        """Index in a background thread now and every `interval` seconds (idempotent)."""
+        if interval is None:
+            interval = float(config.app.get("library_index_interval", 600))
+        with self._lock:
+            if self._indexer is None or not self._indexer.is_alive():
+                self._stop.clear()
+                self._indexer = threading.Thread(
+                    target=self._index_loop, args=(interval,), daemon=True, name="MaterialLibraryIndexer"
+                )
+                self._indexer.start()
+        return self
+
+    def stop_indexer(self):
+        self._stop.set()
+
+    def _index_loop(self, interval: float):
+        while not self._stop.is_set():
+            try:
+                self.index_once()
+            except Exception as e:
+                logger.error(f"❌ library indexing failed: {str(e)}")
+            if interval <= 0 or self._stop.wait(interval):
+                break
+
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(self.root_dir):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                if not name.lower().endswith(VIDEO_EXTENSIONS) or ".part" in name:
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if stat.st_size > 0:
+                    files[os.path.relpath(path, self.root_dir)] = (stat.st_mtime, stat.st_size)
+        return files
+
+    def index_once(self) -> Tuple[int, int]:
+        """Index new or modified files and drop deleted ones. Returns (indexed, removed)."""
+        start_time = time.time()
+        on_disk = self._scan()
+        with self._connect() as conn:
+            indexed = {r["path"]: (r["mtime"], r["size"]) for r in conn.execute("SELECT path, mtime, size FROM clips")}
+
+        removed = [p for p in indexed if p not in on_disk]
+        changed = [p for p, state in on_disk.items() if indexed.get(p) != state]
+        if removed:
+            with self._db_lock, self._connect() as conn:
+                conn.executemany("DELETE FROM clips WHERE path = ?", [(p,) for p in removed])
+            self._version += 1
+
+        count = 0
+        for i in range(0, len(changed), _index_batch_size):
+            if self._stop.is_set():
+                break
+            rows = [row for row in (self._index_file(p, *on_disk[p]) for p in changed[i:i + _index_batch_size]) if row]
+            self._embed_rows(rows)
+            with self._db_lock, self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO clips (path, mtime, size, duration, fps, width, height, codec, "
+                    "tags, text_embedding, clip_embedding, indexed_at) "
+                    "VALUES (:path, :mtime, :size, :duration, :fps, :width, :height, :codec, "
+                    ":tags, :text_embedding, :clip_embedding, :indexed_at)",
+                    rows,
+                )
+            count += len(rows)
+            self._version += 1
+            logger.info(f"📚 library indexing: {min(i + _index_batch_size, len(changed))}/{len(changed)} files")
+
+        if count or removed:
+            logger.success(
+                f"📚 library index updated in {time.time() - start_time:.1f}s: "
+                f"+{count} indexed, -{len(removed)} removed ({len(on_disk)} files)"
+            )
+        return count, len(removed)
+
+    def _index_file(self, relative_path: str, mtime: float, size: int) -> Optional[Dict[str, Any]]:
+        # probe_clip never deletes the file (library footage is read-only)
+        from app.services import material, semantic_video
+
+        path = os.path.join(self.root_dir, relative_path)
+        try:
+            probe = material.probe_clip(path)
+        except Exception as e:
+            logger.warning(f"failed to probe library clip {relative_path}: {str(e)}")
+            probe = {}
+        if not probe or probe.get("duration", 0) <= 0:
+            logger.warning(f"skipping unreadable library clip: {relative_path}")
+            probe = {}
+
+        metadata = semantic_video.load_video_metadata(path) or {}
+        return {
+            "path": relative_path,
+            "mtime": mtime,
+            "size": size,
+            "duration": probe.get("duration", 0),
+            "fps": probe.get("fps", 0),
+            "width": probe.get("width", 0),
+            "height": probe.get("height", 0),
+            "codec": probe.get("codec", ""),
+            "tags": json.dumps(extract_tags(relative_path, metadata)),
+            "text_embedding": None,
+            "clip_embedding": None,
+            "indexed_at": time.time(),
+        }
+
+    def _embed_rows(self, rows: List[Dict[str, Any]]):
+        texts = [" ".join(json.loads(row["tags"])) for row in rows]
+        text_vectors = self._encode_texts([t for t in texts if t]) if any(texts) else None
+        if text_vectors is not None:
+            vectors = iter(text_vectors)
+            for row, text in zip(rows, texts):
+                if text:
+                    row["text_embedding"] = _to_blob(next(vectors))
+
+        if self.clip_embeddings:
+            playable = [row for row in rows if row["duration"] > 0]
+            frames = [self._keyframe(os.path.join(self.root_dir, row["path"]), row["duration"]) for row in playable]
+            image_vectors = self._encode_images([f for f in frames if f is not None])
+            if image_vectors is not None:
+                vectors = iter(image_vectors)
+                for row, frame in zip(playable, frames):
+                    if frame is not None:
+                        row["clip_embedding"] = _to_blob(next(vectors))
+
+    # ========================================================================
+    # MODELS
+    # ========================================================================
+
+    def _encode_texts(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Normalised sentence embeddings, None when the model is unavailable."""
+        try:
+            from app.services.model_manager import ModelManager
+
+            model = ModelManager.get_instance().get_sentence_transformer(self.text_model)
+            vectors = EmbeddingStore.get_instance(self.text_model).encode(
+                texts,
+                lambda missing: model.encode(
+                    missing, batch_size=64, normalize_embeddings=True, show_progress_bar=False
+                ),
+            )
+            return _normalize(vectors)
+        except Exception as e:
+            logger.warning(f"library text embeddings unavailable: {str(e)}")
+            return None
+
+    def _keyframe(self, path: str, duration: float):
+        """Middle frame of a clip as a PIL image (fast input seek, scaled down by ffmpeg)."""
+        return keyframes.extract_frame(path, duration / 2, FFMPEG_BINARY)
+
+    def _encode_images(self, images: List) -> Optional[np.ndarray]:
+        """Normalised CLIP keyframe embeddings, run on the shared inference queue."""
+        if not images:
+            return None
+        try:
+            from app.services.image_similarity import ClipInferenceQueue
+
+            return ClipInferenceQueue.get_instance().encode("image", self.clip_model, images)
+        except Exception as e:
+            logger.warning(f"library keyframe embeddings unavailable: {str(e)}")
+            return None
+
+    def _encode_clip_text(self, text: str) -> Optional[np.ndarray]:
+        """Normalised CLIP text embedding (cached, computed on the shared inference queue)."""
+        try:
+            from app.services.image_similarity import encode_text_embedding
+
+            return encode_text_embedding(text, self.clip_model)
+        except Exception as e:
+            logger.warning(f"library CLIP text embedding unavailable: {str(e)}")
+            return None
+
+    # ========================================================================
+    # SEARCH
+    # ========================================================================
+
+    def _load_vectors(self):
+        """Clip rows plus stacked text/keyframe matrices, cached until the index changes."""
+        with self._vectors_lock:
+            if self._loaded_version == self._version:
+                return self._vectors
+            version = self._version
+            with self._connect() as conn:
+                rows = [dict(r) for r in conn.execute("SELECT * FROM clips WHERE duration > 0 ORDER BY path")]
+
+            def stack(column: str) -> Optional[np.ndarray]:
+                vectors = [_from_blob(row.pop(column)) for row in rows]
+                dims = {v.shape[0] for v in vectors if v is not None}
+                if len(dims) != 1:
+                    return None
+                dim = dims.pop()
+                return np.stack([v if v is not None else np.zeros(dim, dtype=np.float32) for v in vectors])
+
+            text_matrix = stack("text_embedding")
+            clip_matrix = stack("clip_embedding")
+            for row in rows:
+                row["tags"] = json.loads(row["tags"] or "[]")
+            self._vectors = (rows, text_matrix, clip_matrix)
+            self._loaded_version = version
+            return self._vectors
+
+    def search(
+        self,
+        search_term: str,
+        minimum_duration: float = 0,
+        video_aspect: VideoAspect = VideoAspect.portrait,
+        limit: int = 50,
+    ) -> List[MaterialInfo]:
+        """
+        Best matching clips for a term, scored by tag-embedding similarity and
+        CLIP keyframe similarity (keyword overlap when no embeddings exist).
+        """
+        rows, text_matrix, clip_matrix = self._load_vectors()
+        if not rows:
+            return []
+
+        aspect = VideoAspect(video_aspect)
+        video_width, video_height = aspect.to_resolution()
+        portrait = video_height > video_width
+        eligible = np.array([
+            row["duration"] >= minimum_duration
+            and (not row["width"] or not row["height"] or (row["height"] > row["width"]) == portrait)
+            for row in rows
+        ])
+
+        scores = None
+        if text_matrix is not None:
+            query = self._encode_texts([search_term])
+            if query is not None:
+                scores = text_matrix @ query[0]
+        if clip_matrix is not None:
+            query = self._encode_clip_text(search_term)
+            if query is not None:
+                # CLIP text-image cosines sit around 0.2-0.35, rescale them next to the text scores
+                clip_scores = clip_matrix @ query * 2.5
+                scores = clip_scores if scores is None else (scores + clip_scores) / 2
+        if scores is None:
+            words = [w for w in _TOKEN_SPLIT.split(search_term.lower()) if w]
+            scores = np.array([
+                sum(1 for w in words if any(w in tag for tag in row["tags"])) / max(1, len(words))
+                for row in rows
+            ])
+            threshold = 1e-6
+        else:
+            threshold = _min_text_score
+
+        scores = np.where(eligible, scores, -1.0)
+        video_items = []
+        for index in np.argsort(-scores)[:limit]:
+            if scores[index] < threshold:
+                break
+            row = rows[index]
+            item = MaterialInfo()
+            item.provider = "library"
+            item.url = os.path.join(self.root_dir, row["path"])
+            item.duration = int(row["duration"])
+            item.size = 0
+            item.score = float(scores[index])
+            video_items.append(item)
+        return video_items
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            clips, total_size, embedded, keyframes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COUNT(text_embedding), COUNT(clip_embedding) FROM clips"
+            ).fetchone()
+        return {
+            "root_dir": self.root_dir,
+            "clips": clips,
+            "total_size": total_size,
+            "text_embeddings": embedded,
+            "keyframe_embeddings": keyframes,
+            "indexing": bool(self._indexer and self._indexer.is_alive()),
+        }
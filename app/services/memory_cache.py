@@ -0,0 +1,211 @@
+"""
+MemoryCache - thread-safe in-process LRU cache with a byte budget.
+
+Benefits:
+- Bounded by bytes, not entries: numpy arrays and tensors count their nbytes,
+  bytes/str their length, fonts and files the size of the file behind them
+- LRU eviction plus an optional TTL per cache
+- Lock striping: keys hash onto independent shards (own lock, own LRU order,
+  own slice of the budget), so concurrent tasks rarely contend
+- Hit/miss/eviction/expiry counters per cache, all caches listed by cache_stats()
+
+Usage:
+    cache = MemoryCache("clip_text", max_bytes=32 * 1024 * 1024)
+    vector = cache.get(key)
+    cache.put(key, vector)
+    vector = cache.get_or_compute(key, lambda: encode(text))
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from loguru import logger
+
+_MISSING = object()
+
+# Every cache created in this process, for cache_stats()
+_registry: Dict[str, "MemoryCache"] = {}
+_registry_lock = threading.Lock()
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory held by value in bytes."""
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        # numpy arrays (torch tensors expose nbytes as well)
+        return nbytes
+    if hasattr(value, "element_size") and hasattr(value, "nelement"):
+        return value.element_size() * value.nelement()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8", errors="ignore"))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    path = getattr(value, "path", None)
+    if isinstance(path, str) and os.path.isfile(path):
+        # fonts and other file-backed objects keep roughly the file in memory
+        return os.path.getsize(path)
+    return sys.getsizeof(value)
+
+
+class _Shard:
+    __slots__ = ("lock", "entries", "bytes", "max_bytes")
+
+    def __init__(self, max_bytes: int):
+        self.lock = threading.Lock()
+        # key -> (value, size, expires_at)
+        self.entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.bytes = 0
+        self.max_bytes = max_bytes
+
+
+class MemoryCache:
+    """Byte-budgeted LRU/TTL cache, safe to share between threads."""
+
+    def __init__(
+        self,
+        name: str,
+        max_bytes: int,
+        ttl: float = 0,
+        stripes: int = 16,
+        sizeof: Callable[[Any], int] = estimate_size,
+    ):
+        self.name = name
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl = ttl
+        self.sizeof = sizeof
+        stripes = max(1, int(stripes))
+        self._shards = [_Shard(self.max_bytes // stripes) for _ in range(stripes)]
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        with _registry_lock:
+            _registry[name] = self
+
+    def _shard(self, key: Hashable) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _count(self, hits: int = 0, misses: int = 0, evictions: int = 0, expirations: int = 0):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+            self.evictions += evictions
+            self.expirations += expirations
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        shard = self._shard(key)
+        expired = False
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is not None:
+                value, size, expires_at = entry
+                if expires_at and expires_at <= time.monotonic():
+                    del shard.entries[key]
+                    shard.bytes -= size
+                    expired = True
+                else:
+                    shard.entries.move_to_end(key)
+                    self._count(hits=1)
+                    return value
+        self._count(misses=1, expirations=int(expired))
+        return default
+
+    def __contains__(self, key: Hashable) -> bool:
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            return entry is not None and not (entry[2] and entry[2] <= time.monotonic())
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None, ttl: Optional[float] = None) -> bool:
+        """Store value (LRU entries are evicted to make room). Returns False when it exceeds the shard budget."""
+        size = self.sizeof(value) if size is None else int(size)
+        shard = self._shard(key)
+        if size > shard.max_bytes:
+            self.pop(key)
+            return False
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else 0
+        evicted = 0
+        with shard.lock:
+            previous = shard.entries.pop(key, None)
+            if previous is not None:
+                shard.bytes -= previous[1]
+            shard.entries[key] = (value, size, expires_at)
+            shard.bytes += size
+            while shard.bytes > shard.max_bytes:
+                _, (_, old_size, _) = shard.entries.popitem(last=False)
+                shard.bytes -= old_size
+                evicted += 1
+        if evicted:
+            self._count(evictions=evicted)
+        return True
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Cached value, computing and storing it on a miss (compute runs outside the lock)."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.pop(key, None)
+            if entry is None:
+                return default
+            shard.bytes -= entry[1]
+            return entry[0]
+
+    def clear(self):
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.bytes = 0
+
+    def __len__(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+    @property
+    def bytes(self) -> int:
+        return sum(shard.bytes for shard in self._shards)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "entries": len(self),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def cache_stats() -> List[Dict[str, Any]]:
+    """Stats of every MemoryCache in this process."""
+    with _registry_lock:
+        caches = list(_registry.values())
+    return [cache.get_stats() for cache in caches]
+
+
+def log_cache_stats():
+    for stats in cache_stats():
+        if stats["hits"] or stats["misses"]:
+            logger.info(
+                f"🗃️  {stats['name']} cache: {stats['entries']} entries, "
+                f"{stats['bytes'] / 1024 / 1024:.1f}/{stats['max_bytes'] / 1024 / 1024:.0f} MB, "
+                f"hit rate {stats['hit_rate'] * 100:.0f}%, {stats['evictions']} evicted"
+            )
@@ -7,15 +7,26 @@ import os
 import json
 import itertools
 import math
-from typing import List, Dict, Optional, Tuple
+import threading
+import time
+from typing import List, Dict, Optional, Sequence, Tuple
 from loguru import logger
 import re
+import numpy as np
 from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 
+try:
+    from scipy.optimize import linear_sum_assignment
+    ASSIGNMENT_SOLVER_AVAILABLE = True
+except ImportError:
+    ASSIGNMENT_SOLVER_AVAILABLE = False
+
 # Import config to check verbose flag
 from app.config import config
 from app.services.model_manager import ModelManager
+from app.services.embedding_store import EmbeddingStore
+from app.services.ingest_embeddings import stored_embedding
 
 # Global model instance
 _model = None
@@ -199,6 +210,98 @@ def calculate_similarity(sentence: str, video_text: str) -> float:
         logger.error(f"❌ Text similarity traceback: {traceback.format_exc()}")
         return 0.1
 
+def encode_texts_cached(model, texts: List[str]) -> np.ndarray:
+    """Normalised embeddings for texts, served from the persistent embedding store when known"""
+    def encode(missing):
+        return model.encode(missing, batch_size=64, normalize_embeddings=True, show_progress_bar=False)
+    
+    try:
+        return EmbeddingStore.get_instance(_model_name or "all-mpnet-base-v2").encode(texts, encode)
+    except Exception as e:
+        logger.warning(f"⚠️ Embedding store unavailable, encoding directly: {e}")
+        return np.asarray(encode(texts))
+
+def compute_similarity_matrix(
+    sentences: List[str],
+    video_texts: List[str],
+    video_embeddings: Optional[Sequence[Optional[np.ndarray]]] = None
+) -> np.ndarray:
+    """Cosine similarity of every sentence against every video text (len(sentences) x len(video_texts)).
+
+    Each unique text is encoded once, in batches, instead of one forward pass per pair.
+    video_embeddings, when given, holds the ingest-time embedding per video (None where
+    missing); only the texts without one are encoded.
+    """
+    if not sentences or not video_texts:
+        return np.zeros((len(sentences), len(video_texts)), dtype=np.float32)
+    try:
+        model = load_model(_model_name or "all-mpnet-base-v2")
+        sentence_embeddings = np.asarray(
+            model.encode(sentences, batch_size=64, normalize_embeddings=True, show_progress_bar=False)
+        )
+        dimension = sentence_embeddings.shape[1]
+        video_embeddings = [
+            embedding if embedding is not None and embedding.shape == (dimension,) else None
+            for embedding in (video_embeddings or [None] * len(video_texts))
+        ]
+        missing_texts = list(dict.fromkeys(
+            text for text, embedding in zip(video_texts, video_embeddings) if embedding is None
+        ))
+        # Search terms repeat across tasks, only the ones never seen before hit the model
+        encoded = dict(zip(missing_texts, encode_texts_cached(model, missing_texts))) if missing_texts else {}
+        text_embeddings = np.stack([
+            embedding if embedding is not None else encoded[text]
+            for text, embedding in zip(video_texts, video_embeddings)
+        ])
+        matrix = sentence_embeddings @ text_embeddings.T
+        logger.info(
+            f"🧮 Similarity matrix: {len(sentences)} segments × {len(video_texts)} videos "
+            f"({len(video_texts) - len([e for e in video_embeddings if e is None])} embedded at ingest)"
+        )
+        return matrix.astype(np.float32)
+    except Exception as e:
+        logger.error(f"❌ Error calculating similarity matrix: {e}")
+        return np.full((len(sentences), len(video_texts)), 0.1, dtype=np.float32)
+
+def diversity_penalty_for(usage_count: int, max_video_reuse: int, unused_videos_available: bool = True) -> float:
+    """Score penalty for using a video that was already used usage_count times"""
+    # Special handling for max_video_reuse = 1 (NO DUPLICATES mode)
+    if max_video_reuse == 1:
+        if usage_count == 0:
+            return 0.0  # No penalty for unused videos
+        if unused_videos_available:
+            return 2.0  # Very high penalty to strongly prefer unused videos
+        # All videos have been used once, allow reuse with moderate penalty
+        return 0.4  # Allow necessary reuse but prefer less-used videos
+    
+    # Hard cutoff at max_video_reuse
+    if usage_count >= max_video_reuse:
+        return 2.0  # Eliminate completely
+    # Improved logic for max_video_reuse > 1 with better progression
+    return {0: 0.0, 1: 0.3, 2: 0.6, 3: 0.9}.get(usage_count, 2.0)
+
+def solve_assignment(scores: np.ndarray, max_video_reuse: int) -> List[int]:
+    """Assign every selection (row) a video (column) maximising the total score.
+    
+    Each video is expanded into capacity slots; slot k carries the diversity
+    penalty of a k-th reuse, so the Hungarian algorithm over the expanded
+    matrix solves the whole script at once under the same reuse rules the
+    greedy selection applies one segment at a time.
+    """
+    n_selections, n_videos = scores.shape
+    if n_selections == 0 or n_videos == 0:
+        return []
+    # enough slots for every selection, anything past max_video_reuse is heavily penalised
+    slots = max(max_video_reuse, math.ceil(n_selections / n_videos))
+    penalties = np.array([diversity_penalty_for(k, max_video_reuse) for k in range(slots)])
+    # column v * slots + k is the k-th use of video v
+    expanded = np.repeat(scores, slots, axis=1) - np.tile(penalties, n_videos)
+    rows, columns = linear_sum_assignment(expanded, maximize=True)
+    assignment = [0] * n_selections
+    for row, column in zip(rows, columns):
+        assignment[row] = int(column // slots)
+    return assignment
+
 def find_best_video_for_sentence(
     sentence: str, 
     video_metadata: List[Dict], 
@@ -208,9 +311,16 @@ def find_best_video_for_sentence(
     max_video_reuse: int = 2,
     enable_image_similarity: bool = False,
     image_similarity_threshold: float = 0.7,
-    image_similarity_model: str = "clip-vit-base-patch32"
+    image_similarity_model: str = "clip-vit-base-patch32",
+    text_similarities: Optional[Sequence[float]] = None,
+    image_similarities: Optional[Sequence[float]] = None
 ) -> Optional[Dict]:
-    """Find the best video for a given sentence with strong diversity controls"""
+    """Find the best video for a given sentence with strong diversity controls
+
+    text_similarities, when given, is this sentence's row of compute_similarity_matrix
+    (aligned with video_metadata) and replaces the per-video encoder calls;
+    image_similarities is the matching row of the image similarity matrix.
+    """
     if config.app.get('verbose', False):
         logger.info(f"🔍 Finding best video for sentence: '{sentence[:60]}...'")
         logger.info(f"📊 Analyzing {len(video_metadata)} available videos")
@@ -218,19 +328,29 @@ def find_best_video_for_sentence(
     # Calculate all similarities and scores once
     video_scores = []
     
+    # Whether any video is still unused (NO DUPLICATES mode), computed once rather than per video
+    unused_videos_available = max_video_reuse == 1 and any(
+        used_videos.get(v['video_path'], 0) == 0 for v in video_metadata
+    )
+    
     for i, video_meta in enumerate(video_metadata, 1):
         try:
             video_path = video_meta['video_path']
             search_term = video_meta.get('search_term', '')
             
             # Calculate text similarity
-            similarity = calculate_similarity(sentence, search_term)
+            if text_similarities is not None:
+                similarity = float(text_similarities[i - 1])
+            else:
+                similarity = calculate_similarity(sentence, search_term)
             
             # Initialize image similarity
             image_similarity_score = 0.0
             
             # Calculate image similarity if enabled
-            if enable_image_similarity and IMAGE_SIMILARITY_AVAILABLE:
+            if enable_image_similarity and IMAGE_SIMILARITY_AVAILABLE and image_similarities is not None:
+                image_similarity_score = float(image_similarities[i - 1])
+            elif enable_image_similarity and IMAGE_SIMILARITY_AVAILABLE:
                 try:
                     image_similarity_score = image_similarity.calculate_video_image_similarity(
                         sentence, 
@@ -265,35 +385,7 @@ def find_best_video_for_sentence(
             
             # Enhanced diversity penalty system with improved spacing
             usage_count = used_videos.get(video_path, 0)
-            
-            # Special handling for max_video_reuse = 1 (NO DUPLICATES mode)
-            if max_video_reuse == 1:
-                # Check if there are any unused videos available
-                unused_videos_available = any(used_videos.get(v['video_path'], 0) == 0 for v in video_metadata)
-                
-                if usage_count == 0:
-                    diversity_penalty = 0.0  # No penalty for unused videos
-                elif usage_count >= 1 and unused_videos_available:
-                    diversity_penalty = 2.0  # Very high penalty to strongly prefer unused videos
-                else:
-                    # All videos have been used once, allow reuse with moderate penalty
-                    diversity_penalty = 0.4  # Allow necessary reuse but prefer less-used videos
-            else:
-                # Improved logic for max_video_reuse > 1 with better progression
-                if usage_count == 0:
-                    diversity_penalty = 0.0  # No penalty for first use
-                elif usage_count == 1:
-                    diversity_penalty = 0.3  # Light penalty for second use
-                elif usage_count == 2:
-                    diversity_penalty = 0.6  # Moderate penalty for third use
-                elif usage_count == 3:
-                    diversity_penalty = 0.9  # Heavy penalty for fourth use
-                else:
-                    diversity_penalty = 2.0  # Completely eliminate from consideration
-                
-                # Hard cutoff at max_video_reuse
-                if usage_count >= max_video_reuse:
-                    diversity_penalty = 2.0  # Eliminate completely
+            diversity_penalty = diversity_penalty_for(usage_count, max_video_reuse, unused_videos_available)
             
             final_score = combined_similarity - diversity_penalty
             
@@ -392,6 +484,62 @@ def find_best_video_for_sentence(
     # Return both the video and its detailed scores
     return best_video, selected_video_scores
 
+def plan_global_selections(
+    segments: List[str],
+    selection_segment_indexes: List[int],
+    video_metadata: List[Dict],
+    similarity_matrix: np.ndarray,
+    max_video_reuse: int,
+    image_matrix: Optional[np.ndarray] = None,
+    similarity_threshold: float = 0.5
+) -> List[Tuple[Dict, Dict]]:
+    """Solve every selection at once; returns (video, scores) per selection like find_best_video_for_sentence
+
+    image_matrix, when given, is the segment × video image similarity from
+    image_similarity.calculate_image_similarity_matrix.
+    """
+    start_time = time.time()
+    combined = similarity_matrix
+    if image_matrix is not None:
+        # Weight: 40% text similarity, 60% image similarity (same as greedy selection)
+        combined = 0.4 * similarity_matrix + 0.6 * image_matrix
+    else:
+        image_matrix = np.zeros_like(similarity_matrix)
+    
+    rows = np.asarray(selection_segment_indexes)
+    assignment = solve_assignment(combined[rows], max_video_reuse)
+    
+    planned = []
+    usage = {}
+    for row, v_index in enumerate(assignment):
+        s_index = selection_segment_indexes[row]
+        count = usage.get(v_index, 0)
+        usage[v_index] = count + 1
+        penalty = diversity_penalty_for(count, max_video_reuse)
+        planned.append((video_metadata[v_index], {
+            'video': video_metadata[v_index],
+            'text_similarity': float(similarity_matrix[s_index, v_index]),
+            'image_similarity': float(image_matrix[s_index, v_index]),
+            'combined_similarity': float(combined[s_index, v_index]),
+            'usage': count,
+            'penalty': penalty,
+            'final_score': float(combined[s_index, v_index]) - penalty
+        }))
+    
+    # Like the greedy selection, a weak best match is still used (never a blank screen) but reported
+    below = sum(1 for _, scores in planned if scores['final_score'] < similarity_threshold)
+    if below:
+        logger.warning(
+            f"⚠️  {below}/{len(planned)} selections below similarity threshold ({similarity_threshold}), using anyway"
+        )
+    
+    total = sum(scores['final_score'] for _, scores in planned)
+    logger.info(
+        f"🧩 Global assignment: {len(planned)} selections over {len(video_metadata)} videos "
+        f"in {time.time() - start_time:.2f}s (total score {total:.2f})"
+    )
+    return planned
+
 def select_videos_for_script(
     script: str,
     video_metadata: List[Dict],
@@ -404,9 +552,14 @@ def select_videos_for_script(
     semantic_model: str = "all-mpnet-base-v2",
     enable_image_similarity: bool = False,
     image_similarity_threshold: float = 0.7,
-    image_similarity_model: str = "clip-vit-base-patch32"
+    image_similarity_model: str = "clip-vit-base-patch32",
+    assignment_mode: str = "greedy"
 ) -> List[Dict]:
-    """Select videos for script segments using semantic matching"""
+    """Select videos for script segments using semantic matching
+    
+    assignment_mode "greedy" picks the best remaining video segment by segment,
+    "global" (opt-in) solves all selections at once (solve_assignment).
+    """
     
     logger.info("🎬" + "=" * 50 + " SEMANTIC VIDEO SELECTION " + "=" * 50)
     logger.info("🎯 Starting semantic video selection for script")
@@ -434,6 +587,10 @@ def select_videos_for_script(
     if max_video_reuse == 1:
         logger.info(f"   ✨ NO DUPLICATES MODE - Each video used only once")
     logger.info(f"   🤖 Semantic model: {semantic_model}")
+    if assignment_mode == "global" and not ASSIGNMENT_SOLVER_AVAILABLE:
+        logger.warning("   🧩 Global assignment requested but scipy is not installed, using greedy")
+        assignment_mode = "greedy"
+    logger.info(f"   🧩 Assignment: {assignment_mode}")
     
     # Image similarity configuration
     if enable_image_similarity:
@@ -508,11 +665,40 @@ def select_videos_for_script(
     
     # Create video selections - repeat segments cyclically if we need more videos than segments
     video_selections_needed = needed_video_clips
-    segment_cycle = itertools.cycle(segments) if segments else []
+    selection_segments = segments or ["Generic content"]
+    segment_cycle = itertools.cycle(range(len(selection_segments)))
+    
+    # Encode every segment and search term once; selections index into the matrix
+    similarity_matrix = compute_similarity_matrix(
+        selection_segments,
+        [video_meta.get('search_term', '') for video_meta in video_metadata],
+        [stored_embedding(video_meta, semantic_model) for video_meta in video_metadata]
+    )
+    
+    # Thumbnails are fetched concurrently and scored against every segment in batches
+    image_matrix = None
+    if enable_image_similarity and IMAGE_SIMILARITY_AVAILABLE:
+        image_matrix = image_similarity.calculate_image_similarity_matrix(
+            selection_segments, video_metadata, image_similarity_model
+        )
+    
+    selection_segment_indexes = [next(segment_cycle) for _ in range(video_selections_needed)]
+    planned_selections = None
+    if assignment_mode == "global":
+        planned_selections = plan_global_selections(
+            selection_segments,
+            selection_segment_indexes,
+            video_metadata,
+            similarity_matrix,
+            actual_max_reuse,
+            image_matrix,
+            similarity_threshold
+        )
     
     for i in range(video_selections_needed):
         # Get the next segment from the cycle
-        segment = next(segment_cycle) if segments else "Generic content"
+        segment_index = selection_segment_indexes[i]
+        segment = selection_segments[segment_index]
         
         if config.app.get('verbose', False):
             logger.info(f"🔄 PROCESSING VIDEO SELECTION {i+1}/{video_selections_needed}")
@@ -521,17 +707,22 @@ def select_videos_for_script(
             if (i+1) % 10 == 1 or (i+1) == video_selections_needed:
                 logger.info(f"🔄 PROCESSING VIDEO SELECTION {i+1}/{video_selections_needed}")
         
-        best_video, selected_video_scores = find_best_video_for_sentence(
-            segment, 
-            video_metadata, 
-            used_videos,
-            similarity_threshold,
-            diversity_threshold,
-            actual_max_reuse,  # Use calculated actual max reuse
-            enable_image_similarity,
-            image_similarity_threshold,
-            image_similarity_model
-        )
+        if planned_selections is not None:
+            best_video, selected_video_scores = planned_selections[i]
+        else:
+            best_video, selected_video_scores = find_best_video_for_sentence(
+                segment, 
+                video_metadata, 
+                used_videos,
+                similarity_threshold,
+                diversity_threshold,
+                actual_max_reuse,  # Use calculated actual max reuse
+                enable_image_similarity,
+                image_similarity_threshold,
+                image_similarity_model,
+                text_similarities=similarity_matrix[segment_index],
+                image_similarities=image_matrix[segment_index] if image_matrix is not None else None
+            )
         
         if best_video:
             selected_videos.append({
@@ -682,8 +873,12 @@ def save_video_metadata(video_path: str, search_term: str, additional_info: Dict
     metadata_path = get_metadata_path(video_path)
     
     try:
-        with open(metadata_path, 'w', encoding='utf-8') as f:
+        # Write to a temp file and rename so concurrent readers never see partial JSON;
+        # the name is per thread since download and ingest threads save the same clip
+        tmp_path = f"{metadata_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(metadata, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, metadata_path)
         logger.debug(f"Saved metadata for {video_path}")
     except Exception as e:
         logger.error(f"Failed to save metadata for {video_path}: {e}")
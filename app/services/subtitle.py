@@ -128,6 +128,35 @@ def create(audio_file, subtitle_file: str = ""):
     logger.info(f"subtitle file created: {subtitle_file}")
 
 
+def align(audio_file, video_script, subtitle_file, language: str = "") -> bool:
+    """
+    Subtitle file from the known script by forced alignment (no transcription).
+
+    Returns False when alignment is unavailable or fails; the caller then
+    falls back to create() + correct().
+    """
+    from app.services import alignment, voice
+
+    if not voice.forced_alignment_enabled():
+        return False
+    language = language or alignment.guess_language(video_script)
+    align_device = device if device in ("cpu", "cuda") else ModelManager.get_instance().device
+    logger.info(f"start forced alignment, language: {language}, output file: {subtitle_file}")
+    start = timer()
+    try:
+        words = alignment.align_file(audio_file, video_script, language, align_device)
+    except Exception as e:
+        logger.warning(f"forced alignment failed: {str(e)}")
+        return False
+    if os.path.exists(subtitle_file):
+        os.remove(subtitle_file)
+    voice.create_subtitle(
+        sub_maker=voice.words_to_sub_maker(words), text=video_script, subtitle_file=subtitle_file
+    )
+    logger.info(f"forced alignment complete, elapsed: {timer() - start:.2f} s")
+    return os.path.exists(subtitle_file)
+
+
 def file_to_subtitles(filename):
     if not filename or not os.path.isfile(filename):
         return []
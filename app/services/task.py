@@ -9,8 +9,10 @@ from loguru import logger
 from app.config import config
 from app.models import const
 from app.models.schema import VideoConcatMode, VideoParams
-from app.services import llm, material, subtitle, video, voice
+from app.services import alignment, llm, material, subtitle, tts_cache, video, voice
 from app.services import state as sm
+from app.services.memory_cache import log_cache_stats
+from app.services.tts_cache import TtsCache
 from app.utils import utils
 
 
@@ -74,12 +76,21 @@ def save_script_data(task_id, video_script, video_terms, params):
 def generate_audio(task_id, params, video_script):
     logger.info("\n\n## generating audio")
     audio_file = path.join(utils.task_dir(task_id), "audio.mp3")
-    sub_maker = voice.tts(
+    tts_args = dict(
         text=video_script,
         voice_name=voice.parse_voice_name(params.voice_name),
         voice_rate=params.voice_rate,
         voice_file=audio_file,
     )
+    sub_maker = None
+    if tts_cache.cache_enabled(tts_args["voice_name"]):
+        # sentence-level cache: only sentences never synthesized with this voice hit the TTS engine
+        try:
+            sub_maker = TtsCache.get_instance().synthesize(**tts_args)
+        except Exception as e:
+            logger.warning(f"tts cache unavailable, synthesizing the whole script: {str(e)}")
+    if sub_maker is None:
+        sub_maker = voice.tts(**tts_args)
     if sub_maker is None:
         sm.state.update_task(task_id, state=const.TASK_STATE_FAILED)
         logger.error(
@@ -130,9 +141,12 @@ def generate_subtitle(task_id, params, video_script, sub_maker, audio_file):
             logger.warning("subtitle file not found, fallback to whisper")
 
     if subtitle_provider == "whisper" or subtitle_fallback:
-        subtitle.create(audio_file=audio_file, subtitle_file=subtitle_path)
-        logger.info("\n\n## correcting subtitle")
-        subtitle.correct(subtitle_file=subtitle_path, video_script=video_script)
+        # the script is known: align it to the audio, transcribe only if that fails
+        language = alignment.guess_language(video_script, voice.parse_voice_name(params.voice_name))
+        if not subtitle.align(audio_file, video_script, subtitle_path, language):
+            subtitle.create(audio_file=audio_file, subtitle_file=subtitle_path)
+            logger.info("\n\n## correcting subtitle")
+            subtitle.correct(subtitle_file=subtitle_path, video_script=video_script)
 
     # Generate enhanced subtitles if word highlighting is enabled
     if getattr(params, 'enable_word_highlighting', False):
@@ -156,7 +170,29 @@ def generate_subtitle(task_id, params, video_script, sub_maker, audio_file):
     return subtitle_path
 
 
-def get_video_materials(task_id, params, video_terms, audio_duration):
+def start_material_prefetch(task_id, params, video_terms, video_script):
+    """Start searching/downloading materials before TTS finishes, sized from a duration estimate."""
+    if params.video_source == "local" or not config.app.get("speculative_prefetch", True):
+        return None
+
+    estimated_duration = voice.estimate_audio_duration(video_script, params.voice_rate)
+    logger.info(
+        f"\n\n## ⚡ prefetching videos from {params.video_source} "
+        f"(estimated audio duration: {estimated_duration:.1f}s)"
+    )
+    return material.MaterialPrefetch(
+        task_id=task_id,
+        search_terms=video_terms,
+        source=params.video_source,
+        video_aspect=params.video_aspect,
+        video_contact_mode=params.video_concat_mode,
+        target_duration=estimated_duration * params.video_count,
+        max_clip_duration=params.video_clip_duration,
+        final=False,
+    ).start()
+
+
+def get_video_materials(task_id, params, video_terms, audio_duration, prefetch=None):
     if params.video_source == "local":
         logger.info("\n\n## preprocess local materials")
         materials = video.preprocess_video(
@@ -170,16 +206,21 @@ def get_video_materials(task_id, params, video_terms, audio_duration):
             return None
         return [material_info.url for material_info in materials]
     else:
-        logger.info(f"\n\n## downloading videos from {params.video_source}")
-        downloaded_videos = material.download_videos(
-            task_id=task_id,
-            search_terms=video_terms,
-            source=params.video_source,
-            video_aspect=params.video_aspect,
-            video_contact_mode=params.video_concat_mode,
-            audio_duration=audio_duration * params.video_count,
-            max_clip_duration=params.video_clip_duration,
-        )
+        if prefetch:
+            logger.info(f"\n\n## finishing video prefetch from {params.video_source}")
+            prefetch.set_target(audio_duration * params.video_count)
+            downloaded_videos = prefetch.result(timeout=config.app.get("material_download_timeout", 1800))
+        else:
+            logger.info(f"\n\n## downloading videos from {params.video_source}")
+            downloaded_videos = material.download_videos(
+                task_id=task_id,
+                search_terms=video_terms,
+                source=params.video_source,
+                video_aspect=params.video_aspect,
+                video_contact_mode=params.video_concat_mode,
+                audio_duration=audio_duration * params.video_count,
+                max_clip_duration=params.video_clip_duration,
+            )
         if not downloaded_videos:
             sm.state.update_task(task_id, state=const.TASK_STATE_FAILED)
             logger.error(
@@ -289,64 +330,74 @@ def start(task_id, params: VideoParams, stop_at: str = "video"):
     audio_file = None
     audio_duration = None
     sub_maker = None
-
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        terms_future = None
-        if params.video_source != "local":
-            terms_future = executor.submit(generate_terms, task_id, params, video_script)
-        audio_future = executor.submit(generate_audio, task_id, params, video_script)
-
-        # Collect results
-        if terms_future:
-            video_terms = terms_future.result()
-            if not video_terms:
+    prefetch = None
+
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            terms_future = None
+            if params.video_source != "local":
+                terms_future = executor.submit(generate_terms, task_id, params, video_script)
+            audio_future = executor.submit(generate_audio, task_id, params, video_script)
+
+            # Collect results
+            if terms_future:
+                video_terms = terms_future.result()
+                if not video_terms:
+                    sm.state.update_task(task_id, state=const.TASK_STATE_FAILED)
+                    return
+
+                # Terms are usually ready long before TTS: overlap the downloads with it
+                if stop_at not in ("audio", "subtitle"):
+                    prefetch = start_material_prefetch(task_id, params, video_terms, video_script)
+
+            audio_result = audio_future.result()
+            audio_file, audio_duration, sub_maker = audio_result
+            if not audio_file:
                 sm.state.update_task(task_id, state=const.TASK_STATE_FAILED)
                 return
 
-        audio_result = audio_future.result()
-        audio_file, audio_duration, sub_maker = audio_result
-        if not audio_file:
-            sm.state.update_task(task_id, state=const.TASK_STATE_FAILED)
-            return
-
-    save_script_data(task_id, video_script, video_terms, params)
-    sm.state.update_task(task_id, state=const.TASK_STATE_PROCESSING, progress=30)
-
-    if stop_at == "audio":
-        sm.state.update_task(
-            task_id,
-            state=const.TASK_STATE_COMPLETE,
-            progress=100,
-            audio_file=audio_file,
-        )
-        return {"audio_file": audio_file, "audio_duration": audio_duration}
+        save_script_data(task_id, video_script, video_terms, params)
+        sm.state.update_task(task_id, state=const.TASK_STATE_PROCESSING, progress=30)
+
+        if stop_at == "audio":
+            sm.state.update_task(
+                task_id,
+                state=const.TASK_STATE_COMPLETE,
+                progress=100,
+                audio_file=audio_file,
+            )
+            return {"audio_file": audio_file, "audio_duration": audio_duration}
 
-    # ===== Step 4: Early exit for "subtitle" only =====
-    if stop_at == "subtitle":
-        subtitle_path = generate_subtitle(
-            task_id, params, video_script, sub_maker, audio_file
-        )
-        sm.state.update_task(
-            task_id,
-            state=const.TASK_STATE_COMPLETE,
-            progress=100,
-            subtitle_path=subtitle_path,
-        )
-        return {"subtitle_path": subtitle_path}
+        # ===== Step 4: Early exit for "subtitle" only =====
+        if stop_at == "subtitle":
+            subtitle_path = generate_subtitle(
+                task_id, params, video_script, sub_maker, audio_file
+            )
+            sm.state.update_task(
+                task_id,
+                state=const.TASK_STATE_COMPLETE,
+                progress=100,
+                subtitle_path=subtitle_path,
+            )
+            return {"subtitle_path": subtitle_path}
 
-    # ===== Step 4+5: Subtitle + video download in PARALLEL =====
-    logger.info("\n\n## ⚡ running subtitle + video download in parallel")
+        # ===== Step 4+5: Subtitle + video download in PARALLEL =====
+        logger.info("\n\n## ⚡ running subtitle + video download in parallel")
 
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        subtitle_future = executor.submit(
-            generate_subtitle, task_id, params, video_script, sub_maker, audio_file
-        )
-        download_future = executor.submit(
-            get_video_materials, task_id, params, video_terms, audio_duration
-        )
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            subtitle_future = executor.submit(
+                generate_subtitle, task_id, params, video_script, sub_maker, audio_file
+            )
+            download_future = executor.submit(
+                get_video_materials, task_id, params, video_terms, audio_duration, prefetch
+            )
 
-        subtitle_path = subtitle_future.result()
-        downloaded_videos = download_future.result()
+            subtitle_path = subtitle_future.result()
+            downloaded_videos = download_future.result()
+    finally:
+        # Stops a speculative prefetch on every early exit or error (no-op once it finished)
+        if prefetch:
+            prefetch.cancel()
 
     if not downloaded_videos:
         sm.state.update_task(task_id, state=const.TASK_STATE_FAILED)
@@ -375,6 +426,7 @@ def start(task_id, params: VideoParams, stop_at: str = "video"):
     logger.success(
         f"task {task_id} finished, generated {len(final_video_paths)} videos."
     )
+    log_cache_stats()
 
     kwargs = {
         "videos": final_video_paths,
@@ -0,0 +1,343 @@
+"""
+TtsCache - content-addressed TTS cache at sentence granularity.
+
+Benefits:
+- Scripts are synthesized sentence by sentence; each sentence's audio and word
+  boundaries are stored under a hash of (normalized sentence, voice, rate,
+  volume, provider, model version)
+- Re-running a task after editing one sentence, or reusing a script with a
+  different video, only sends the new sentences to the TTS engine
+- The script's audio is assembled by concatenating the sentence audio; the
+  SubMaker offsets of every sentence are shifted by the audio before it, so
+  subtitles are built exactly as for a single TTS call
+- Byte quota with LRU eviction (hits refresh the entry)
+
+Usage:
+    sub_maker = TtsCache.get_instance().synthesize(script, voice_name, voice_rate, voice_file)
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import unicodedata
+from typing import Callable, Dict, List, Optional, Tuple
+
+from edge_tts import SubMaker
+from loguru import logger
+
+from app.config import config
+from app.services.utils import mp3
+from app.utils import utils
+
+# Bump to invalidate every cached sentence (e.g. after changing how audio is produced)
+CACHE_VERSION = 1
+
+# Entries used this recently may be about to be assembled by a running task and are never evicted
+_eviction_grace_seconds = 600
+
+# Minimum seconds between eviction scans (each one walks the whole cache directory)
+_eviction_interval = 300
+
+# A sentence ends at terminal punctuation (kept with it) or a line break
+_SENTENCE_END = re.compile(r"(?<=[.!?;。！？；…])\s+|(?<=[。！？；…])|\n+")
+
+
+def normalize_sentence(text: str) -> str:
+    """Cache-key form of a sentence: NFKC (full-width punctuation, compatibility forms) and collapsed whitespace."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of a script, in order, with their punctuation (whitespace collapsed)."""
+    return [s for s in (re.sub(r"\s+", " ", part).strip() for part in _SENTENCE_END.split(text)) if s]
+
+
+def cache_enabled(voice_name: str) -> bool:
+    """
+    Whether scripts for this voice go through the sentence cache.
+
+    Only Edge voices by default: for the other providers every sentence is a
+    separate API request (or model run), and Chatterbox loses its single-pass
+    alignment and the prosody across sentences. tts_cache_all_voices opts them in.
+    """
+    from app.services import voice
+
+    if not config.app.get("tts_cache", True):
+        return False
+    return voice.is_edge_voice(voice_name) or bool(config.app.get("tts_cache_all_voices", False))
+
+
+def model_version(voice_name: str) -> str:
+    """Identifies the engine behind a voice, so cached audio is not reused across engine changes."""
+    from app.services import voice
+
+    if voice.is_siliconflow_voice(voice_name):
+        return "siliconflow:" + voice_name.split(":")[1]
+    if voice.is_chatterbox_voice(voice_name):
+        return "chatterbox"
+    if voice.is_gtts_voice(voice_name):
+        return "gtts"
+    if voice.is_azure_v2_voice(voice_name):
+        return "azure-speech"
+    import edge_tts
+
+    return f"edge-tts:{getattr(edge_tts, '__version__', '')}"
+
+
+def audio_duration(audio_file: str) -> float:
+    if audio_file.lower().endswith(".mp3"):
+        return mp3.duration(audio_file)
+    from moviepy import AudioFileClip
+
+    clip = AudioFileClip(audio_file)
+    try:
+        return clip.duration
+    finally:
+        clip.close()
+
+
+class TtsCache:
+    """Sentence audio + word boundaries on disk (one instance per cache directory)."""
+
+    _instances: Dict[str, "TtsCache"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.max_size = int(config.app.get("tts_cache_max_size_mb", 512)) * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._last_eviction = 0.0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @classmethod
+    def get_instance(cls, cache_dir: str = "") -> "TtsCache":
+        cache_dir = os.path.realpath(cache_dir or utils.storage_dir("cache_tts", create=True))
+        with cls._lock:
+            if cache_dir not in cls._instances:
+                cls._instances[cache_dir] = TtsCache(cache_dir)
+            return cls._instances[cache_dir]
+
+    # ========================================================================
+    # ENTRIES
+    # ========================================================================
+
+    @staticmethod
+    def key(sentence: str, voice_name: str, voice_rate: float, voice_volume: float = 1.0) -> str:
+        payload = json.dumps(
+            [CACHE_VERSION, normalize_sentence(sentence), voice_name, round(float(voice_rate), 3),
+             round(float(voice_volume), 3), model_version(voice_name)],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Cached sentence ({"audio", "subs", "offset", "duration"}), None on a miss."""
+        meta_path = self._meta_path(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            entry["audio"] = os.path.join(os.path.dirname(meta_path), entry["audio"])
+            if not os.path.isfile(entry["audio"]):
+                return None
+            now = time.time()
+            os.utime(meta_path, (now, now))
+            return entry
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key: str, sentence: str, audio_file: str, sub_maker: SubMaker) -> Dict:
+        directory = os.path.dirname(self._meta_path(key))
+        os.makedirs(directory, exist_ok=True)
+        audio_name = key + os.path.splitext(audio_file)[1]
+        tmp_audio = os.path.join(directory, f".{audio_name}.{os.getpid()}.{threading.get_ident()}")
+        shutil.copyfile(audio_file, tmp_audio)
+        os.replace(tmp_audio, os.path.join(directory, audio_name))
+        entry = {
+            "text": sentence,
+            "audio": audio_name,
+            "subs": list(sub_maker.subs),
+            "offset": [list(offset) for offset in sub_maker.offset],
+            "duration": audio_duration(audio_file),
+            "created_at": time.time(),
+        }
+        tmp_meta = self._meta_path(key) + f".{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_meta, self._meta_path(key))
+        return {**entry, "audio": os.path.join(directory, audio_name)}
+
+    def evict(self) -> int:
+        """
+        Remove least recently used sentences beyond tts_cache_max_size_mb. Returns the number removed.
+
+        Sentences used within the last _eviction_grace_seconds are kept even over quota.
+        """
+        if self.max_size <= 0:
+            return 0
+        self._last_eviction = time.time()
+        cutoff = self._last_eviction - _eviction_grace_seconds
+        # key -> [last use, size, files]
+        entries: Dict[str, list] = {}
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.startswith("."):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # removed by a concurrent eviction
+                    continue
+                entry = entries.setdefault(name.split(".")[0], [0.0, 0, []])
+                entry[1] += stat.st_size
+                entry[2].append(path)
+                if name.endswith(".json"):
+                    entry[0] = stat.st_mtime
+        total = sum(size for _, size, _ in entries.values())
+        removed = 0
+        for last_use, size, paths in sorted(entries.values()):
+            if total <= self.max_size or last_use >= cutoff:
+                break
+            # the .json index entry goes with the audio even if another worker got there first
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.debug(f"tts cache: could not remove {path}: {str(e)}")
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"tts cache: evicted {removed} sentences")
+        return removed
+
+    # ========================================================================
+    # SYNTHESIS
+    # ========================================================================
+
+    def synthesize(
+        self,
+        text: str,
+        voice_name: str,
+        voice_rate: float,
+        voice_file: str,
+        voice_volume: float = 1.0,
+        tts: Callable = None,
+    ) -> Optional[SubMaker]:
+        """
+        voice.tts() for a whole script, served from cached sentences where possible.
+
+        Returns the SubMaker of the assembled script (offsets shifted per
+        sentence), or None when a sentence cannot be synthesized.
+        """
+        from app.services import voice
+
+        tts = tts or voice.tts
+        sentences = split_sentences(text)
+        if not sentences:
+            return None
+
+        entries: List[Optional[Dict]] = []
+        missing: List[Tuple[int, str, str]] = []
+        for index, sentence in enumerate(sentences):
+            key = self.key(sentence, voice_name, voice_rate, voice_volume)
+            entry = self.get(key)
+            entries.append(entry)
+            if entry is None:
+                missing.append((index, sentence, key))
+        self.hits += len(sentences) - len(missing)
+        self.misses += len(missing)
+        logger.info(f"tts cache: {len(sentences) - len(missing)}/{len(sentences)} sentences cached")
+
+        if tts is voice.tts and voice.is_edge_voice(voice_name) and len(missing) > 1:
+            # Edge TTS is network bound: request the missing sentences concurrently
+            synthesized = self._synthesize_edge_batch(missing, voice_name, voice_rate, voice_file)
+        else:
+            synthesized = []
+            for _, sentence, key in missing:
+                entry = self._synthesize_sentence(tts, sentence, key, voice_name, voice_rate, voice_file, voice_volume)
+                synthesized.append(entry)
+                if entry is None:
+                    break
+        for (index, _, _), entry in zip(missing, synthesized):
+            if entry is None:
+                return None
+            entries[index] = entry
+        sub_maker = self._assemble(entries, voice_file)
+        if missing and time.time() - self._last_eviction >= _eviction_interval:
+            self.evict()
+        return sub_maker
+
+    def _synthesize_sentence(
+        self, tts: Callable, sentence: str, key: str, voice_name: str, voice_rate: float, voice_file: str,
+        voice_volume: float,
+    ) -> Optional[Dict]:
+        base, ext = os.path.splitext(voice_file)
+        sentence_file = f"{base}.sentence-{key[:12]}{ext}"
+        try:
+            sub_maker = tts(
+                text=sentence, voice_name=voice_name, voice_rate=voice_rate,
+                voice_file=sentence_file, voice_volume=voice_volume,
+            )
+            if sub_maker is None or not sub_maker.subs:
+                logger.error(f"tts failed for sentence: {sentence[:60]}")
+                return None
+            sentence_file = getattr(sub_maker, "_actual_audio_file", sentence_file)
+            return self.put(key, sentence, sentence_file, sub_maker)
+        finally:
+            for path in {sentence_file, f"{base}.sentence-{key[:12]}{ext}"}:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _synthesize_edge_batch(
+        self, missing: List[Tuple[int, str, str]], voice_name: str, voice_rate: float, voice_file: str
+    ) -> List[Optional[Dict]]:
+        from app.services import voice
+
+        base, ext = os.path.splitext(voice_file)
+        sentence_files = [f"{base}.sentence-{key[:12]}{ext}" for _, _, key in missing]
+        try:
+            sub_makers = voice.edge_tts_batch(
+                [sentence for _, sentence, _ in missing], voice_name, voice_rate, sentence_files
+            )
+            return [
+                self.put(key, sentence, sentence_file, sub_maker) if sub_maker else None
+                for (_, sentence, key), sentence_file, sub_maker in zip(missing, sentence_files, sub_makers)
+            ]
+        finally:
+            for path in sentence_files:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    @staticmethod
+    def _assemble(entries: List[Dict], voice_file: str) -> Optional[SubMaker]:
+        from app.services import voice
+
+        sub_maker = voice.ensure_submaker_compatibility(SubMaker())
+        shift = 0
+        for entry in entries:
+            sub_maker.subs.extend(entry["subs"])
+            sub_maker.offset.extend((start + shift, end + shift) for start, end in entry["offset"])
+            shift += int(entry["duration"] * 10000000)
+
+        audio_files = [entry["audio"] for entry in entries]
+        if len(audio_files) == 1 and os.path.splitext(audio_files[0])[1] == os.path.splitext(voice_file)[1]:
+            shutil.copyfile(audio_files[0], voice_file)
+        elif all(path.lower().endswith(".mp3") for path in audio_files + [voice_file]):
+            # frame-aligned MP3 parts join without re-encoding
+            mp3.concat(audio_files, voice_file)
+        elif not voice.combine_audio_files(audio_files, voice_file):
+            return None
+        sub_maker._actual_audio_file = voice_file
+        return sub_maker
+
+    def get_stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,43 @@
+"""
+Keyframe extraction from local clips for image embeddings.
+
+Frames are grabbed with an input-side seek (-ss before -i), so ffmpeg jumps to
+the nearest keyframe and decodes only a handful of packets per frame, and are
+scaled down by ffmpeg before they are piped back as PNG.
+"""
+
+import io
+import subprocess
+from typing import List
+
+from PIL import Image
+
+
+def frame_positions(duration: float, count: int) -> List[float]:
+    """Evenly spaced timestamps that avoid the first and last frame (fades, black frames)."""
+    if duration <= 0:
+        return [0.0]
+    return [duration * (i + 1) / (count + 1) for i in range(count)]
+
+
+def extract_frame(video_path: str, position: float, ffmpeg: str = "ffmpeg", width: int = 224):
+    """One frame as an RGB PIL image, None when it cannot be decoded."""
+    cmd = [
+        ffmpeg, "-hide_banner", "-loglevel", "error",
+        "-ss", f"{position:.3f}", "-i", video_path,
+        "-frames:v", "1", "-vf", f"scale={width}:-2",
+        "-f", "image2pipe", "-vcodec", "png", "-",
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=30)
+        if result.returncode != 0 or not result.stdout:
+            return None
+        return Image.open(io.BytesIO(result.stdout)).convert("RGB")
+    except Exception:
+        return None
+
+
+def extract_keyframes(video_path: str, duration: float, ffmpeg: str = "ffmpeg", count: int = 3, width: int = 224) -> List:
+    """Up to count frames spread over the clip (frames that fail to decode are skipped)."""
+    frames = [extract_frame(video_path, position, ffmpeg, width) for position in frame_positions(duration, count)]
+    return [frame for frame in frames if frame is not None]
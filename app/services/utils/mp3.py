@@ -0,0 +1,139 @@
+"""
+Minimal MPEG audio (MP3) frame reader.
+
+Durations are computed by walking the frame headers, so TTS output never has
+to be decoded (or opened with MoviePy) to be measured, and can be measured
+while it is still being streamed. Frame-aligned MP3 streams of the same format
+can be concatenated byte-wise; their durations add up exactly.
+"""
+
+import os
+import shutil
+import threading
+from typing import List, Optional, Tuple
+
+# kbps per bitrate index, by (MPEG-1?, layer)
+_BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# Hz per sample-rate index, by version bits (3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5)
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+# MPEG header (4 bytes) plus the largest side info, enough to spot a Xing/Info frame
+_XING_SCAN = 4 + 32 + 4
+
+
+def parse_header(header: bytes) -> Optional[Tuple[int, int, int]]:
+    """(frame length in bytes, samples per frame, sample rate) of a frame header, None if invalid."""
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x3
+    layer = 4 - ((header[1] >> 1) & 0x3)
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 0x1
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+    samples = 1152 if mpeg1 or layer == 2 else 576
+    return samples // 8 * bitrate // sample_rate + padding, samples, sample_rate
+
+
+def _id3v2_size(data: bytes) -> int:
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+class FrameCounter:
+    """
+    Incremental duration of an MP3 stream: feed() the bytes as they arrive.
+
+    A leading ID3v2 tag and a Xing/Info (encoder metadata) frame are skipped,
+    garbage between frames is resynchronised over.
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self._seconds = 0.0
+        self.sample_rate = 0
+        self._buffer = b""
+        self._skip = 0
+        self._started = False
+
+    @property
+    def duration(self) -> float:
+        return self._seconds
+
+    def feed(self, data: bytes):
+        buffer = self._buffer + data
+        position = 0
+        if not self._started:
+            if len(buffer) < 10:
+                self._buffer = buffer
+                return
+            self._skip = _id3v2_size(buffer)
+            self._started = True
+        if self._skip:
+            skipped = min(self._skip, len(buffer))
+            self._skip -= skipped
+            position = skipped
+        while len(buffer) - position >= 4:
+            frame = parse_header(buffer[position:position + 4])
+            if frame is None:
+                position += 1
+                continue
+            length, samples, sample_rate = frame
+            if self.frames == 0 and not self.sample_rate:
+                if len(buffer) - position < min(length, _XING_SCAN):
+                    break
+                head = buffer[position:position + min(length, _XING_SCAN)]
+                self.sample_rate = sample_rate
+                if b"Xing" in head or b"Info" in head:
+                    # encoder metadata frame, decoders play no audio for it
+                    position += length
+                    continue
+            self.frames += 1
+            self._seconds += samples / sample_rate
+            position += length
+        if position > len(buffer):
+            self._skip = position - len(buffer)
+            position = len(buffer)
+        self._buffer = buffer[position:]
+
+
+def duration(path: str, chunk_size: int = 64 * 1024) -> float:
+    """Duration in seconds of an MP3 file, from its frame headers."""
+    counter = FrameCounter()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            counter.feed(chunk)
+    return counter.duration
+
+
+def concat(paths: List[str], output_path: str):
+    """Join MP3 files of the same format without re-encoding (ID3v2 tags after the first file are dropped)."""
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.part"
+    with open(tmp_path, "wb") as out:
+        for index, path in enumerate(paths):
+            with open(path, "rb") as f:
+                if index:
+                    f.seek(_id3v2_size(f.read(10)))
+                shutil.copyfileobj(f, out)
+    os.replace(tmp_path, output_path)
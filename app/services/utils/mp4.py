@@ -0,0 +1,312 @@
+"""
+Minimal ISO-BMFF (MP4) reader for header-only inspection of stock clips.
+
+Only the boxes needed to locate samples are parsed: mvhd, tkhd, mdhd, hdlr,
+stsd, stts, stss, stsz, stsc and stco/co64. Edit lists are ignored, which is
+fine for the stock footage served by Pexels/Pixabay.
+"""
+
+import struct
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+# Containers we descend into when looking for sample tables
+_CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"edts", b"dinf"}
+
+
+class Mp4Error(Exception):
+    pass
+
+
+@dataclass
+class Track:
+    kind: str = ""  # "vide", "soun", ...
+    timescale: int = 0
+    duration: int = 0
+    codec: str = ""
+    width: int = 0
+    height: int = 0
+    sample_times: List[int] = field(default_factory=list)  # decode time per sample (timescale units)
+    sample_sizes: List[int] = field(default_factory=list)
+    sample_offsets: List[int] = field(default_factory=list)
+    sync_samples: Optional[List[int]] = None  # 0-based indexes, None means every sample is a keyframe
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.duration / self.timescale if self.timescale else 0.0
+
+    @property
+    def fps(self) -> float:
+        if self.kind != "vide" or not self.duration:
+            return 0.0
+        return len(self.sample_sizes) / self.duration_seconds
+
+
+@dataclass
+class Movie:
+    timescale: int = 0
+    duration: int = 0
+    tracks: List[Track] = field(default_factory=list)
+
+    @property
+    def duration_seconds(self) -> float:
+        return self.duration / self.timescale if self.timescale else 0.0
+
+    @property
+    def video_track(self) -> Optional[Track]:
+        for track in self.tracks:
+            if track.kind == "vide":
+                return track
+        return None
+
+
+def iter_boxes(data: bytes, start: int = 0, end: int = None) -> Iterator[Tuple[bytes, int, int, int]]:
+    """Yield (type, offset, size, header_size) for every box between start and end.
+
+    A box whose declared size runs past ``end`` is still yielded so callers can
+    tell how many more bytes they need to fetch.
+    """
+    if end is None:
+        end = len(data)
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[offset:offset + 8])
+        header_size = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack(">Q", data[offset + 8:offset + 16])[0]
+            header_size = 16
+        elif size == 0:
+            # box extends to the end of the file
+            size = end - offset
+        if size < header_size:
+            raise Mp4Error(f"invalid box size {size} for {box_type!r} at {offset}")
+        yield box_type, offset, size, header_size
+        offset += size
+
+
+def locate_moov(head: bytes) -> Tuple[Optional[int], Optional[int], bool]:
+    """Find the moov box in the first bytes of a file.
+
+    Returns (offset, size, faststart). ``offset`` is None when moov was not seen
+    in ``head``; ``faststart`` is False when mdat appears before moov, in which
+    case the file cannot be partially fetched.
+    """
+    for box_type, offset, size, _ in iter_boxes(head):
+        if box_type == b"moov":
+            return offset, size, True
+        if box_type == b"mdat":
+            return None, None, False
+    return None, None, True
+
+
+def _full_box(data: bytes, offset: int) -> Tuple[int, int]:
+    """Return (version, payload_offset) of a full box payload starting at offset."""
+    return data[offset], offset + 4
+
+
+def _parse_mvhd(data: bytes, offset: int) -> Tuple[int, int]:
+    version, p = _full_box(data, offset)
+    if version == 1:
+        timescale, duration = struct.unpack(">IQ", data[p + 16:p + 28])
+    else:
+        timescale, duration = struct.unpack(">II", data[p + 8:p + 16])
+    return timescale, duration
+
+
+def _parse_stsd(track: Track, data: bytes, offset: int):
+    _, p = _full_box(data, offset)
+    entry_count = struct.unpack(">I", data[p:p + 4])[0]
+    if not entry_count:
+        return
+    entry = p + 4
+    track.codec = data[entry + 4:entry + 8].decode("latin-1")
+    if track.kind == "vide":
+        # VisualSampleEntry: 8 header + 6 reserved + 2 index + 16 predefined
+        track.width, track.height = struct.unpack(">HH", data[entry + 32:entry + 36])
+
+
+def _parse_stts(data: bytes, offset: int) -> List[int]:
+    _, p = _full_box(data, offset)
+    entry_count = struct.unpack(">I", data[p:p + 4])[0]
+    times = []
+    t = 0
+    for i in range(entry_count):
+        count, delta = struct.unpack(">II", data[p + 4 + i * 8:p + 12 + i * 8])
+        for _ in range(count):
+            times.append(t)
+            t += delta
+    return times
+
+
+def _parse_stss(data: bytes, offset: int) -> List[int]:
+    _, p = _full_box(data, offset)
+    entry_count = struct.unpack(">I", data[p:p + 4])[0]
+    return [n - 1 for n in struct.unpack(f">{entry_count}I", data[p + 4:p + 4 + entry_count * 4])]
+
+
+def _parse_stsz(data: bytes, offset: int) -> List[int]:
+    _, p = _full_box(data, offset)
+    sample_size, sample_count = struct.unpack(">II", data[p:p + 8])
+    if sample_size:
+        return [sample_size] * sample_count
+    return list(struct.unpack(f">{sample_count}I", data[p + 8:p + 8 + sample_count * 4]))
+
+
+def _parse_stsc(data: bytes, offset: int) -> List[Tuple[int, int]]:
+    _, p = _full_box(data, offset)
+    entry_count = struct.unpack(">I", data[p:p + 4])[0]
+    entries = []
+    for i in range(entry_count):
+        first_chunk, per_chunk, _ = struct.unpack(">III", data[p + 4 + i * 12:p + 16 + i * 12])
+        entries.append((first_chunk, per_chunk))
+    return entries
+
+
+def _parse_chunk_offsets(data: bytes, offset: int, large: bool) -> List[int]:
+    _, p = _full_box(data, offset)
+    entry_count = struct.unpack(">I", data[p:p + 4])[0]
+    fmt = "Q" if large else "I"
+    width = 8 if large else 4
+    return list(struct.unpack(f">{entry_count}{fmt}", data[p + 4:p + 4 + entry_count * width]))
+
+
+def _sample_offsets(sizes: List[int], stsc: List[Tuple[int, int]], chunk_offsets: List[int]) -> List[int]:
+    offsets = []
+    sample = 0
+    for i, (first_chunk, per_chunk) in enumerate(stsc):
+        last_chunk = stsc[i + 1][0] - 1 if i + 1 < len(stsc) else len(chunk_offsets)
+        for chunk in range(first_chunk, last_chunk + 1):
+            position = chunk_offsets[chunk - 1]
+            for _ in range(per_chunk):
+                if sample >= len(sizes):
+                    return offsets
+                offsets.append(position)
+                position += sizes[sample]
+                sample += 1
+    return offsets
+
+
+def _parse_trak(data: bytes, start: int, end: int) -> Track:
+    track = Track()
+    stsc, chunk_offsets = [], []
+    stack = [(start, end)]
+    boxes = {}
+    while stack:
+        s, e = stack.pop()
+        for box_type, offset, size, header in iter_boxes(data, s, e):
+            payload = offset + header
+            if box_type in _CONTAINER_BOXES:
+                stack.append((payload, offset + size))
+            else:
+                boxes[box_type] = payload
+
+    if b"hdlr" in boxes:
+        p = boxes[b"hdlr"] + 4
+        track.kind = data[p + 4:p + 8].decode("latin-1")
+    if b"mdhd" in boxes:
+        track.timescale, track.duration = _parse_mvhd(data, boxes[b"mdhd"])
+    if b"stsd" in boxes:
+        _parse_stsd(track, data, boxes[b"stsd"])
+    if b"stts" in boxes:
+        track.sample_times = _parse_stts(data, boxes[b"stts"])
+    if b"stss" in boxes:
+        track.sync_samples = _parse_stss(data, boxes[b"stss"])
+    if b"stsz" in boxes:
+        track.sample_sizes = _parse_stsz(data, boxes[b"stsz"])
+    if b"stsc" in boxes:
+        stsc = _parse_stsc(data, boxes[b"stsc"])
+    if b"stco" in boxes:
+        chunk_offsets = _parse_chunk_offsets(data, boxes[b"stco"], large=False)
+    elif b"co64" in boxes:
+        chunk_offsets = _parse_chunk_offsets(data, boxes[b"co64"], large=True)
+    track.sample_offsets = _sample_offsets(track.sample_sizes, stsc, chunk_offsets)
+    return track
+
+
+def parse_moov(moov: bytes) -> Movie:
+    """Parse a complete moov box (including its 8/16 byte header)."""
+    movie = Movie()
+    boxes = list(iter_boxes(moov))
+    if not boxes or boxes[0][0] != b"moov":
+        raise Mp4Error("data does not start with a moov box")
+    _, offset, size, header = boxes[0]
+    if offset + size > len(moov):
+        raise Mp4Error("moov box is truncated")
+    for box_type, child, child_size, child_header in iter_boxes(moov, offset + header, offset + size):
+        if box_type == b"mvhd":
+            movie.timescale, movie.duration = _parse_mvhd(moov, child + child_header)
+        elif box_type == b"trak":
+            movie.tracks.append(_parse_trak(moov, child + child_header, child + child_size))
+    return movie
+
+
+def parse_file(path: str) -> Tuple[Movie, bool]:
+    """Parse the moov of a local MP4 without reading the media data.
+
+    Returns (movie, mdat_complete). ``mdat_complete`` is False when the file is
+    shorter than its mdat box declares, i.e. it was truncated.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, 2)
+        file_size = f.tell()
+        offset = 0
+        moov = None
+        mdat_complete = False
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            header = f.read(16)
+            size, box_type = struct.unpack(">I4s", header[:8])
+            if size == 1:
+                size = struct.unpack(">Q", header[8:16])[0]
+            elif size == 0:
+                size = file_size - offset
+            if size < 8:
+                raise Mp4Error(f"invalid box size {size} at {offset}")
+            if box_type == b"moov":
+                f.seek(offset)
+                moov = f.read(size)
+            elif box_type == b"mdat":
+                mdat_complete = offset + size <= file_size
+            offset += size
+    if moov is None:
+        raise Mp4Error("moov box not found")
+    return parse_moov(moov), mdat_complete
+
+
+def window_byte_range(movie: Movie, start: float, end: float) -> Tuple[float, int, int]:
+    """Map a time window to the byte span holding its samples.
+
+    The window is widened back to the video keyframe at or before ``start`` so
+    the fetched segment decodes on its own. Returns (keyframe_time, first_byte,
+    last_byte) where last_byte is inclusive.
+    """
+    video = movie.video_track
+    if video is None or not video.sample_times:
+        raise Mp4Error("no video track with samples")
+
+    start_ts = int(start * video.timescale)
+    index = max(0, bisect_right(video.sample_times, start_ts) - 1)
+    if video.sync_samples is not None:
+        sync_before = [s for s in video.sync_samples if s <= index]
+        index = sync_before[-1] if sync_before else 0
+    keyframe_time = video.sample_times[index] / video.timescale
+
+    first_byte, last_byte = None, None
+    for track in movie.tracks:
+        if not track.timescale or not track.sample_offsets:
+            continue
+        lo = bisect_right(track.sample_times, int(keyframe_time * track.timescale)) - 1
+        hi = bisect_right(track.sample_times, int(end * track.timescale))
+        lo = max(0, lo)
+        hi = min(hi, len(track.sample_offsets))
+        for i in range(lo, hi):
+            o = track.sample_offsets[i]
+            first_byte = o if first_byte is None else min(first_byte, o)
+            last_byte = o + track.sample_sizes[i] - 1 if last_byte is None else max(last_byte, o + track.sample_sizes[i] - 1)
+
+    if first_byte is None:
+        raise Mp4Error("window does not contain any samples")
+    return keyframe_time, first_byte, last_byte
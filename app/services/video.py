@@ -36,6 +36,8 @@ from app.models.schema import (
 from app.services.utils import video_effects
 from app.utils import utils
 from app.services import semantic_video
+from app.services.ingest_embeddings import IngestEmbedder
+from app.services.memory_cache import MemoryCache
 
 # High-quality video encoding settings
 audio_codec = "aac"
@@ -225,6 +227,11 @@ def combine_videos(
     if video_concat_mode.value == "semantic" and script:
         logger.info("Using semantic video selection mode")
         
+        # Clips still queued for ingest-time embeddings are embedded by the
+        # background worker; waiting briefly avoids encoding them twice
+        if not IngestEmbedder.get_instance().wait_for(video_paths, timeout=config.app.get("ingest_embeddings_wait", 30)):
+            logger.warning("ingest embeddings not finished, remaining clips are embedded during selection")
+        
         # Load video metadata
         video_metadata = []
         for video_path in video_paths:
@@ -255,7 +262,8 @@ def combine_videos(
             semantic_model=params.semantic_model if params else "all-mpnet-base-v2",
             enable_image_similarity=params.enable_image_similarity if params else False,
             image_similarity_threshold=params.image_similarity_threshold if params else 0.7,
-            image_similarity_model=params.image_similarity_model if params else "clip-vit-base-patch32"
+            image_similarity_model=params.image_similarity_model if params else "clip-vit-base-patch32",
+            assignment_mode=getattr(params, "semantic_assignment", "greedy") if params else "greedy"
         )
         
         # Process selected videos
@@ -626,9 +634,23 @@ def _progressive_merge_fallback(processed_clips, combined_video_path, output_dir
     return combined_video_path
 
 
+# Loaded fonts (sized by their font file) and wrapped subtitle lines, shared by all renders
+_font_cache = MemoryCache("fonts", 128 * 1024 * 1024, stripes=4)
+_layout_cache = MemoryCache("subtitle_layout", 8 * 1024 * 1024)
+
+
+def _load_font(font_path, fontsize):
+    return _font_cache.get_or_compute((font_path, fontsize), lambda: ImageFont.truetype(font_path, fontsize))
+
+
 def wrap_text(text, max_width, font="Arial", fontsize=60):
-    # Create ImageFont
-    font = ImageFont.truetype(font, fontsize)
+    return _layout_cache.get_or_compute(
+        (text, max_width, font, fontsize), lambda: _wrap_text(text, max_width, font, fontsize)
+    )
+
+
+def _wrap_text(text, max_width, font, fontsize):
+    font = _load_font(font, fontsize)
 
     def get_text_size(inner_text):
         inner_text = inner_text.strip()
@@ -765,7 +787,7 @@ def create_enhanced_subtitle_clips(enhanced_subtitle_path, params, video_width,
     def create_word_highlighted_image(text, highlighted_word_indices, font_size, normal_color, highlight_color, stroke_color, stroke_width):
         """Create an image with specific words highlighted"""
         try:
-            font = ImageFont.truetype(font_path, font_size)
+            font = _load_font(font_path, font_size)
         except:
             font = ImageFont.load_default()
         
@@ -1,8 +1,10 @@
 import asyncio
 import os
 import re
+import threading
+import time
 from datetime import datetime
-from typing import Union
+from typing import List, Union
 from xml.sax.saxutils import unescape
 
 # Suppress warnings and handle CUDA library conflicts
@@ -28,6 +30,8 @@ from loguru import logger
 from moviepy.video.tools import subtitles
 
 from app.config import config
+from app.services import alignment, tts_cache
+from app.services.utils import mp3
 from app.utils import utils
 
 # Import gTTS
@@ -1208,6 +1212,16 @@ def is_gtts_voice(voice_name: str):
     return voice_name.startswith("gtts:")
 
 
+def is_edge_voice(voice_name: str):
+    """Voices served by Edge TTS (azure_tts_v1), i.e. none of the other providers."""
+    return not (
+        is_azure_v2_voice(voice_name)
+        or is_siliconflow_voice(voice_name)
+        or is_chatterbox_voice(voice_name)
+        or is_gtts_voice(voice_name)
+    )
+
+
 def tts(
     text: str,
     voice_name: str,
@@ -1261,29 +1275,103 @@ def convert_rate_to_percent(rate: float) -> str:
         return f"{percent}%"
 
 
+async def _edge_stream(text: str, voice_name: str, rate_str: str, voice_file: str) -> SubMaker:
+    """One Edge TTS request: audio streamed to voice_file, word boundaries collected."""
+    communicate = edge_tts.Communicate(text, voice_name, rate=rate_str)
+    sub_maker = ensure_submaker_compatibility(edge_tts.SubMaker())
+    with open(voice_file, "wb") as file:
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                file.write(chunk["data"])
+            elif chunk["type"] == "WordBoundary":
+                sub_maker.subs.append(chunk["text"])
+                sub_maker.offset.append((chunk["offset"], chunk["offset"] + chunk["duration"]))
+    return sub_maker
+
+
+def edge_tts_batch(
+    texts: List[str], voice_name: str, voice_rate: float, voice_files: List[str], retries: int = 3
+) -> List[Union[SubMaker, None]]:
+    """
+    Synthesize several texts with Edge TTS concurrently on one event loop.
+
+    At most edge_tts_concurrency requests are in flight; each text is retried
+    on its own (with backoff), so one failed sentence does not redo the others.
+    Returns one SubMaker per text, None where all attempts failed.
+    """
+    voice_name = parse_voice_name(voice_name)
+    rate_str = convert_rate_to_percent(voice_rate)
+    concurrency = max(1, int(config.app.get("edge_tts_concurrency", 4)))
+
+    async def _part(semaphore: asyncio.Semaphore, text: str, voice_file: str) -> Union[SubMaker, None]:
+        async with semaphore:
+            for i in range(retries):
+                try:
+                    sub_maker = await _edge_stream(text.strip(), voice_name, rate_str, voice_file)
+                    if sub_maker.subs:
+                        return sub_maker
+                    logger.warning(f"no word boundaries, try: {i + 1}, text: {text[:40]}")
+                except Exception as e:
+                    logger.warning(f"failed, try: {i + 1}, text: {text[:40]}, error: {str(e)}")
+                if i + 1 < retries:
+                    await asyncio.sleep(0.5 * 2**i)
+        logger.error(f"failed after {retries} tries, text: {text[:40]}")
+        return None
+
+    async def _run() -> List[Union[SubMaker, None]]:
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(
+            *(_part(semaphore, text, voice_file) for text, voice_file in zip(texts, voice_files))
+        )
+
+    return asyncio.run(_run())
+
+
+def _azure_tts_v1_parallel(
+    sentences: List[str], voice_name: str, voice_rate: float, voice_file: str
+) -> Union[SubMaker, None]:
+    """Sentences synthesized concurrently, MP3 parts joined and word boundaries rebased onto one timeline."""
+    base, ext = os.path.splitext(voice_file)
+    part_files = [f"{base}.part-{i}{ext}" for i in range(len(sentences))]
+    try:
+        parts = edge_tts_batch(sentences, voice_name, voice_rate, part_files)
+        if any(part is None for part in parts):
+            return None
+        sub_maker = ensure_submaker_compatibility(SubMaker())
+        shift = 0
+        for part, part_file in zip(parts, part_files):
+            sub_maker.subs.extend(part.subs)
+            sub_maker.offset.extend((start + shift, end + shift) for start, end in part.offset)
+            # offsets are in 100ns units
+            shift += round(mp3.duration(part_file) * 10000000)
+        mp3.concat(part_files, voice_file)
+        return sub_maker
+    finally:
+        for part_file in part_files:
+            if os.path.exists(part_file):
+                os.remove(part_file)
+
+
 def azure_tts_v1(
     text: str, voice_name: str, voice_rate: float, voice_file: str
 ) -> Union[SubMaker, None]:
-    voice_name = parse_voice_name(voice_name)
     text = text.strip()
+    if config.app.get("edge_tts_parallel", True):
+        sentences = tts_cache.split_sentences(text)
+        if len(sentences) > 1:
+            logger.info(f"start, voice name: {voice_name}, {len(sentences)} sentences in parallel")
+            sub_maker = _azure_tts_v1_parallel(sentences, voice_name, voice_rate, voice_file)
+            if sub_maker:
+                logger.info(f"completed, output file: {voice_file}")
+                return sub_maker
+            logger.warning("parallel synthesis failed, retrying the script as one request")
+
+    voice_name = parse_voice_name(voice_name)
     rate_str = convert_rate_to_percent(voice_rate)
     for i in range(3):
         try:
             logger.info(f"start, voice name: {voice_name}, try: {i + 1}")
-
-            async def _do() -> SubMaker:
-                communicate = edge_tts.Communicate(text, voice_name, rate=rate_str)
-                sub_maker = ensure_submaker_compatibility(edge_tts.SubMaker())
-                with open(voice_file, "wb") as file:
-                    async for chunk in communicate.stream():
-                        if chunk["type"] == "audio":
-                            file.write(chunk["data"])
-                        elif chunk["type"] == "WordBoundary":
-                            sub_maker.subs.append(chunk["text"])
-                            sub_maker.offset.append((chunk["offset"], chunk["offset"] + chunk["duration"]))
-                return sub_maker
-
-            sub_maker = asyncio.run(_do())
+            sub_maker = asyncio.run(_edge_stream(text, voice_name, rate_str, voice_file))
             if not sub_maker or not sub_maker.subs:
                 logger.warning("failed, sub_maker is None or sub_maker.subs is None")
                 continue
@@ -1338,12 +1426,18 @@ def siliconflow_tts(
         "voice": voice,
         "response_format": "mp3",
         "sample_rate": 32000,
-        "stream": False,
+        # 流式返回：首个音频块到达即开始写盘，无需在内存中缓存整段MP3
+        "stream": bool(config.siliconflow.get("stream", True)),
         "speed": voice_rate,
         "gain": gain,
     }
 
     headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    session = _get_siliconflow_session()
+    timeout = (
+        float(config.siliconflow.get("connect_timeout", 10)),
+        float(config.siliconflow.get("read_timeout", 120)),
+    )
 
     for i in range(3):  # 尝试3次
         try:
@@ -1351,85 +1445,87 @@ def siliconflow_tts(
                 f"start siliconflow tts, model: {model}, voice: {voice}, try: {i + 1}"
             )
 
-            response = requests.post(url, json=payload, headers=headers)
+            start_time = time.time()
+            with session.post(
+                url, json=payload, headers=headers, stream=True, timeout=timeout
+            ) as response:
+                if response.status_code != 200:
+                    logger.error(
+                        f"siliconflow tts failed with status code {response.status_code}: {response.text}"
+                    )
+                    continue
 
-            if response.status_code == 200:
-                # 保存音频文件
+                # 边接收边写入文件，同时从MP3帧头累计音频时长（无需解码）
+                counter = mp3.FrameCounter()
+                first_byte_time = None
                 with open(voice_file, "wb") as f:
-                    f.write(response.content)
-
-                # 创建一个空的SubMaker对象
-                sub_maker = ensure_submaker_compatibility(SubMaker())
-
-                # 获取音频文件的实际长度
-                try:
-                    # 尝试使用moviepy获取音频长度
-                    from moviepy import AudioFileClip
+                    for chunk in response.iter_content(chunk_size=32 * 1024):
+                        if not chunk:
+                            continue
+                        if first_byte_time is None:
+                            first_byte_time = time.time() - start_time
+                        f.write(chunk)
+                        counter.feed(chunk)
 
-                    audio_clip = AudioFileClip(voice_file)
-                    audio_duration = audio_clip.duration
-                    audio_clip.close()
+            if not counter.frames:
+                logger.error("siliconflow tts returned no audio frames")
+                continue
+            logger.info(
+                f"siliconflow tts received {counter.duration:.2f}s of audio, "
+                f"first byte after {first_byte_time:.2f}s, total {time.time() - start_time:.2f}s"
+            )
 
-                    # 将音频长度转换为100纳秒单位（与edge_tts兼容）
-                    audio_duration_100ns = int(audio_duration * 10000000)
+            # 将音频长度转换为100纳秒单位（与edge_tts兼容）
+            sub_maker = _siliconflow_sub_maker(text, int(counter.duration * 10000000))
+            logger.success(f"siliconflow tts succeeded: {voice_file}")
+            return sub_maker
+        except Exception as e:
+            logger.error(f"siliconflow tts failed: {str(e)}")
 
-                    # 使用文本分割来创建更准确的字幕
-                    # 将文本按标点符号分割成句子
-                    sentences = utils.split_string_by_punctuations(text)
+    return None
 
-                    if sentences:
-                        # 计算每个句子的大致时长（按字符数比例分配）
-                        total_chars = sum(len(s) for s in sentences)
-                        char_duration = (
-                            audio_duration_100ns / total_chars if total_chars > 0 else 0
-                        )
 
-                        current_offset = 0
-                        for sentence in sentences:
-                            if not sentence.strip():
-                                continue
+_siliconflow_session = None
+_siliconflow_session_lock = threading.Lock()
 
-                            # 计算当前句子的时长
-                            sentence_chars = len(sentence)
-                            sentence_duration = int(sentence_chars * char_duration)
 
-                            # 添加到SubMaker
-                            sub_maker.subs.append(sentence)
-                            sub_maker.offset.append(
-                                (current_offset, current_offset + sentence_duration)
-                            )
+def _get_siliconflow_session() -> requests.Session:
+    """Shared session, so consecutive requests reuse pooled keep-alive connections."""
+    global _siliconflow_session
+    with _siliconflow_session_lock:
+        if _siliconflow_session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            session.mount("https://", adapter)
+            _siliconflow_session = session
+        return _siliconflow_session
 
-                            # 更新偏移量
-                            current_offset += sentence_duration
-                    else:
-                        # 如果无法分割，则使用整个文本作为一个字幕
-                        sub_maker.subs = [text]
-                        sub_maker.offset = [(0, audio_duration_100ns)]
 
-                except Exception as e:
-                    logger.warning(f"Failed to create accurate subtitles: {str(e)}")
-                    # 回退到简单的字幕
-                    sub_maker.subs = [text]
-                    # 使用音频文件的实际长度，如果无法获取，则假设为10秒
-                    sub_maker.offset = [
-                        (
-                            0,
-                            audio_duration_100ns
-                            if "audio_duration_100ns" in locals()
-                            else 10000000,
-                        )
-                    ]
+def _siliconflow_sub_maker(text: str, audio_duration_100ns: int) -> SubMaker:
+    """Sentence subtitles spread over the audio by character count (the API returns no timings)."""
+    sub_maker = ensure_submaker_compatibility(SubMaker())
 
-                logger.success(f"siliconflow tts succeeded: {voice_file}")
-                return sub_maker
-            else:
-                logger.error(
-                    f"siliconflow tts failed with status code {response.status_code}: {response.text}"
-                )
-        except Exception as e:
-            logger.error(f"siliconflow tts failed: {str(e)}")
+    # 使用文本分割来创建更准确的字幕
+    # 将文本按标点符号分割成句子
+    sentences = [s for s in utils.split_string_by_punctuations(text) if s.strip()]
+    if not sentences:
+        # 如果无法分割，则使用整个文本作为一个字幕
+        sub_maker.subs = [text]
+        sub_maker.offset = [(0, audio_duration_100ns)]
+        return sub_maker
 
-    return None
+    # 计算每个句子的大致时长（按字符数比例分配）
+    total_chars = sum(len(s) for s in sentences)
+    char_duration = audio_duration_100ns / total_chars
+
+    current_offset = 0
+    for sentence in sentences:
+        # 计算当前句子的时长
+        sentence_duration = int(len(sentence) * char_duration)
+        sub_maker.subs.append(sentence)
+        sub_maker.offset.append((current_offset, current_offset + sentence_duration))
+        current_offset += sentence_duration
+    return sub_maker
 
 
 def preprocess_text_for_chatterbox(text: str) -> str:
@@ -1707,279 +1803,309 @@ def gtts_tts(
     return None
 
 
-def chatterbox_tts(
-    text: str,
-    voice_name: str,
-    voice_rate: float,
-    voice_file: str,
-    voice_volume: float = 1.0,
-) -> Union[SubMaker, None]:
-    """
-    使用Chatterbox TTS + WhisperX生成语音和精确的单词时间戳
+def _chatterbox_device() -> str:
+    # 获取设备 - Use CPU by default to avoid cuDNN version conflicts
+    # Set CHATTERBOX_DEVICE=cuda environment variable to force GPU usage
+    force_device = os.environ.get("CHATTERBOX_DEVICE", "cpu").lower()
+    if force_device == "cuda" and torch.cuda.is_available():
+        logger.info("Using GPU device: cuda (forced via CHATTERBOX_DEVICE)")
+        return "cuda"
+    logger.info(f"Using CPU device (safe mode - set CHATTERBOX_DEVICE=cuda to use GPU)")
+    return "cpu"
 
-    Args:
-        text: 要转换为语音的文本
-        voice_name: 声音名称，格式: "chatterbox:type:name-Gender"
-        voice_rate: 语音速度（暂不支持调整）
-        voice_file: 输出的音频文件路径
-        voice_volume: 语音音量（暂不支持调整）
 
-    Returns:
-        SubMaker对象或None
-    """
-    if not CHATTERBOX_AVAILABLE:
-        logger.error("Chatterbox TTS is not available. Please install chatterbox-tts and whisperx.")
-        return None
+def _load_chatterbox_model(device: str) -> str:
+    """Load the Chatterbox TTS model once, returns the device it ended up on."""
+    global chatterbox_model
 
-    text = text.strip()
-    if not text:
-        logger.error("Text is empty")
-        return None
+    if chatterbox_model is None:
+        logger.info("Loading Chatterbox TTS model...")
+        try:
+            chatterbox_model = ChatterboxTTS.from_pretrained(device=device)
+            logger.info("Chatterbox TTS model loaded successfully")
+        except Exception as e:
+            logger.error(f"Failed to load Chatterbox TTS model: {e}")
+            if device == "cuda":
+                logger.info("Falling back to CPU mode...")
+                device = "cpu"
+                chatterbox_model = ChatterboxTTS.from_pretrained(device=device)
+                logger.info("Chatterbox TTS model loaded successfully on CPU")
+            else:
+                raise
+    return device
 
-    # Preprocess text to improve TTS quality
-    original_text = text
-    text = preprocess_text_for_chatterbox(text)
-    
-    # Check if text needs chunking (configurable threshold via CHATTERBOX_CHUNK_THRESHOLD)
-    # Higher threshold reduces chunking frequency which can affect speech pacing
-    chunk_threshold = int(os.environ.get("CHATTERBOX_CHUNK_THRESHOLD", "600"))
-    if len(text) > chunk_threshold:
-        logger.warning(f"Text is too long ({len(text)} chars) for single-pass Chatterbox TTS")
-        logger.info("Automatically chunking text for better quality...")
-        return chatterbox_tts_chunked(text, voice_name, voice_rate, voice_file, voice_volume)
-    
-    logger.info(f"Chatterbox TTS input: '{text[:100]}...' (original: {len(original_text)} → processed: {len(text)} chars)")
 
-    # 解析voice_name: chatterbox:type:name-Gender
-    parts = voice_name.split(":")
-    if len(parts) < 3:
-        logger.error(f"Invalid Chatterbox voice name format: {voice_name}")
-        return None
+def _load_whisperx_model(device: str) -> str:
+    """Load the WhisperX transcription model once, returns the device it ended up on."""
+    global whisperx_model
 
+    if whisperx_model is None:
+        logger.info("Loading WhisperX model...")
+        # Use appropriate compute type for CPU
+        compute_type = "int8" if device == "cpu" else "float16"
+        try:
+            whisperx_model = whisperx.load_model("base", device, compute_type=compute_type)
+            logger.info(f"WhisperX model loaded successfully on {device} with {compute_type}")
+        except Exception as e:
+            logger.error(f"Failed to load WhisperX model on {device}: {e}")
+            if device == "cuda":
+                logger.info("Falling back to CPU for WhisperX...")
+                device = "cpu"
+                compute_type = "int8"
+                whisperx_model = whisperx.load_model("base", device, compute_type=compute_type)
+                logger.info(f"WhisperX model loaded successfully on CPU with {compute_type}")
+            else:
+                raise
+    return device
+
+
+def _chatterbox_prompt_path(voice_name: str) -> Union[str, None]:
+    """Reference audio for clone voices, None for the default voice."""
+    parts = voice_name.split(":")
     voice_type = parts[1]  # "default" or "clone"
     voice_info = parts[2]  # "name-Gender"
     voice_base_name = voice_info.split("-")[0]
+    logger.info(f"Generating speech with Chatterbox TTS, type: {voice_type}")
 
-    # 获取设备 - Use CPU by default to avoid cuDNN version conflicts
-    # Set CHATTERBOX_DEVICE=cuda environment variable to force GPU usage
-    force_device = os.environ.get("CHATTERBOX_DEVICE", "cpu").lower()
-    if force_device == "cuda" and torch.cuda.is_available():
-        device = "cuda"
-        logger.info(f"Using GPU device: {device} (forced via CHATTERBOX_DEVICE)")
+    if voice_type != "clone" or voice_base_name == "Voice Clone":
+        return None
+    # 查找参考音频文件
+    reference_audio_dir = os.path.join(utils.root_dir(), "reference_audio")
+    for ext in ['.wav', '.mp3', '.flac', '.m4a']:
+        potential_path = os.path.join(reference_audio_dir, voice_base_name + ext)
+        if os.path.exists(potential_path):
+            logger.info(f"Using voice cloning with reference: {potential_path}")
+            return potential_path
+    logger.warning(f"Reference audio not found for {voice_base_name}, using default voice")
+    return None
+
+
+def _chatterbox_generate(text: str, audio_prompt_path: Union[str, None]):
+    # 生成语音 (with improved pacing control)
+    # Lower cfg_weight for slower, more natural pacing
+    # Environment variable CHATTERBOX_CFG_WEIGHT can override (default 0.2 for very slow speech)
+    cfg_weight = float(os.environ.get("CHATTERBOX_CFG_WEIGHT", "0.2"))
+    logger.info(f"Using cfg_weight={cfg_weight} for speech pacing control")
+
+    if audio_prompt_path:
+        return chatterbox_model.generate(text, audio_prompt_path=audio_prompt_path, cfg_weight=cfg_weight)
+    return chatterbox_model.generate(text, cfg_weight=cfg_weight)
+
+
+def _chatterbox_word_timestamps(text: str, wav_file: str, audio_duration: float, device: str):
+    """
+    Transcribe and align the synthesized audio with WhisperX (used when forced alignment is off or fails).
+
+    Returns (SubMaker, transcription_failed); the SubMaker holds word-level
+    timestamps, or sentence-level ones spread over audio_duration when the
+    transcription is unusable.
+    """
+    # 3. 使用WhisperX获取精确的单词时间戳
+    logger.info("Generating word timestamps with WhisperX")
+    device = _load_whisperx_model(device)
+
+    # 转录音频获取单词时间戳
+    audio = whisperx.load_audio(wav_file)
+    result = whisperx_model.transcribe(audio, batch_size=16)
+
+    # Validate transcription result
+    transcription_failed = False
+    if not result or "segments" not in result or not result["segments"]:
+        logger.warning("WhisperX transcription failed or returned empty result")
+        logger.debug(f"WhisperX result: {result}")
+        transcription_failed = True
     else:
-        device = "cpu"
-        logger.info(f"Using CPU device (safe mode - set CHATTERBOX_DEVICE=cuda to use GPU)")
+        # Log transcribed text for validation
+        transcribed_text = " ".join([segment.get("text", "") for segment in result["segments"]]).strip()
+        logger.info(f"WhisperX transcribed: '{transcribed_text[:100]}...' (length: {len(transcribed_text)} chars)")
+
+        # Check if transcription matches input text reasonably well
+        text_similarity = len(set(text.lower().split()) & set(transcribed_text.lower().split())) / max(len(text.split()), 1)
+        logger.debug(f"Text similarity score: {text_similarity:.2f}")
+
+        if text_similarity < 0.3:
+            logger.warning(f"Transcription seems inaccurate (similarity: {text_similarity:.2f})")
+            if text_similarity < 0.1:
+                logger.error(f"Transcription quality too poor (similarity: {text_similarity:.2f}), falling back to sentence-level timing")
+                transcription_failed = True
 
-    global chatterbox_model, whisperx_model
+    # 加载对齐模型 (only if transcription is good)
+    if not transcription_failed:
+        try:
+            model_a, metadata = alignment.get_align_model(result["language"], device)
+            result = whisperx.align(result["segments"], model_a, metadata, audio, device, return_char_alignments=False)
+        except Exception as e:
+            logger.error(f"WhisperX alignment failed: {e}")
+            transcription_failed = True
 
-    try:
-        # 1. 加载Chatterbox TTS模型
-        if chatterbox_model is None:
-            logger.info("Loading Chatterbox TTS model...")
-            try:
-                chatterbox_model = ChatterboxTTS.from_pretrained(device=device)
-                logger.info("Chatterbox TTS model loaded successfully")
-            except Exception as e:
-                logger.error(f"Failed to load Chatterbox TTS model: {e}")
-                if device == "cuda":
-                    logger.info("Falling back to CPU mode...")
-                    device = "cpu"
-                    chatterbox_model = ChatterboxTTS.from_pretrained(device=device)
-                    logger.info("Chatterbox TTS model loaded successfully on CPU")
-                else:
-                    raise
+    # 4. 创建SubMaker并填充时间戳
+    sub_maker = ensure_submaker_compatibility(SubMaker())
+
+    # Process word-level timestamps from WhisperX alignment (only if transcription is good)
+    word_count = 0
+    if not transcription_failed and "segments" in result and result["segments"]:
+        # Debug: Log the WhisperX result structure
+        logger.debug(f"WhisperX result keys: {list(result.keys())}")
+        logger.debug(f"Number of segments: {len(result['segments'])}")
+        if result["segments"]:
+            logger.debug(f"First segment keys: {list(result['segments'][0].keys())}")
+
+        for segment in result["segments"]:
+            # Check if this segment has word-level alignments
+            if "words" in segment and segment["words"]:
+                for word_info in segment["words"]:
+                    word = word_info.get("word", "").strip()
+                    start = word_info.get("start", None)
+                    end = word_info.get("end", None)
+
+                    # Skip words without proper timing or empty words
+                    if word and start is not None and end is not None and start < end:
+                        # 转换为100纳秒单位（与edge_tts兼容）
+                        start_100ns = int(start * 10000000)
+                        end_100ns = int(end * 10000000)
+
+                        sub_maker.subs.append(word)
+                        sub_maker.offset.append((start_100ns, end_100ns))
+                        word_count += 1
+                    else:
+                        logger.debug(f"Skipping invalid word: '{word}', start: {start}, end: {end}")
 
-        # 2. 生成语音
-        logger.info(f"Generating speech with Chatterbox TTS, type: {voice_type}")
-        
-        audio_prompt_path = None
-        if voice_type == "clone" and voice_base_name != "Voice Clone":
-            # 查找参考音频文件
-            reference_audio_dir = os.path.join(utils.root_dir(), "reference_audio")
-            for ext in ['.wav', '.mp3', '.flac', '.m4a']:
-                potential_path = os.path.join(reference_audio_dir, voice_base_name + ext)
-                if os.path.exists(potential_path):
-                    audio_prompt_path = potential_path
-                    break
-            
-            if audio_prompt_path:
-                logger.info(f"Using voice cloning with reference: {audio_prompt_path}")
-            else:
-                logger.warning(f"Reference audio not found for {voice_base_name}, using default voice")
+        logger.info(f"Processed {word_count} word-level timestamps from WhisperX")
+    else:
+        logger.warning("Skipping word-level processing due to transcription issues")
 
-        # 生成语音 (with improved pacing control)
-        # Lower cfg_weight for slower, more natural pacing
-        # Environment variable CHATTERBOX_CFG_WEIGHT can override (default 0.2 for very slow speech)
-        cfg_weight = float(os.environ.get("CHATTERBOX_CFG_WEIGHT", "0.2"))
-        logger.info(f"Using cfg_weight={cfg_weight} for speech pacing control")
-        
-        if audio_prompt_path:
-            wav = chatterbox_model.generate(text, audio_prompt_path=audio_prompt_path, cfg_weight=cfg_weight)
+    # 如果没有获取到单词级时间戳，回退到句子级 (enhanced fallback)
+    if not sub_maker.subs or transcription_failed:
+        if transcription_failed:
+            logger.info("Using sentence-level timing due to poor transcription quality")
         else:
-            wav = chatterbox_model.generate(text, cfg_weight=cfg_weight)
+            logger.warning("No word-level timestamps found, falling back to sentence-level")
 
-        # 保存为临时WAV文件
-        temp_wav_file = voice_file.replace('.mp3', '_temp.wav')
-        torchaudio.save(temp_wav_file, wav, 24000)
+        sentences = utils.split_string_by_punctuations(text)
 
-        # 3. 使用WhisperX获取精确的单词时间戳
-        logger.info("Generating word timestamps with WhisperX")
-        
-        if whisperx_model is None:
-            logger.info("Loading WhisperX model...")
-            # Use appropriate compute type for CPU
-            compute_type = "int8" if device == "cpu" else "float16"
-            try:
-                whisperx_model = whisperx.load_model("base", device, compute_type=compute_type)
-                logger.info(f"WhisperX model loaded successfully on {device} with {compute_type}")
-            except Exception as e:
-                logger.error(f"Failed to load WhisperX model on {device}: {e}")
-                if device == "cuda":
-                    logger.info("Falling back to CPU for WhisperX...")
-                    device = "cpu"
-                    compute_type = "int8"
-                    whisperx_model = whisperx.load_model("base", device, compute_type=compute_type)
-                    logger.info(f"WhisperX model loaded successfully on CPU with {compute_type}")
-                else:
-                    raise
+        if sentences:
+            total_chars = sum(len(s) for s in sentences)
+            char_duration = (audio_duration * 10000000) / total_chars if total_chars > 0 else 0
 
-        # 转录音频获取单词时间戳
-        audio = whisperx.load_audio(temp_wav_file)
-        result = whisperx_model.transcribe(audio, batch_size=16)
+            current_offset = 0
+            for sentence in sentences:
+                if not sentence.strip():
+                    continue
 
-        # Validate transcription result
-        transcription_failed = False
-        if not result or "segments" not in result or not result["segments"]:
-            logger.warning("WhisperX transcription failed or returned empty result")
-            logger.debug(f"WhisperX result: {result}")
-            transcription_failed = True
-        else:
-            # Log transcribed text for validation
-            transcribed_text = " ".join([segment.get("text", "") for segment in result["segments"]]).strip()
-            logger.info(f"WhisperX transcribed: '{transcribed_text[:100]}...' (length: {len(transcribed_text)} chars)")
-            
-            # Check if transcription matches input text reasonably well
-            text_similarity = len(set(text.lower().split()) & set(transcribed_text.lower().split())) / max(len(text.split()), 1)
-            logger.debug(f"Text similarity score: {text_similarity:.2f}")
-            
-            if text_similarity < 0.3:
-                logger.warning(f"Transcription seems inaccurate (similarity: {text_similarity:.2f})")
-                if text_similarity < 0.1:
-                    logger.error(f"Transcription quality too poor (similarity: {text_similarity:.2f}), falling back to sentence-level timing")
-                    transcription_failed = True
-
-        # 加载对齐模型 (only if transcription is good)
-        if not transcription_failed:
-            try:
-                model_a, metadata = whisperx.load_align_model(language_code=result["language"], device=device)
-                result = whisperx.align(result["segments"], model_a, metadata, audio, device, return_char_alignments=False)
-            except Exception as e:
-                logger.error(f"WhisperX alignment failed: {e}")
-                transcription_failed = True
+                sentence_chars = len(sentence)
+                sentence_duration = int(sentence_chars * char_duration)
 
-        # 4. 创建SubMaker并填充时间戳
-        sub_maker = ensure_submaker_compatibility(SubMaker())
-        
-        # Process word-level timestamps from WhisperX alignment (only if transcription is good)
-        word_count = 0
-        if not transcription_failed and "segments" in result and result["segments"]:
-            # Debug: Log the WhisperX result structure
-            logger.debug(f"WhisperX result keys: {list(result.keys())}")
-            logger.debug(f"Number of segments: {len(result['segments'])}")
-            if result["segments"]:
-                logger.debug(f"First segment keys: {list(result['segments'][0].keys())}")
-            
-            for segment in result["segments"]:
-                # Check if this segment has word-level alignments
-                if "words" in segment and segment["words"]:
-                    for word_info in segment["words"]:
-                        word = word_info.get("word", "").strip()
-                        start = word_info.get("start", None)
-                        end = word_info.get("end", None)
-                        
-                        # Skip words without proper timing or empty words
-                        if word and start is not None and end is not None and start < end:
-                            # 转换为100纳秒单位（与edge_tts兼容）
-                            start_100ns = int(start * 10000000)
-                            end_100ns = int(end * 10000000)
-                            
-                            sub_maker.subs.append(word)
-                            sub_maker.offset.append((start_100ns, end_100ns))
-                            word_count += 1
-                        else:
-                            logger.debug(f"Skipping invalid word: '{word}', start: {start}, end: {end}")
-            
-            logger.info(f"Processed {word_count} word-level timestamps from WhisperX")
-        else:
-            logger.warning("Skipping word-level processing due to transcription issues")
-        
-        # 如果没有获取到单词级时间戳，回退到句子级 (enhanced fallback)
-        if not sub_maker.subs or transcription_failed:
-            if transcription_failed:
-                logger.info("Using sentence-level timing due to poor transcription quality")
-            else:
-                logger.warning("No word-level timestamps found, falling back to sentence-level")
-                
-            sentences = utils.split_string_by_punctuations(text)
-            audio_duration = len(wav[0]) / 24000  # 采样率24000Hz
-            
-            if sentences:
-                total_chars = sum(len(s) for s in sentences)
-                char_duration = (audio_duration * 10000000) / total_chars if total_chars > 0 else 0
-                
-                current_offset = 0
-                for sentence in sentences:
-                    if not sentence.strip():
-                        continue
-                    
-                    sentence_chars = len(sentence)
-                    sentence_duration = int(sentence_chars * char_duration)
-                    
-                    sub_maker.subs.append(sentence.strip())
-                    sub_maker.offset.append((current_offset, current_offset + sentence_duration))
-                    current_offset += sentence_duration
-                    
-                logger.info(f"Generated {len(sub_maker.subs)} sentence-level timestamps")
-            else:
-                # 最后的回退方案
-                audio_duration_100ns = int(audio_duration * 10000000)
-                sub_maker.subs = [text]
-                sub_maker.offset = [(0, audio_duration_100ns)]
-                logger.info("Using single timestamp for entire text")
+                sub_maker.subs.append(sentence.strip())
+                sub_maker.offset.append((current_offset, current_offset + sentence_duration))
+                current_offset += sentence_duration
 
-        # 5. 转换音频格式为MP3（如果需要）
-        final_audio_file = voice_file
-        if voice_file.endswith('.mp3'):
-            try:
-                from moviepy import AudioFileClip
-                logger.info("Converting WAV to MP3...")
-                audio_clip = AudioFileClip(temp_wav_file)
-                audio_clip.write_audiofile(voice_file, logger=None)  # Removed verbose parameter
-                audio_clip.close()
-                os.remove(temp_wav_file)  # 删除临时WAV文件
-                logger.info("Audio conversion to MP3 completed")
-                final_audio_file = voice_file
-            except Exception as e:
-                logger.warning(f"Failed to convert to MP3, keeping WAV format: {e}")
-                # Keep the WAV file with original extension
-                final_audio_file = voice_file.replace('.mp3', '.wav')
-                os.rename(temp_wav_file, final_audio_file)
-                logger.info(f"Saved as WAV: {final_audio_file}")
+            logger.info(f"Generated {len(sub_maker.subs)} sentence-level timestamps")
         else:
-            final_audio_file = voice_file
-            os.rename(temp_wav_file, voice_file)
+            # 最后的回退方案
+            audio_duration_100ns = int(audio_duration * 10000000)
+            sub_maker.subs = [text]
+            sub_maker.offset = [(0, audio_duration_100ns)]
+            logger.info("Using single timestamp for entire text")
+
+    return sub_maker, transcription_failed
+
+
+def forced_alignment_enabled() -> bool:
+    return alignment.ALIGNMENT_AVAILABLE and config.app.get("forced_alignment", True)
+
+
+def words_to_sub_maker(words) -> SubMaker:
+    """SubMaker with one entry per (word, start, end) timing in seconds."""
+    sub_maker = ensure_submaker_compatibility(SubMaker())
+    for word, start, end in words:
+        sub_maker.subs.append(word)
+        # 转换为100纳秒单位（与edge_tts兼容）
+        sub_maker.offset.append((int(start * 10000000), int(end * 10000000)))
+    return sub_maker
+
+
+def _chatterbox_forced_alignment(text: str, wav_file: str, device: str) -> Union[SubMaker, None]:
+    """Word timestamps by aligning the known text to the audio (no transcription), None on failure."""
+    try:
+        start_time = time.time()
+        # Chatterbox only speaks English
+        words = alignment.align_file(wav_file, text, "en", device)
+        logger.info(f"Forced alignment: {len(words)} word timestamps in {time.time() - start_time:.1f}s")
+        return words_to_sub_maker(words)
+    except Exception as e:
+        logger.warning(f"Forced alignment failed, falling back to WhisperX transcription: {e}")
+        return None
+
+
+def _finish_chatterbox_audio(temp_wav_file: str, voice_file: str) -> str:
+    # 5. 转换音频格式为MP3（如果需要）
+    if not voice_file.endswith('.mp3'):
+        os.rename(temp_wav_file, voice_file)
+        return voice_file
+    try:
+        from moviepy import AudioFileClip
+        logger.info("Converting WAV to MP3...")
+        audio_clip = AudioFileClip(temp_wav_file)
+        audio_clip.write_audiofile(voice_file, logger=None)  # Removed verbose parameter
+        audio_clip.close()
+        os.remove(temp_wav_file)  # 删除临时WAV文件
+        logger.info("Audio conversion to MP3 completed")
+        return voice_file
+    except Exception as e:
+        logger.warning(f"Failed to convert to MP3, keeping WAV format: {e}")
+        # Keep the WAV file with original extension
+        final_audio_file = voice_file.replace('.mp3', '.wav')
+        os.rename(temp_wav_file, final_audio_file)
+        logger.info(f"Saved as WAV: {final_audio_file}")
+        return final_audio_file
+
+
+def _chatterbox_render(text: str, chunks: list, voice_name: str, voice_file: str) -> Union[SubMaker, None]:
+    """
+    Synthesize chunks back to back, then time the whole recording with one
+    WhisperX transcription/alignment pass over text.
+    """
+    # 解析voice_name: chatterbox:type:name-Gender
+    if len(voice_name.split(":")) < 3:
+        logger.error(f"Invalid Chatterbox voice name format: {voice_name}")
+        return None
+
+    temp_wav_file = voice_file.replace('.mp3', '_temp.wav')
+    try:
+        # 1. 加载Chatterbox TTS模型
+        device = _load_chatterbox_model(_chatterbox_device())
+
+        # 2. 生成语音
+        audio_prompt_path = _chatterbox_prompt_path(voice_name)
+        wavs = []
+        for i, chunk in enumerate(chunks):
+            if len(chunks) > 1:
+                logger.info(f"Processing chunk {i+1}/{len(chunks)} ({len(chunk)} chars)")
+            wavs.append(_chatterbox_generate(chunk, audio_prompt_path))
+        wav = wavs[0] if len(wavs) == 1 else torch.cat(wavs, dim=-1)
+
+        # 保存为临时WAV文件
+        torchaudio.save(temp_wav_file, wav, 24000)
+        audio_duration = wav.shape[-1] / 24000  # 采样率24000Hz
+
+        # 3. 单词时间戳: the text is known, align it directly unless disabled
+        sub_maker, transcription_failed = None, False
+        if forced_alignment_enabled():
+            sub_maker = _chatterbox_forced_alignment(text, temp_wav_file, device)
+        if sub_maker is None:
+            sub_maker, transcription_failed = _chatterbox_word_timestamps(text, temp_wav_file, audio_duration, device)
+        final_audio_file = _finish_chatterbox_audio(temp_wav_file, voice_file)
 
         # Log subtitle information for debugging
         if sub_maker.subs:
             logger.info(f"Generated {len(sub_maker.subs)} subtitle entries")
             logger.debug(f"First few subtitle entries: {sub_maker.subs[:5]}")
             logger.debug(f"First few timing offsets: {sub_maker.offset[:5]}")
-            
+
             # Validate subtitle timing
-            total_audio_duration = len(wav[0]) / 24000
             last_subtitle_time = sub_maker.offset[-1][1] / 10000000 if sub_maker.offset else 0
-            logger.info(f"Audio duration: {total_audio_duration:.2f}s, Last subtitle time: {last_subtitle_time:.2f}s")
-            
+            logger.info(f"Audio duration: {audio_duration:.2f}s, Last subtitle time: {last_subtitle_time:.2f}s")
+
             # Final quality check
             if transcription_failed:
                 logger.warning("⚠️  Chatterbox TTS transcription had quality issues. Consider:")
@@ -1991,22 +2117,66 @@ def chatterbox_tts(
 
         logger.success(f"Chatterbox TTS completed with {len(sub_maker.subs)} word/sentence timestamps")
         logger.info(f"Output file: {final_audio_file}")
-        
+
         # Store the actual file path for downstream processing
         sub_maker._actual_audio_file = final_audio_file
         sub_maker._transcription_quality_warning = transcription_failed
-        
+
         return sub_maker
 
     except Exception as e:
         logger.error(f"Chatterbox TTS failed: {str(e)}")
         # 清理临时文件
-        temp_wav_file = voice_file.replace('.mp3', '_temp.wav')
         if os.path.exists(temp_wav_file):
             os.remove(temp_wav_file)
         return None
 
 
+def chatterbox_tts(
+    text: str,
+    voice_name: str,
+    voice_rate: float,
+    voice_file: str,
+    voice_volume: float = 1.0,
+) -> Union[SubMaker, None]:
+    """
+    使用Chatterbox TTS + WhisperX生成语音和精确的单词时间戳
+
+    Args:
+        text: 要转换为语音的文本
+        voice_name: 声音名称，格式: "chatterbox:type:name-Gender"
+        voice_rate: 语音速度（暂不支持调整）
+        voice_file: 输出的音频文件路径
+        voice_volume: 语音音量（暂不支持调整）
+
+    Returns:
+        SubMaker对象或None
+    """
+    if not CHATTERBOX_AVAILABLE:
+        logger.error("Chatterbox TTS is not available. Please install chatterbox-tts and whisperx.")
+        return None
+
+    text = text.strip()
+    if not text:
+        logger.error("Text is empty")
+        return None
+
+    # Preprocess text to improve TTS quality
+    original_text = text
+    text = preprocess_text_for_chatterbox(text)
+
+    # Check if text needs chunking (configurable threshold via CHATTERBOX_CHUNK_THRESHOLD)
+    # Higher threshold reduces chunking frequency which can affect speech pacing
+    chunk_threshold = int(os.environ.get("CHATTERBOX_CHUNK_THRESHOLD", "600"))
+    if len(text) > chunk_threshold:
+        logger.warning(f"Text is too long ({len(text)} chars) for single-pass Chatterbox TTS")
+        logger.info("Automatically chunking text for better quality...")
+        return chatterbox_tts_chunked(text, voice_name, voice_rate, voice_file, voice_volume)
+
+    logger.info(f"Chatterbox TTS input: '{text[:100]}...' (original: {len(original_text)} → processed: {len(text)} chars)")
+    return _chatterbox_render(text, [text], voice_name, voice_file)
+
+
 def chatterbox_tts_chunked(
     text: str,
     voice_name: str,
@@ -2016,104 +2186,25 @@ def chatterbox_tts_chunked(
 ) -> Union[SubMaker, None]:
     """
     Handle long texts by chunking them into smaller pieces for Chatterbox TTS
-    
-    This prevents garbled audio that occurs when text is too long
+
+    This prevents garbled audio that occurs when text is too long. The chunks
+    are synthesized back to back into one recording, which is then transcribed
+    and aligned once, so timestamps need no per-chunk offset bookkeeping.
     """
     logger.info("🔄 Starting chunked Chatterbox TTS processing")
-    
+
     # Split text into optimal chunks
     chunks = chunk_text_for_chatterbox(text, max_chunk_size=300)
     logger.info(f"Split text into {len(chunks)} chunks (max 300 chars each)")
-    
+
     if len(chunks) == 1:
         # If only one chunk, use regular processing
         return chatterbox_tts(chunks[0], voice_name, voice_rate, voice_file, voice_volume)
-    
-    # Generate audio for each chunk
-    temp_audio_files = []
-    all_sub_makers = []
-    cumulative_duration = 0.0
-    
-    try:
-        for i, chunk in enumerate(chunks):
-            logger.info(f"Processing chunk {i+1}/{len(chunks)} ({len(chunk)} chars)")
-            
-            # Create temporary file for this chunk
-            chunk_file = voice_file.replace('.mp3', f'_chunk_{i}.mp3')
-            
-            # Generate TTS for this chunk
-            chunk_result = chatterbox_tts(chunk, voice_name, voice_rate, chunk_file, voice_volume)
-            
-            if chunk_result:
-                chunk_audio_file = getattr(chunk_result, '_actual_audio_file', chunk_file)
-                temp_audio_files.append(chunk_audio_file)
-                
-                # Adjust timing offsets to account for previous chunks
-                adjusted_subs = []
-                adjusted_offsets = []
-                
-                cumulative_offset_100ns = int(cumulative_duration * 10000000)
-                
-                for sub, (start, end) in zip(chunk_result.subs, chunk_result.offset):
-                    adjusted_subs.append(sub)
-                    adjusted_offsets.append((
-                        start + cumulative_offset_100ns,
-                        end + cumulative_offset_100ns
-                    ))
-                
-                # Create adjusted SubMaker for this chunk
-                adjusted_sub_maker = ensure_submaker_compatibility(SubMaker())
-                adjusted_sub_maker.subs = adjusted_subs
-                adjusted_sub_maker.offset = adjusted_offsets
-                all_sub_makers.append(adjusted_sub_maker)
-                
-                # Update cumulative duration
-                if chunk_result.offset:
-                    chunk_duration = chunk_result.offset[-1][1] / 10000000
-                    cumulative_duration += chunk_duration
-                    
-                logger.info(f"Chunk {i+1} completed: {len(chunk_result.subs)} entries, {chunk_duration:.2f}s")
-            else:
-                logger.error(f"Failed to generate chunk {i+1}")
-                return None
-        
-        # Combine all audio files
-        logger.info("🎵 Combining audio chunks...")
-        combined_audio = combine_audio_files(temp_audio_files, voice_file)
-        
-        if combined_audio:
-            # Combine all SubMakers
-            final_sub_maker = ensure_submaker_compatibility(SubMaker())
-            final_sub_maker.subs = []
-            final_sub_maker.offset = []
-            
-            for sub_maker in all_sub_makers:
-                final_sub_maker.subs.extend(sub_maker.subs)
-                final_sub_maker.offset.extend(sub_maker.offset)
-            
-            # Set metadata
-            final_sub_maker._actual_audio_file = combined_audio
-            final_sub_maker._transcription_quality_warning = any(
-                getattr(sm, '_transcription_quality_warning', False) for sm in all_sub_makers
-            )
-            
-            logger.success(f"✅ Chunked TTS completed: {len(final_sub_maker.subs)} total entries, {cumulative_duration:.2f}s")
-            logger.info(f"Combined audio file: {combined_audio}")
-            
-            return final_sub_maker
-        else:
-            logger.error("Failed to combine audio chunks")
-            return None
-            
-    finally:
-        # Clean up temporary chunk files
-        for temp_file in temp_audio_files:
-            if os.path.exists(temp_file):
-                try:
-                    os.remove(temp_file)
-                    logger.debug(f"Cleaned up temporary file: {temp_file}")
-                except Exception as e:
-                    logger.warning(f"Could not remove temporary file {temp_file}: {e}")
+
+    sub_maker = _chatterbox_render(text, chunks, voice_name, voice_file)
+    if sub_maker:
+        logger.success(f"✅ Chunked TTS completed: {len(sub_maker.subs)} total entries")
+    return sub_maker
 
 
 def combine_audio_files(audio_files: list, output_file: str) -> str:
@@ -2468,6 +2559,20 @@ def create_subtitle(sub_maker: SubMaker, text: str, subtitle_file: str):
         logger.error(f"failed, error: {str(e)}")
 
 
+def estimate_audio_duration(text: str, voice_rate: float = 1.0) -> float:
+    """
+    Estimate the spoken duration of a script before TTS has run.
+
+    Uses ~2.6 words/s for space separated languages and ~4.5 characters/s for
+    CJK text at rate 1.0. Only used to size speculative material downloads.
+    """
+    cjk_pattern = r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]"
+    cjk_chars = len(re.findall(cjk_pattern, text))
+    words = len(re.findall(r"\w+", re.sub(cjk_pattern, " ", text)))
+    seconds = words / 2.6 + cjk_chars / 4.5
+    return seconds / max(voice_rate or 1.0, 0.1)
+
+
 def get_audio_duration(sub_maker: SubMaker):
     """
     获取音频时长
@@ -1,8 +1,10 @@
 import json
 import locale
 import os
+from contextlib import contextmanager
 from pathlib import Path
 import threading
+import time
 from typing import Any
 from uuid import uuid4
 
@@ -133,6 +135,76 @@ def run_in_background(func, *args, **kwargs):
     return thread
 
 
+@contextmanager
+def file_lock(lock_path: str, timeout: float = 600, remove: bool = False):
+    """
+    Exclusive lock shared across processes, held for the duration of the with block.
+
+    With remove=True the lock file is deleted on release, so per-item locks do
+    not pile up; an acquirer that locked a file already unlinked by the previous
+    holder retries on the new one. (Lock files are kept on Windows, where an
+    open file cannot be deleted.)
+    """
+    os.makedirs(os.path.dirname(lock_path) or ".", exist_ok=True)
+    deadline = time.time() + timeout
+    remove = remove and os.name != "nt"
+    while True:
+        f = open(lock_path, "a+")
+        if os.name == "nt":
+            import msvcrt
+
+            def _try_lock():
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+
+            def _unlock():
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            def _try_lock():
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+            def _unlock():
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+        try:
+            while True:
+                try:
+                    _try_lock()
+                    break
+                except OSError:
+                    if time.time() > deadline:
+                        raise TimeoutError(f"timed out waiting for lock: {lock_path}")
+                    time.sleep(0.1)
+        except BaseException:
+            f.close()
+            raise
+        if remove:
+            try:
+                stale = os.fstat(f.fileno()).st_ino != os.stat(lock_path).st_ino
+            except FileNotFoundError:
+                stale = True
+            if stale:
+                _unlock()
+                f.close()
+                continue
+        break
+
+    try:
+        yield
+    finally:
+        if remove:
+            # unlink while still holding the lock, so no one can lock this inode afterwards
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+        _unlock()
+        f.close()
+
+
 def time_convert_seconds_to_hmsm(seconds) -> str:
     hours = int(seconds // 3600)
     seconds = seconds % 3600
@@ -0,0 +1,117 @@
+import unittest
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import torch
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import alignment
+
+# blank, word separator and a few letters, like a wav2vec2 character vocabulary
+DICTIONARY = {"[pad]": 0, "|": 1, "a": 2, "b": 3, "c": 4, "d": 5, "e": 6}
+
+
+def _log_probs(frame_labels, vocab=len(DICTIONARY)):
+    """Frames that are confident about the given label each."""
+    probs = np.full((len(frame_labels), vocab), 0.01)
+    probs[np.arange(len(frame_labels)), frame_labels] = 0.9
+    return np.log(probs / probs.sum(axis=1, keepdims=True))
+
+
+class _FrameModel(torch.nn.Module):
+    """CTC "acoustic model": one frame per 320 samples, label read from the sample value."""
+
+    def forward(self, waveform):
+        labels = waveform[0, ::320].round().long()
+        logits = torch.full((1, len(labels), len(DICTIONARY)), -5.0)
+        logits[0, torch.arange(len(labels)), labels] = 5.0
+        return SimpleNamespace(logits=logits)
+
+
+class _FakeWhisperX:
+    def __init__(self):
+        self.loads = []
+
+    def load_align_model(self, language_code, device):
+        self.loads.append((language_code, device))
+        return _FrameModel(), {"language": language_code, "dictionary": DICTIONARY, "type": "huggingface"}
+
+
+class TestCtcForcedAlign(unittest.TestCase):
+    def test_spans_follow_the_emissions(self):
+        # _ a a _ b _ _ c c c
+        log_probs = _log_probs([0, 2, 2, 0, 3, 0, 0, 4, 4, 4])
+        self.assertEqual(alignment.ctc_forced_align(log_probs, [2, 3, 4]), [(1, 3), (4, 5), (7, 10)])
+
+    def test_repeated_tokens_need_a_blank(self):
+        log_probs = _log_probs([2, 2, 0, 2])
+        self.assertEqual(alignment.ctc_forced_align(log_probs, [2, 2]), [(0, 2), (3, 4)])
+        with self.assertRaises(ValueError):
+            alignment.ctc_forced_align(_log_probs([2, 2]), [2, 2])
+
+    def test_too_few_frames(self):
+        with self.assertRaises(ValueError):
+            alignment.ctc_forced_align(_log_probs([2, 3]), [2, 3, 4])
+
+
+class TestAlignWords(unittest.TestCase):
+    def setUp(self):
+        self.whisperx = _FakeWhisperX()
+        for patch in (
+            mock.patch.object(alignment, "whisperx", self.whisperx, create=True),
+            mock.patch.object(alignment, "torch", torch, create=True),
+            mock.patch.object(alignment, "_align_models", {}),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    @staticmethod
+    def _audio(frame_labels):
+        return np.repeat(np.asarray(frame_labels, dtype=np.float32), 320)
+
+    def test_word_timings(self):
+        # "ab" spoken in frames 2-5, "cd" in frames 8-11 (20ms frames)
+        audio = self._audio([0, 0, 2, 2, 3, 3, 1, 0, 4, 4, 5, 5, 0])
+        words = alignment.align_words(audio, "Ab, cd.", "en")
+        self.assertEqual([w for w, _, _ in words], ["Ab,", "cd."])
+        self.assertEqual(words[0][1:], (0.04, 0.12))
+        self.assertEqual(words[1][1:], (0.16, 0.24))
+
+    def test_unalignable_words_fill_the_gap(self):
+        audio = self._audio([2, 2, 0, 0, 0, 1, 0, 3, 3, 0])
+        words = alignment.align_words(audio, "a 42 b", "en")
+        self.assertEqual(words[1], ("42", words[0][2], words[2][1]))
+
+    def test_long_audio_is_windowed_and_model_cached(self):
+        frames = [0] * 4000 + [2] * 10 + [0] * 50 + [3] * 10 + [0] * 10
+        with mock.patch.object(alignment, "WINDOW_SECONDS", 30):
+            words = alignment.align_words(self._audio(frames), "a b", "en")
+            alignment.align_words(self._audio(frames), "a b", "en")
+        self.assertAlmostEqual(words[0][1], 80.0, places=2)
+        self.assertAlmostEqual(words[1][1], 81.2, places=2)
+        self.assertEqual(self.whisperx.loads, [("en", "cpu")])
+
+    def test_no_alignable_text(self):
+        with self.assertRaises(ValueError):
+            alignment.align_words(self._audio([0, 0]), "42 !", "en")
+
+
+class TestLanguage(unittest.TestCase):
+    def test_guess_language(self):
+        self.assertEqual(alignment.guess_language("hello", "de-DE-KatjaNeural"), "de")
+        self.assertEqual(alignment.guess_language("预计未来3天深圳冷空气活动频繁"), "zh")
+        self.assertEqual(alignment.guess_language("今日はいい天気です"), "ja")
+        self.assertEqual(alignment.guess_language("The weather is nice"), "en")
+
+    def test_split_words(self):
+        self.assertEqual(alignment.split_words("天气 好", "zh"), ["天", "气", "好"])
+        self.assertEqual(alignment.split_words(" good  weather ", "en"), ["good", "weather"])
+
+
+if __name__ == "__main__":
+    unittest.main()
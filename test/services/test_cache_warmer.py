@@ -0,0 +1,139 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.config import config
+from app.models.schema import MaterialInfo, VideoAspect
+from app.services import cache_warmer, material
+
+MB = 1024 * 1024
+
+
+class TestCacheWarmer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write_task(self, task_id, terms, aspect, age_days=0, source="pexels"):
+        task_dir = os.path.join(self.temp_dir.name, task_id)
+        os.makedirs(task_dir)
+        script_file = os.path.join(task_dir, "script.json")
+        with open(script_file, "w", encoding="utf-8") as f:
+            json.dump({"search_terms": terms, "params": {"video_aspect": aspect, "video_source": source}}, f)
+        mtime = time.time() - age_days * 86400
+        os.utime(script_file, (mtime, mtime))
+
+    def test_collect_term_frequency(self):
+        self._write_task("a", ["Ocean", "city night"], "9:16")
+        self._write_task("b", ["ocean"], "9:16", age_days=cache_warmer._half_life_days)
+        self._write_task("c", ["forest"], "16:9")
+        self._write_task("d", ["ignored"], "9:16", source="local")
+
+        frequency = cache_warmer.collect_term_frequency(self.temp_dir.name)
+        self.assertEqual(set(frequency), {"9:16", "16:9"})
+        self.assertAlmostEqual(frequency["9:16"]["ocean"], 1.5, places=2)
+        self.assertAlmostEqual(frequency["9:16"]["city night"], 1.0, places=2)
+        self.assertNotIn("ignored", frequency["9:16"])
+
+    def test_hour_windows(self):
+        windows = cache_warmer.parse_hour_windows("1-6, 22-2")
+        self.assertEqual(windows, [(1, 6), (22, 2)])
+        self.assertTrue(cache_warmer.in_hour_windows(windows, 3))
+        self.assertTrue(cache_warmer.in_hour_windows(windows, 23))
+        self.assertTrue(cache_warmer.in_hour_windows(windows, 0))
+        self.assertFalse(cache_warmer.in_hour_windows(windows, 6))
+        self.assertFalse(cache_warmer.in_hour_windows(windows, 12))
+
+
+class _FakeCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.total_size = 0
+
+    def has_url(self, url):
+        return False
+
+    def get_stats(self):
+        return {"total_size": self.total_size}
+
+
+class TestWarmTerm(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.warmer = cache_warmer.CacheWarmer()
+        self.warmer.max_mbps = 0
+        self.warmer.quota_fraction = 1.0
+
+    def _clips(self, term, count, duration=10, size=10 * MB):
+        items = []
+        for i in range(count):
+            item = MaterialInfo()
+            item.url = f"https://pexels.example/{term}-{i}.mp4"
+            item.duration = duration
+            item.size = size
+            item.search_term = term
+            items.append(item)
+        return items
+
+    def _patch(self, cache, pool, partial=False):
+        def fake_save(video_url, save_dir, window_duration, **kwargs):
+            size = 10 * MB if not partial else 1 * MB
+            cache.total_size += size
+            path = os.path.join(self.temp_dir.name, video_url.rsplit("/", 1)[1])
+            with open(path, "wb") as f:
+                f.write(b"\0")
+            return path
+
+        for patch in (
+            mock.patch.object(material, "search_materials", side_effect=lambda terms, *args: {terms[0]: pool[terms[0]]}),
+            mock.patch.object(material, "save_video", side_effect=fake_save),
+            mock.patch.dict(config.app, {"partial_download": partial}),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_quota_stop_keeps_the_count(self):
+        cache = _FakeCache(max_size=25 * MB)
+        self._patch(cache, {"ocean": self._clips("ocean", 5)})
+        count, quota_reached = self.warmer._warm_term(
+            material, cache, self.temp_dir.name, "pexels", "ocean", VideoAspect.portrait
+        )
+        self.assertEqual((count, quota_reached), (2, True))
+
+    def test_partial_downloads_are_estimated_by_window(self):
+        cache = _FakeCache(max_size=8 * MB)
+        # 100 MB / 100 s clips: a 5 s window (plus slack) is ~7 MB
+        self._patch(cache, {"ocean": self._clips("ocean", 1, duration=100, size=100 * MB)}, partial=True)
+        count, quota_reached = self.warmer._warm_term(
+            material, cache, self.temp_dir.name, "pexels", "ocean", VideoAspect.portrait
+        )
+        self.assertEqual((count, quota_reached), (1, False))
+
+    def test_run_totals_include_the_interrupted_term(self):
+        cache = _FakeCache(max_size=35 * MB)
+        self._patch(cache, {"ocean": self._clips("ocean", 2), "forest": self._clips("forest", 5)})
+        self.warmer.state_path = os.path.join(self.temp_dir.name, "state.json")
+        with mock.patch.object(cache_warmer, "collect_term_frequency",
+                               return_value={"9:16": {"ocean": 2.0, "forest": 1.0}}), \
+                mock.patch("app.services.material_cache.MaterialCache.get_instance", return_value=cache), \
+                mock.patch.dict(config.app, {"video_source": "pexels"}):
+            downloaded = self.warmer.run_once(force=True)
+        self.assertEqual(downloaded, 3)
+        with open(self.warmer.state_path, "r", encoding="utf-8") as f:
+            # the interrupted term is warmed again on the next run
+            self.assertEqual(list(json.load(f)), ["9:16|ocean"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import torch
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import alignment
+from app.services import voice as vs
+
+long_text = " ".join(
+    f"Sentence number {i} talks about the weather, the markets and the news of the day." for i in range(12)
+)
+
+
+class _FakeChatterbox:
+    def __init__(self):
+        self.texts = []
+
+    def generate(self, text, cfg_weight=0.2, audio_prompt_path=None):
+        self.texts.append(text)
+        return torch.zeros(1, 24000)  # one second per chunk
+
+
+class _FakeWhisperModel:
+    def __init__(self):
+        self.transcribed = 0
+
+    def transcribe(self, audio, batch_size=16):
+        self.transcribed += 1
+        return {"segments": [{"text": long_text}], "language": "en"}
+
+
+class _FakeWhisperX:
+    def __init__(self):
+        self.model = _FakeWhisperModel()
+        self.align_loads = []
+        self.aligned = 0
+
+    def load_model(self, name, device, compute_type="int8"):
+        return self.model
+
+    def load_audio(self, path):
+        return path
+
+    def load_align_model(self, language_code, device):
+        self.align_loads.append((language_code, device))
+        return object(), {"language": language_code}
+
+    def align(self, segments, model, metadata, audio, device, return_char_alignments=False):
+        self.aligned += 1
+        words = long_text.split()
+        return {"segments": [{"words": [
+            {"word": word, "start": i * 0.1, "end": i * 0.1 + 0.08} for i, word in enumerate(words)
+        ]}]}
+
+
+class _FakeTorchaudio:
+    @staticmethod
+    def save(path, wav, sample_rate):
+        with open(path, "wb") as f:
+            f.write(b"RIFF" + bytes(wav.shape[-1] // 100))
+
+
+class TestChatterbox(unittest.TestCase):
+    def setUp(self):
+        self.whisperx = _FakeWhisperX()
+        self.chatterbox = _FakeChatterbox()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        patches = [
+            mock.patch.object(vs, "whisperx", self.whisperx, create=True),
+            mock.patch.object(vs, "torch", torch, create=True),
+            mock.patch.object(vs, "torchaudio", _FakeTorchaudio, create=True),
+            mock.patch.object(vs, "CHATTERBOX_AVAILABLE", True),
+            mock.patch.object(vs, "chatterbox_model", self.chatterbox),
+            mock.patch.object(vs, "whisperx_model", None),
+            mock.patch.object(alignment, "whisperx", self.whisperx, create=True),
+            mock.patch.object(alignment, "_align_models", {}),
+            mock.patch.dict(vs.config.app, {"forced_alignment": False}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def test_align_model_is_cached_per_language_and_device(self):
+        first = alignment.get_align_model("en", "cpu")
+        self.assertIs(alignment.get_align_model("en", "cpu"), first)
+        alignment.get_align_model("de", "cpu")
+        self.assertEqual(self.whisperx.align_loads, [("en", "cpu"), ("de", "cpu")])
+
+    def test_chunked_synthesis_is_aligned_in_one_pass(self):
+        voice_file = os.path.join(self.temp_dir.name, "audio.wav")
+        sub_maker = vs.chatterbox_tts(long_text, "chatterbox:default:Default Voice-Neutral", 1.0, voice_file)
+
+        self.assertGreater(len(self.chatterbox.texts), 1)
+        self.assertEqual(self.whisperx.model.transcribed, 1)
+        self.assertEqual(self.whisperx.aligned, 1)
+        self.assertEqual(len(self.whisperx.align_loads), 1)
+        self.assertEqual(sub_maker.subs, long_text.split())
+        # offsets come straight from the alignment of the whole recording
+        self.assertEqual(sub_maker.offset[-1][0], int((len(sub_maker.subs) - 1) * 0.1 * 10000000))
+        self.assertEqual(sub_maker._actual_audio_file, voice_file)
+        self.assertTrue(os.path.exists(voice_file))
+
+    def test_single_chunk_reuses_the_align_model(self):
+        text = "A short line about the weather today."
+        for i in range(2):
+            voice_file = os.path.join(self.temp_dir.name, f"short_{i}.wav")
+            self.assertIsNotNone(
+                vs.chatterbox_tts(text, "chatterbox:default:Default Voice-Neutral", 1.0, voice_file)
+            )
+        self.assertEqual(self.whisperx.model.transcribed, 2)
+        self.assertEqual(len(self.whisperx.align_loads), 1)
+
+    def test_forced_alignment_skips_transcription(self):
+        voice_file = os.path.join(self.temp_dir.name, "forced.wav")
+        words = [(word, i * 0.2, i * 0.2 + 0.15) for i, word in enumerate(long_text.split())]
+        with mock.patch.dict(vs.config.app, {"forced_alignment": True}), \
+                mock.patch.object(alignment, "ALIGNMENT_AVAILABLE", True), \
+                mock.patch.object(alignment, "align_file", return_value=words) as align_file:
+            sub_maker = vs.chatterbox_tts(long_text, "chatterbox:default:Default Voice-Neutral", 1.0, voice_file)
+
+        self.assertEqual(align_file.call_count, 1)
+        self.assertEqual(align_file.call_args[0][1], vs.preprocess_text_for_chatterbox(long_text))
+        self.assertEqual(self.whisperx.model.transcribed, 0)
+        self.assertEqual(sub_maker.subs, long_text.split())
+        self.assertEqual(sub_maker.offset[1], (2000000, 3500000))
+        self.assertFalse(sub_maker._transcription_quality_warning)
+
+    def test_failed_forced_alignment_falls_back_to_transcription(self):
+        voice_file = os.path.join(self.temp_dir.name, "fallback.wav")
+        with mock.patch.dict(vs.config.app, {"forced_alignment": True}), \
+                mock.patch.object(alignment, "ALIGNMENT_AVAILABLE", True), \
+                mock.patch.object(alignment, "align_file", side_effect=ValueError("no frames")):
+            sub_maker = vs.chatterbox_tts(long_text, "chatterbox:default:Default Voice-Neutral", 1.0, voice_file)
+        self.assertEqual(self.whisperx.model.transcribed, 1)
+        self.assertEqual(sub_maker.subs, long_text.split())
+
+
+if __name__ == "__main__":
+    unittest.main()
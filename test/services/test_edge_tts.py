@@ -0,0 +1,110 @@
+import os
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import voice as vs
+from app.services.tts_cache import TtsCache
+from app.services.utils import mp3
+
+sentences = ["The sun rises over the hills.", "Birds start to sing!", "A new day begins."]
+script = " ".join(sentences)
+
+# MPEG-2 layer III, 48 kbps, 24 kHz, mono: 24 ms per frame
+FRAME = b"\xff\xf3\x64\xc4" + bytes(140)
+
+
+class _FakeCommunicate:
+    """Streams 10 frames (240 ms) and one word boundary per word; fails once for texts in `flaky`."""
+
+    calls = []
+    flaky = set()
+    active = 0
+    max_active = 0
+
+    def __init__(self, text, voice, rate="+0%"):
+        self.text = text
+        _FakeCommunicate.calls.append(text)
+
+    async def stream(self):
+        import asyncio
+
+        _FakeCommunicate.active += 1
+        _FakeCommunicate.max_active = max(_FakeCommunicate.max_active, _FakeCommunicate.active)
+        try:
+            await asyncio.sleep(0.01)
+            if self.text in _FakeCommunicate.flaky:
+                _FakeCommunicate.flaky.discard(self.text)
+                raise ConnectionError("connection reset")
+            for i, word in enumerate(self.text.split()):
+                yield {"type": "audio", "data": FRAME * 10}
+                yield {"type": "WordBoundary", "text": word, "offset": i * 2400000, "duration": 2000000}
+        finally:
+            _FakeCommunicate.active -= 1
+
+
+class TestEdgeTts(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        _FakeCommunicate.calls = []
+        _FakeCommunicate.flaky = set()
+        _FakeCommunicate.max_active = 0
+        for patch in (
+            mock.patch.object(vs.edge_tts, "Communicate", _FakeCommunicate),
+            mock.patch.dict(vs.config.app, {"edge_tts_parallel": True, "edge_tts_concurrency": 2}),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_sentences_are_stitched(self):
+        voice_file = os.path.join(self.temp_dir.name, "audio.mp3")
+        sub_maker = vs.azure_tts_v1(script, "en-US-JennyNeural-Female", 1.0, voice_file)
+
+        self.assertEqual(len(_FakeCommunicate.calls), 3)
+        self.assertLessEqual(_FakeCommunicate.max_active, 2)
+        self.assertEqual(sub_maker.subs, script.split())
+        # "Birds" is the first word of the second sentence, after 6 words of 240 ms
+        self.assertEqual(sub_maker.offset[6], (6 * 2400000, 6 * 2400000 + 2000000))
+        self.assertEqual(sub_maker.offset[-1][0], 13 * 2400000)
+        self.assertAlmostEqual(mp3.duration(voice_file), 14 * 0.24)
+        self.assertEqual(os.listdir(self.temp_dir.name), ["audio.mp3"])
+
+    def test_failed_sentence_is_retried_alone(self):
+        _FakeCommunicate.flaky = {"Birds start to sing!"}
+        voice_file = os.path.join(self.temp_dir.name, "audio.mp3")
+        sub_maker = vs.azure_tts_v1(script, "en-US-JennyNeural-Female", 1.0, voice_file)
+        self.assertEqual(sorted(_FakeCommunicate.calls), sorted(sentences + ["Birds start to sing!"]))
+        self.assertEqual(sub_maker.subs, script.split())
+
+    def test_single_sentence_is_one_request(self):
+        voice_file = os.path.join(self.temp_dir.name, "short.mp3")
+        sub_maker = vs.azure_tts_v1("Hello world.", "en-US-JennyNeural-Female", 1.0, voice_file)
+        self.assertEqual(_FakeCommunicate.calls, ["Hello world."])
+        self.assertEqual(sub_maker.offset, [(0, 2000000), (2400000, 4400000)])
+
+    def test_batch_reports_failed_parts(self):
+        _FakeCommunicate.flaky = {"b"}
+        files = [os.path.join(self.temp_dir.name, f"{name}.mp3") for name in "ab"]
+        results = vs.edge_tts_batch(["a", "b"], "en-US-JennyNeural-Female", 1.0, files, retries=1)
+        self.assertEqual(results[0].subs, ["a"])
+        self.assertIsNone(results[1])
+
+    def test_cache_requests_missing_sentences_in_one_batch(self):
+        cache = TtsCache(os.path.join(self.temp_dir.name, "cache"))
+        voice_file = os.path.join(self.temp_dir.name, "cached.mp3")
+        with mock.patch.object(vs, "edge_tts_batch", wraps=vs.edge_tts_batch) as batch:
+            sub_maker = cache.synthesize(script, "en-US-JennyNeural-Female", 1.0, voice_file)
+        self.assertEqual(batch.call_count, 1)
+        self.assertEqual(batch.call_args[0][0], sentences)
+        self.assertEqual(sub_maker.offset[6][0], 6 * 2400000)
+        self.assertAlmostEqual(mp3.duration(voice_file), 14 * 0.24)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services.embedding_store import EmbeddingStore
+
+
+class TestEmbeddingStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.encoded = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _encoder(self, texts):
+        self.encoded.extend(texts)
+        return np.array([[len(t), t.count("a"), 1.0] for t in texts])
+
+    def test_texts_are_encoded_once_across_instances(self):
+        store = EmbeddingStore("model-a", self.temp_dir.name)
+        first = store.encode(["banana", "apple", "banana"], self._encoder)
+        self.assertEqual(self.encoded, ["banana", "apple"])
+        np.testing.assert_allclose(first[0], [6, 3, 1])
+
+        # a second process opening the same partition sees the stored rows
+        other = EmbeddingStore("model-a", self.temp_dir.name)
+        second = other.encode(["apple", "cherry"], self._encoder)
+        self.assertEqual(self.encoded, ["banana", "apple", "cherry"])
+        np.testing.assert_allclose(second[0], [5, 1, 1])
+
+    def test_compaction_keeps_recent_entries(self):
+        store = EmbeddingStore("model-b", self.temp_dir.name)
+        store.max_entries = 10
+        for i in range(12):
+            store.encode([f"text {i}"], self._encoder)
+        stats = store.get_stats()
+        self.assertLessEqual(stats["entries"], 10)
+
+        found = EmbeddingStore("model-b", self.temp_dir.name).get_many(["text 11", "text 0"])
+        self.assertIn("text 11", found)
+        self.assertNotIn("text 0", found)
+        np.testing.assert_allclose(found["text 11"], [7, 0, 1])
+
+    def test_reads_are_batched_into_the_next_write(self):
+        store = EmbeddingStore("model-d", self.temp_dir.name)
+        store.max_entries = 10
+        for i in range(10):
+            store.encode([f"text {i}"], self._encoder)
+
+        def last_access():
+            with sqlite3.connect(store.db_path) as conn:
+                return dict(conn.execute("SELECT key, last_access FROM embeddings"))
+
+        before = last_access()
+        self.assertIn("text 0", store.get_many(["text 0"]))
+        # a cache hit does not write the index
+        self.assertEqual(last_access(), before)
+
+        # the read is recorded with the next append, so compaction keeps "text 0"
+        store.encode(["text 10"], self._encoder)
+        found = store.get_many(["text 0", "text 1"])
+        self.assertIn("text 0", found)
+        self.assertNotIn("text 1", found)
+
+    def test_aliases_follow_compaction(self):
+        store = EmbeddingStore("model-c", self.temp_dir.name, kind="image")
+        store.max_entries = 10
+        store.put_keys(["hash-0"], np.array([[1.0, 0.0]]))
+        store.add_aliases({"http://cdn1/a.jpg": "hash-0", "http://cdn2/a.jpg": "hash-0"})
+        self.assertEqual(
+            store.resolve_aliases(["http://cdn1/a.jpg", "http://cdn2/a.jpg", "http://cdn3/a.jpg"]),
+            {"http://cdn1/a.jpg": "hash-0", "http://cdn2/a.jpg": "hash-0"},
+        )
+
+        for i in range(1, 12):
+            store.put_keys([f"hash-{i}"], np.array([[0.0, float(i)]]))
+        self.assertEqual(store.resolve_aliases(["http://cdn1/a.jpg"]), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+import io
+import unittest
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import torch
+from PIL import Image
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import image_similarity, ingest_embeddings
+from app.services.embedding_store import EmbeddingStore
+
+resources_dir = Path(__file__).parent.parent / "resources"
+
+
+class _Inputs(dict):
+    def to(self, device):
+        return self
+
+
+class _ColorClip:
+    """Stand-in CLIP: images embed as their mean RGB, texts as the color they name."""
+
+    device = "cpu"
+    colors = {"red": [1.0, 0.0, 0.0], "green": [0.0, 1.0, 0.0], "blue": [0.0, 0.0, 1.0]}
+
+    def __init__(self):
+        self.image_batches = []
+
+    def processor(self, text=None, images=None, **kwargs):
+        return _Inputs(texts=text) if text is not None else _Inputs(images=images)
+
+    def get_text_features(self, texts):
+        return torch.tensor([next(v for k, v in self.colors.items() if k in t) for t in texts])
+
+    def get_image_features(self, images):
+        self.image_batches.append(len(images))
+        return torch.from_numpy(np.stack([np.asarray(image, dtype=np.float32).mean(axis=(0, 1)) for image in images]))
+
+
+def _png(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class TestImageSimilarityMatrix(unittest.TestCase):
+    def setUp(self):
+        self.clip = _ColorClip()
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        stores = {
+            kind: EmbeddingStore("color-clip", str(Path(temp_dir.name) / kind), kind=kind)
+            for kind in ("text", "image")
+        }
+        self.fetched = []
+
+        def fetch(url):
+            self.fetched.append(url)
+            return _png(url.rsplit("/", 1)[-1]) if "missing" not in url else b""
+
+        for patcher in (
+            mock.patch.object(image_similarity, "load_clip_model", return_value=(self.clip, self.clip.processor)),
+            mock.patch.object(image_similarity, "_fetch_image_bytes", side_effect=fetch),
+            mock.patch.object(image_similarity, "IMAGE_SIMILARITY_AVAILABLE", True),
+            mock.patch.object(image_similarity, "_caching_enabled", False),
+            mock.patch.object(image_similarity, "MAX_BATCH_SIZE", 2),
+            mock.patch.object(EmbeddingStore, "get_instance", lambda model_name, kind="text": stores[kind]),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_matrix_covers_every_segment_and_video(self):
+        videos = [
+            {"thumbnail_url": "http://img/red", "preview_images": ["http://img/blue"]},
+            {"thumbnail_url": "http://img/blue"},
+            {"preview_images": ["http://img/green"]},
+            {"thumbnail_url": "http://img/missing"},
+            {"embeddings": {"color-clip": ingest_embeddings.encode_vector([0.0, 1.0, 0.0])}},
+        ]
+        matrix = image_similarity.calculate_image_similarity_matrix(
+            ["a red car", "the blue sea", "green grass"], videos, "color-clip"
+        )
+
+        self.assertEqual(matrix.shape, (3, 5))
+        self.assertEqual(list(np.argmax(matrix[:, :3], axis=1)), [0, 1, 2])
+        np.testing.assert_allclose(matrix[2, 4], 1.0)
+        # videos without a usable image score 0
+        np.testing.assert_allclose(matrix[:, 3], 0.0)
+        # only representative images are fetched, the ingest-embedded clip is not
+        self.assertCountEqual(self.fetched, ["http://img/red", "http://img/blue", "http://img/green", "http://img/missing"])
+        # 3 images in forward passes of at most MAX_BATCH_SIZE
+        self.assertEqual(sum(self.clip.image_batches), 3)
+        self.assertLessEqual(max(self.clip.image_batches), 2)
+
+    def test_image_embeddings_persist_by_content(self):
+        image_similarity.encode_image_urls(["http://img/red"], "color-clip")
+        self.assertEqual(sum(self.clip.image_batches), 1)
+
+        # known URL: no download, no forward pass
+        vectors = image_similarity.encode_image_urls(["http://img/red"], "color-clip")
+        self.assertEqual(self.fetched, ["http://img/red"])
+        np.testing.assert_allclose(vectors["http://img/red"], [1.0, 0.0, 0.0], atol=1e-3)
+
+        # same bytes under another CDN URL: downloaded once, not encoded again
+        vectors = image_similarity.encode_image_urls(["http://cdn2/img/red"], "color-clip")
+        self.assertEqual(sum(self.clip.image_batches), 1)
+        self.assertIn("http://cdn2/img/red", vectors)
+
+        similarity = image_similarity.calculate_text_image_similarity("a red car", "http://cdn2/img/red", "color-clip")
+        np.testing.assert_allclose(similarity, 1.0, atol=1e-3)
+        self.assertEqual(len(self.fetched), 2)
+
+    def test_text_image_similarity_uses_the_inference_queue(self):
+        similarity = image_similarity.calculate_text_image_similarity("a red car", "http://img/red", "color-clip")
+        np.testing.assert_allclose(similarity, 1.0, atol=1e-3)
+
+
+class TestClipInferenceQueue(unittest.TestCase):
+    def setUp(self):
+        self.clip = _ColorClip()
+        patcher = mock.patch.object(
+            image_similarity, "load_clip_model", return_value=(self.clip, self.clip.processor)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queue = image_similarity.ClipInferenceQueue()
+        self.queue.max_wait = 0.2
+
+    def test_concurrent_requests_share_a_batch(self):
+        images = [Image.new("RGB", (4, 4), color) for color in ("red", "green", "blue")]
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(
+                lambda image: self.queue.encode("image", "color-clip", [image], timeout=10)[0], images
+            ))
+        self.assertEqual(self.clip.image_batches, [3])
+        self.assertEqual([int(np.argmax(r)) for r in results], [0, 1, 2])
+        self.assertEqual(self.queue.get_stats()["batches"], 1)
+
+    def test_expired_requests_are_not_computed(self):
+        future = self.queue.submit("text", "color-clip", "red", timeout=-1)
+        with self.assertRaises(TimeoutError):
+            future.result(timeout=10)
+        self.assertEqual(self.queue.get_stats()["expired"], 1)
+
+
+class TestKeyframeEmbeddings(unittest.TestCase):
+    def setUp(self):
+        self.clip = _ColorClip()
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        store = EmbeddingStore("color-clip", temp_dir.name, kind="image")
+        for patcher in (
+            mock.patch.object(image_similarity, "load_clip_model", return_value=(self.clip, self.clip.processor)),
+            mock.patch.object(image_similarity, "IMAGE_SIMILARITY_AVAILABLE", True),
+            mock.patch.object(EmbeddingStore, "get_instance", lambda model_name, kind="text": store),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_local_clip_is_embedded_from_pooled_keyframes(self):
+        video_path = str(resources_dir / "2.png.mp4")
+        vectors = image_similarity.encode_video_keyframes([video_path, "/missing.mp4"], "color-clip", count=3)
+
+        self.assertEqual(list(vectors), [video_path])
+        self.assertEqual(sum(self.clip.image_batches), 3)
+        with Image.open(resources_dir / "2.png") as image:
+            expected = np.asarray(image.convert("RGB"), dtype=np.float32).mean(axis=(0, 1))
+        np.testing.assert_allclose(vectors[video_path], expected / np.linalg.norm(expected), atol=0.05)
+
+        # pooled vectors are kept in the image store
+        again = image_similarity.encode_video_keyframes([video_path], "color-clip", count=3)
+        self.assertEqual(sum(self.clip.image_batches), 3)
+        np.testing.assert_allclose(again[video_path], vectors[video_path], atol=1e-3)
+
+
+class TestFetchImageBytes(unittest.TestCase):
+    def test_chunks_are_joined_and_size_capped(self):
+        response = mock.MagicMock()
+        response.__enter__.return_value = response
+        response.headers = {}
+        response.iter_content.return_value = [b"ab", b"", b"cd", b"ef"]
+        with mock.patch.object(image_similarity.requests, "get", return_value=response):
+            self.assertEqual(image_similarity._fetch_image_bytes("http://img/x"), b"abcdef")
+            with mock.patch.object(image_similarity, "MAX_IMAGE_BYTES", 4):
+                self.assertEqual(image_similarity._fetch_image_bytes("http://img/x"), b"abcd")
+
+
+if __name__ == "__main__":
+    unittest.main()
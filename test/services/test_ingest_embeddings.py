@@ -0,0 +1,84 @@
+import threading
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import ingest_embeddings, semantic_video
+from app.services.ingest_embeddings import IngestEmbedder
+
+
+def _fake_text_vectors(texts):
+    return np.array([[1.0, 0.0] if "ocean" in t else [0.0, 1.0] for t in texts])
+
+
+class TestIngestEmbeddings(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.video_path = str(Path(temp_dir.name) / "vid-1.mp4")
+        Path(self.video_path).write_bytes(b"\0")
+        semantic_video.save_video_metadata(self.video_path, "ocean waves", {"thumbnail_url": "http://x/1.jpg"})
+
+        self.embedder = IngestEmbedder()
+        self.embedder.enabled = True
+        patcher = mock.patch.object(self.embedder, "_encode_texts", side_effect=_fake_text_vectors)
+        self.encode_texts = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_vector_round_trip(self):
+        vector = np.array([0.25, -0.5, 1.0])
+        np.testing.assert_allclose(ingest_embeddings.decode_vector(ingest_embeddings.encode_vector(vector)), vector)
+        self.assertIsNone(ingest_embeddings.decode_vector(""))
+
+    def test_worker_writes_embeddings_into_metadata(self):
+        self.assertTrue(self.embedder.submit(self.video_path))
+        self.assertTrue(self.embedder.wait_idle(timeout=10))
+
+        metadata = semantic_video.load_video_metadata(self.video_path)
+        self.assertEqual(metadata["search_term"], "ocean waves")
+        self.assertEqual(metadata["thumbnail_url"], "http://x/1.jpg")
+        vector = ingest_embeddings.stored_embedding(metadata, self.embedder.text_model)
+        np.testing.assert_allclose(vector, [1.0, 0.0])
+
+        # already embedded clips are not encoded again
+        self.assertEqual(self.embedder.embed_clips([self.video_path]), 0)
+        self.assertEqual(self.encode_texts.call_count, 1)
+
+    def test_models_follow_the_selection_settings(self):
+        with mock.patch.dict(ingest_embeddings.config.app, {
+            "semantic_search_model": "all-MiniLM-L6-v2", "image_similarity_model": "clip-vit-large-patch14",
+        }):
+            embedder = IngestEmbedder()
+        self.assertEqual((embedder.text_model, embedder.clip_model), ("all-MiniLM-L6-v2", "clip-vit-large-patch14"))
+
+    def test_wait_for_ignores_other_clips(self):
+        release = threading.Event()
+        with mock.patch.object(self.embedder, "embed_clips", side_effect=lambda paths: release.wait(10)):
+            self.embedder.submit("/other/task/clip.mp4")
+            self.assertFalse(self.embedder.wait_idle(timeout=0.1))
+            self.assertTrue(self.embedder.wait_for([self.video_path], timeout=0.1))
+            self.assertFalse(self.embedder.wait_for(["/other/task/clip.mp4"], timeout=0.1))
+            release.set()
+            self.assertTrue(self.embedder.wait_for(["/other/task/clip.mp4"], timeout=10))
+
+    def test_similarity_matrix_uses_ingest_embeddings(self):
+        model = mock.Mock()
+        model.encode.return_value = np.array([[1.0, 0.0]])
+        with mock.patch.object(semantic_video, "load_model", return_value=model):
+            matrix = semantic_video.compute_similarity_matrix(
+                ["the ocean"], ["ocean waves", "city"], [np.array([1.0, 0.0]), np.array([0.0, 1.0])]
+            )
+        # only the script segments were encoded
+        self.assertEqual(model.encode.call_count, 1)
+        np.testing.assert_allclose(matrix, [[1.0, 0.0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,317 @@
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.config import config
+from app.models.exception import DownloadCancelledException
+from app.models.schema import MaterialInfo
+from app.services import material
+
+resources_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources")
+
+
+class TestMaterialProbe(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.video_path = os.path.join(self.temp_dir.name, "clip.mp4")
+        shutil.copy(os.path.join(resources_dir, "2.png.mp4"), self.video_path)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_probe_valid_clip(self):
+        probe = material._probe_video(self.video_path, os.path.getsize(self.video_path))
+        self.assertAlmostEqual(probe["duration"], 3.0, places=1)
+        self.assertGreater(probe["fps"], 0)
+        self.assertEqual(probe["codec"], "avc1")
+        self.assertTrue(os.path.exists(self.video_path))
+
+    def test_probe_rejects_truncated_clip(self):
+        size = os.path.getsize(self.video_path)
+        with open(self.video_path, "r+b") as f:
+            f.truncate(size // 2)
+        self.assertEqual(material._probe_video(self.video_path), {})
+        self.assertFalse(os.path.exists(self.video_path))
+
+    def test_probe_rejects_short_download(self):
+        size = os.path.getsize(self.video_path)
+        self.assertEqual(material._probe_video(self.video_path, size + 1), {})
+        self.assertFalse(os.path.exists(self.video_path))
+
+
+
+def _fake_provider(name, count, delay=0.0):
+    def search(search_term, minimum_duration, video_aspect):
+        time.sleep(delay)
+        items = []
+        for i in range(count):
+            item = MaterialInfo()
+            item.provider = name
+            item.url = f"https://{name}.example/{i}.mp4"
+            item.duration = 10
+            items.append(item)
+        return items
+
+    return search
+
+
+class TestFederatedSearch(unittest.TestCase):
+    def test_slow_provider_is_dropped(self):
+        providers = [
+            ("pexels", _fake_provider("pexels", 2), ""),
+            ("pixabay", _fake_provider("pixabay", 2, delay=2), ""),
+            ("cache", _fake_provider("cache", 1), ""),
+        ]
+        with mock.patch.object(material, "_federated_providers", providers), \
+                mock.patch.dict(config.app, {"federated_search_timeout": 0.5}):
+            items = material.search_videos_federated("ocean", 5)
+
+        self.assertEqual([item.provider for item in items], ["cache", "pexels", "pexels"])
+        self.assertGreater(items[0].score, items[1].score)
+
+
+class _FakeDownload:
+    """Streamed response for requests.get, slow enough for concurrent callers to overlap."""
+
+    def __init__(self, data, delay=0.0):
+        self.data = data
+        self.delay = delay
+        self.headers = {"Content-Length": str(len(data))}
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.data), chunk_size):
+            time.sleep(self.delay)
+            yield self.data[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class TestSaveVideo(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        with open(os.path.join(resources_dir, "2.png.mp4"), "rb") as f:
+            self.clip = f.read()
+        for patch in (
+            mock.patch.object(material, "_get_material_cache", return_value=None),
+            mock.patch.dict(config.app, {"partial_download": False}),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_concurrent_calls_fetch_once(self):
+        fetches = []
+
+        def fake_get(url, **kwargs):
+            fetches.append(url)
+            return _FakeDownload(self.clip, delay=0.05)
+
+        results = []
+        with mock.patch.object(material.requests, "get", side_effect=fake_get):
+            threads = [
+                threading.Thread(
+                    target=lambda: results.append(
+                        material.save_video("https://example.com/clip.mp4?sig=1", self.temp_dir.name)
+                    )
+                )
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(fetches), 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertTrue(os.path.exists(results[0]))
+        # the per-clip lock file is removed on release
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir.name, ".locks")), [])
+
+    def test_cancelled_follower_stops_waiting(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        class _Stalled(_FakeDownload):
+            def iter_content(self, chunk_size=1):
+                started.set()
+                release.wait(5)
+                yield from super().iter_content(chunk_size)
+
+        url = "https://example.com/clip.mp4"
+        with mock.patch.object(material.requests, "get", return_value=_Stalled(self.clip)):
+            leader = threading.Thread(target=material.save_video, args=(url, self.temp_dir.name))
+            leader.start()
+            self.assertTrue(started.wait(5))
+
+            cancel_event = threading.Event()
+            cancel_event.set()
+            start = time.monotonic()
+            # returns without waiting for the leader's transfer
+            self.assertEqual(material.save_video(url, self.temp_dir.name, cancel_event=cancel_event), "")
+            self.assertLess(time.monotonic() - start, 2)
+            release.set()
+            leader.join()
+
+    def test_cancelled_download_removes_the_partial_file(self):
+        cancel_event = threading.Event()
+
+        class _CancelledMidway(_FakeDownload):
+            def iter_content(self, chunk_size=1):
+                for i, chunk in enumerate(super().iter_content(chunk_size=1024)):
+                    if i == 2:
+                        cancel_event.set()
+                    yield chunk
+
+        with mock.patch.object(material.requests, "get", return_value=_CancelledMidway(self.clip)):
+            with self.assertRaises(DownloadCancelledException):
+                material.save_video("https://example.com/clip.mp4", self.temp_dir.name, cancel_event=cancel_event)
+        self.assertEqual([name for name in os.listdir(self.temp_dir.name) if name.endswith(".mp4")], [])
+
+    def test_read_content_aborts_when_cancelled(self):
+        cancel_event = threading.Event()
+        cancel_event.set()
+        with self.assertRaises(DownloadCancelledException):
+            material._read_content(_FakeDownload(self.clip), cancel_event)
+        self.assertEqual(material._read_content(_FakeDownload(self.clip), threading.Event()), self.clip)
+
+
+def _clip(url, duration=5, search_term="ocean", size=0, provider="pexels"):
+    item = MaterialInfo()
+    item.provider = provider
+    item.url = url
+    item.duration = duration
+    item.search_term = search_term
+    item.size = size
+    return item
+
+
+class TestThumbnailHash(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def test_indexed_clip_reuses_its_stored_hash(self):
+        from app.services.material_cache import MaterialCache
+
+        cache = MaterialCache(self.temp_dir.name)
+        clip_path = os.path.join(self.temp_dir.name, "vid-known.mp4")
+        shutil.copy(os.path.join(resources_dir, "2.png.mp4"), clip_path)
+        cache.put(clip_path, url="https://example.com/known.mp4?sig=1")
+        cache.set_fingerprint(clip_path, thumb_hash="00000000000000ff")
+
+        with mock.patch.object(material, "_get_material_cache", return_value=cache), \
+                mock.patch.object(material.requests, "get") as get:
+            value = material._thumbnail_hash(
+                "https://example.com/known.jpg", "https://example.com/known.mp4?sig=2", self.temp_dir.name
+            )
+            self.assertEqual(value, 0xFF)
+            get.assert_not_called()
+
+            get.return_value = mock.Mock(status_code=404)
+            self.assertIsNone(material._thumbnail_hash(
+                "https://example.com/new.jpg", "https://example.com/new.mp4", self.temp_dir.name
+            ))
+            get.assert_called_once()
+
+
+class TestScheduleDownloads(unittest.TestCase):
+    def test_cheapest_usable_seconds_first(self):
+        mb = 1024 * 1024
+        long_4k = _clip("ocean-4k", duration=60, size=300 * mb)
+        short_hd = _clip("ocean-hd", duration=6, size=6 * mb)
+        cached = _clip("ocean-cached", duration=8, size=50 * mb, provider="cache")
+        forest = _clip("forest-hd", duration=10, size=20 * mb, search_term="forest")
+
+        scheduled = material.schedule_downloads([long_4k, short_hd, forest, cached], max_clip_duration=5)
+        # round 1: the cheapest clip of each term, round 2: the rest
+        self.assertEqual([item.url for item in scheduled], ["ocean-cached", "forest-hd", "ocean-hd", "ocean-4k"])
+
+    def test_partial_downloads_only_pay_for_the_window(self):
+        mb = 1024 * 1024
+        long_clip = _clip("long", duration=100, size=100 * mb)
+        short_clip = _clip("short", duration=8, size=15 * mb, search_term="forest")
+        self.assertEqual(
+            [item.url for item in material.schedule_downloads([long_clip, short_clip], 5, partial=False)],
+            ["short", "long"],
+        )
+        # 7s of a 100s file is ~7 MB, cheaper than the whole 15 MB short clip
+        self.assertEqual(
+            [item.url for item in material.schedule_downloads([long_clip, short_clip], 5, partial=True)],
+            ["long", "short"],
+        )
+
+
+class TestMaterialPrefetch(unittest.TestCase):
+    def setUp(self):
+        self.pool = [_clip(f"https://pexels.example/{i}.mp4") for i in range(20)]
+        self.saved = []
+        for patch in (
+            mock.patch.object(material, "search_materials", return_value={"ocean": self.pool}),
+            mock.patch.object(material, "save_video", side_effect=self._fake_save),
+            mock.patch.object(material, "_get_material_cache", return_value=None),
+            mock.patch.dict(config.app, {
+                "max_download_workers": 2, "near_duplicate_threshold": 0, "partial_download": False,
+                "material_directory": "",
+            }),
+        ):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _fake_save(self, video_url, **kwargs):
+        time.sleep(0.05)
+        self.saved.append(video_url)
+        return "/materials/" + video_url.rsplit("/", 1)[1]
+
+    def _prefetch(self, target):
+        return material.MaterialPrefetch("task-id", ["ocean"], target_duration=target, final=False).start()
+
+    def test_growing_target_is_topped_up(self):
+        prefetch = self._prefetch(10)
+        time.sleep(0.5)
+        self.assertEqual(len(self.saved), 2)  # the estimate is covered, waiting for the real target
+        prefetch.set_target(30)
+        paths = prefetch.result(timeout=10)
+        self.assertGreaterEqual(len(paths), 6)
+        self.assertLessEqual(len(paths), 6 + 2)
+        self.assertEqual(len(set(paths)), len(paths))
+
+    def test_shrinking_target_stops_early(self):
+        prefetch = self._prefetch(80)
+        prefetch.set_target(10)
+        paths = prefetch.result(timeout=10)
+        # only what was already in flight lands beyond the new target
+        self.assertGreaterEqual(len(paths), 2)
+        self.assertLessEqual(len(paths), 4)
+
+    def test_cancel_stops_a_waiting_prefetch(self):
+        prefetch = self._prefetch(10)
+        time.sleep(0.3)
+        prefetch.cancel()
+        prefetch.result(timeout=5)
+        self.assertFalse(prefetch._thread.is_alive())
+        self.assertLessEqual(len(self.saved), 2)
+
+    def test_result_timeout_cancels_an_unfinished_prefetch(self):
+        prefetch = self._prefetch(10)
+        start = time.time()
+        paths = prefetch.result(timeout=0.5)
+        self.assertLess(time.time() - start, 5)
+        self.assertFalse(prefetch._thread.is_alive())
+        self.assertEqual(len(paths), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import material_cache as mc
+from app.services import semantic_video
+
+
+class TestMaterialCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.temp_dir.name
+        self._grace = mc._eviction_grace_seconds
+        mc._eviction_grace_seconds = 0
+
+    def tearDown(self):
+        mc._eviction_grace_seconds = self._grace
+        self.temp_dir.cleanup()
+
+    def _write_clip(self, name, size):
+        path = os.path.join(self.cache_dir, name)
+        with open(path, "wb") as f:
+            f.write(b"\0" * size)
+        return path
+
+    def test_reconcile_and_stats(self):
+        self._write_clip("vid-a.mp4", 100)
+        self._write_clip("vid-b.mp4", 200)
+        cache = mc.MaterialCache(self.cache_dir)
+
+        stats = cache.get_stats()
+        self.assertEqual(stats["entries"], 2)
+        self.assertEqual(stats["total_size"], 300)
+
+        self.assertIsNotNone(cache.get(os.path.join(self.cache_dir, "vid-a.mp4")))
+        self.assertIsNone(cache.get(os.path.join(self.cache_dir, "vid-missing.mp4")))
+        stats = cache.get_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertAlmostEqual(stats["hit_rate"], 0.5)
+
+        os.remove(os.path.join(self.cache_dir, "vid-b.mp4"))
+        added, removed = cache.reconcile()
+        self.assertEqual((added, removed), (0, 1))
+
+    def test_lru_eviction(self):
+        cache = mc.MaterialCache(self.cache_dir)
+        cache.max_size = 250
+
+        old = self._write_clip("vid-old.mp4", 100)
+        cache.put(old, url="https://example.com/old.mp4", search_term="ocean")
+        time.sleep(0.01)
+        recent = self._write_clip("vid-recent.mp4", 100)
+        cache.put(recent, url="https://example.com/recent.mp4", search_term="ocean")
+        time.sleep(0.01)
+        cache.get(old)
+
+        newest = self._write_clip("vid-new.mp4", 100)
+        cache.put(newest, url="https://example.com/new.mp4", search_term="forest")
+
+        self.assertTrue(os.path.exists(old))
+        self.assertFalse(os.path.exists(recent))
+        self.assertTrue(os.path.exists(newest))
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+        self.assertEqual(len(cache.find_by_term("ocean")), 1)
+
+    def test_adopted_clip_keeps_its_url(self):
+        path = self._write_clip("vid-adopted.mp4", 100)
+        semantic_video.save_video_metadata(
+            path, "ocean", {"source_url": "https://example.com/adopted.mp4?token=1"}
+        )
+        cache = mc.MaterialCache(self.cache_dir)
+        self.assertTrue(cache.has_url("https://example.com/adopted.mp4?token=2"))
+
+    def test_find_by_term_matches_literal_terms(self):
+        cache = mc.MaterialCache(self.cache_dir)
+        cache.put(self._write_clip("vid-vi.mp4", 10), search_term="bãi biển")
+        cache.put(self._write_clip("vid-pct.mp4", 10), search_term="100% cotton")
+        cache.put(self._write_clip("vid-x.mp4", 10), search_term="100x cotton")
+        cache.put(self._write_clip("vid-q.mp4", 10), search_term='the "big" city')
+
+        self.assertEqual([e["path"] for e in cache.find_by_term("bãi biển")], ["vid-vi.mp4"])
+        self.assertEqual([e["path"] for e in cache.find_by_term("100% cotton")], ["vid-pct.mp4"])
+        self.assertEqual([e["path"] for e in cache.find_by_term('the "big" city')], ["vid-q.mp4"])
+        self.assertEqual(cache.find_by_term("bãi"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.models.schema import VideoAspect
+from app.services import material_library as ml
+from app.services import semantic_video
+from app.services.embedding_store import EmbeddingStore
+
+resources_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources")
+
+
+class TestMaterialLibrary(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.library_dir = os.path.join(self.temp_dir.name, "library")
+        os.makedirs(os.path.join(self.library_dir, "city night"))
+        shutil.copy(os.path.join(resources_dir, "1.png.mp4"), os.path.join(self.library_dir, "city night", "traffic_lights.mp4"))
+        shutil.copy(os.path.join(resources_dir, "2.png.mp4"), os.path.join(self.library_dir, "ocean-waves.mp4"))
+
+        # keep the index out of the real storage directory and run without models
+        patches = [
+            mock.patch.object(ml.utils, "storage_dir", lambda sub_dir="", create=False: self.temp_dir.name),
+            mock.patch.object(ml.MaterialLibrary, "_encode_texts", lambda self, texts: None),
+            mock.patch.dict(ml.config.app, {"library_clip_embeddings": False}),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.library = ml.MaterialLibrary(self.library_dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_extract_tags(self):
+        tags = ml.extract_tags("city night/vid-0123456789abcdef-5s.mp4", {"search_term": "Busy Street"})
+        self.assertEqual(tags, ["busy street", "city", "night"])
+
+    def test_incremental_index_and_search(self):
+        self.assertEqual(self.library.index_once(), (2, 0))
+        self.assertEqual(self.library.index_once(), (0, 0))
+
+        items = self.library.search("night traffic", video_aspect=VideoAspect.landscape)
+        items += self.library.search("night traffic", video_aspect=VideoAspect.portrait)
+        self.assertEqual(len(items), 1)
+        self.assertTrue(items[0].url.endswith("traffic_lights.mp4"))
+        self.assertEqual(items[0].provider, "library")
+        self.assertGreater(items[0].duration, 0)
+
+        os.remove(os.path.join(self.library_dir, "ocean-waves.mp4"))
+        self.assertEqual(self.library.index_once(), (0, 1))
+        self.assertEqual(self.library.get_stats()["clips"], 1)
+
+    def test_model_change_reindexes(self):
+        self.assertEqual(self.library.index_once(), (2, 0))
+        with mock.patch.dict(ml.config.app, {"semantic_search_model": "all-MiniLM-L6-v2"}):
+            library = ml.MaterialLibrary(self.library_dir)
+        self.assertEqual(library.text_model, "all-MiniLM-L6-v2")
+        # embeddings of the previous model are dropped and every clip is embedded again
+        self.assertEqual(library.index_once(), (2, 0))
+        self.assertEqual(library.index_once(), (0, 0))
+
+    def test_keyframes_use_shared_inference_queue(self):
+        from app.services.image_similarity import ClipInferenceQueue
+
+        queue = mock.Mock()
+        queue.encode.side_effect = lambda kind, model_name, items: np.ones((len(items), 4), dtype=np.float32) / 2
+        with mock.patch.dict(ml.config.app, {"library_clip_embeddings": True}), \
+                mock.patch.object(ClipInferenceQueue, "get_instance", return_value=queue), \
+                mock.patch.object(ml.MaterialLibrary, "_keyframe", lambda self, path, duration: "frame"):
+            library = ml.MaterialLibrary(self.library_dir)
+            self.assertEqual(library.index_once(), (2, 0))
+        queue.encode.assert_called_once_with("image", library.clip_model, ["frame", "frame"])
+        self.assertIsNotNone(library._load_vectors()[2])
+
+
+class _RawScaleModel:
+    """Stand-in sentence encoder whose raw vectors are not unit length."""
+
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        vectors = np.array([[3.0, 4.0, float(len(text))] for text in texts])
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+class TestLibraryTextEmbeddings(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.model = _RawScaleModel()
+        store = EmbeddingStore("raw-scale", self.temp_dir.name)
+        manager = mock.Mock()
+        manager.get_sentence_transformer.return_value = self.model
+        patches = [
+            mock.patch.object(ml.utils, "storage_dir", lambda sub_dir="", create=False: self.temp_dir.name),
+            mock.patch.object(EmbeddingStore, "get_instance", lambda model_name, kind="text": store),
+            mock.patch("app.services.model_manager.ModelManager.get_instance", return_value=manager),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_library_stores_unit_vectors(self):
+        library = ml.MaterialLibrary(self.temp_dir.name)
+        library._encode_texts(["city night"])
+
+        # semantic selection reads the shared partition as unit vectors
+        vector = semantic_video.encode_texts_cached(self.model, ["city night"])[0]
+        self.assertAlmostEqual(float(np.linalg.norm(vector)), 1.0, places=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import unittest
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import material
+from app.services.memory_cache import MemoryCache, cache_stats, estimate_size
+
+resources_dir = Path(__file__).parent.parent / "resources"
+
+
+class TestMemoryCache(unittest.TestCase):
+    def test_sizes(self):
+        self.assertEqual(estimate_size(np.zeros(128, dtype=np.float32)), 512)
+        self.assertEqual(estimate_size(b"abcd"), 4)
+        self.assertEqual(estimate_size("héllo"), 6)
+        self.assertGreater(estimate_size({"a": np.zeros(10)}), 80)
+
+    def test_lru_eviction_by_bytes(self):
+        cache = MemoryCache("test_lru", max_bytes=1024, stripes=1)
+        for i in range(3):
+            cache.put(i, np.zeros(64, dtype=np.float32))  # 256 bytes each
+        cache.get(0)  # 0 is now the most recently used
+        cache.put(3, np.zeros(64, dtype=np.float32))
+        cache.put(4, np.zeros(64, dtype=np.float32))
+        self.assertIn(0, cache)
+        self.assertNotIn(1, cache)
+        self.assertEqual(cache.bytes, 1024)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_replacing_a_key_keeps_accounting(self):
+        cache = MemoryCache("test_replace", max_bytes=1000, stripes=1)
+        cache.put("k", b"x" * 100)
+        cache.put("k", b"x" * 300)
+        self.assertEqual((len(cache), cache.bytes), (1, 300))
+        self.assertEqual(cache.pop("k"), b"x" * 300)
+        self.assertEqual(cache.bytes, 0)
+
+    def test_oversized_values_are_not_stored(self):
+        cache = MemoryCache("test_oversized", max_bytes=100, stripes=1)
+        self.assertFalse(cache.put("big", b"x" * 101))
+        self.assertNotIn("big", cache)
+
+    def test_ttl(self):
+        cache = MemoryCache("test_ttl", max_bytes=1000, ttl=0.05)
+        cache.put("k", b"v")
+        self.assertEqual(cache.get("k"), b"v")
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.expirations, 1)
+        self.assertEqual(cache.bytes, 0)
+
+    def test_stats_and_get_or_compute(self):
+        cache = MemoryCache("test_stats", max_bytes=1000)
+        calls = []
+        for _ in range(3):
+            cache.get_or_compute("k", lambda: calls.append(1) or b"value")
+        self.assertEqual(len(calls), 1)
+        stats = cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+        self.assertIn("test_stats", [s["name"] for s in cache_stats()])
+
+    def test_concurrent_access_stays_within_budget(self):
+        cache = MemoryCache("test_threads", max_bytes=64 * 1024, stripes=8)
+
+        def worker(offset):
+            for i in range(2000):
+                key = (offset + i) % 500
+                if cache.get(key) is None:
+                    cache.put(key, b"x" * 256)
+
+        threads = [threading.Thread(target=worker, args=(n * 100,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(cache.bytes, 64 * 1024)
+        self.assertEqual(cache.bytes, 256 * len(cache))
+        self.assertEqual(cache.hits + cache.misses, 16000)
+
+
+class TestProbeCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.video_path = os.path.join(self.temp_dir, "clip.mp4")
+        shutil.copy(resources_dir / "1.png.mp4", self.video_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_probe_is_cached_until_the_file_changes(self):
+        probe = material.probe_clip(self.video_path)
+        self.assertAlmostEqual(probe["duration"], 3.0, places=1)
+        hits = material._probe_cache.hits
+        self.assertEqual(material.probe_clip(self.video_path), probe)
+        self.assertEqual(material._probe_cache.hits, hits + 1)
+
+        with open(self.video_path, "r+b") as f:
+            f.truncate(os.path.getsize(self.video_path) // 2)
+        self.assertEqual(material.probe_clip(self.video_path), {})
+        # unlike _probe_video, the clip is left in place
+        self.assertTrue(os.path.exists(self.video_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import subprocess
+import unittest
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import imageio_ffmpeg
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services.utils import mp3
+
+# MPEG-2 layer III, 48 kbps, 24 kHz, mono (the Edge TTS output format): 144 bytes, 24 ms per frame
+FRAME = b"\xff\xf3\x64\xc4" + bytes(140)
+
+
+class TestMp3(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def _write(self, name, data):
+        path = os.path.join(self.temp_dir.name, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_parse_header(self):
+        self.assertEqual(mp3.parse_header(FRAME[:4]), (144, 576, 24000))
+        # MPEG-1 layer III, 128 kbps, 44.1 kHz, padded
+        self.assertEqual(mp3.parse_header(b"\xff\xfb\x92\x00"), (418, 1152, 44100))
+        self.assertIsNone(mp3.parse_header(b"\xff\xf3\xf4\xc4"))  # bad bitrate index
+        self.assertIsNone(mp3.parse_header(b"ID3\x04"))
+
+    def test_chunked_feed_skips_tag_and_junk(self):
+        tag = b"ID3\x04\x00\x00\x00\x00\x00\x05" + bytes(5)
+        data = tag + FRAME * 10 + b"junk" + FRAME * 15
+        counter = mp3.FrameCounter()
+        for i in range(0, len(data), 7):
+            counter.feed(data[i:i + 7])
+        self.assertEqual(counter.frames, 25)
+        self.assertEqual(counter.sample_rate, 24000)
+        self.assertAlmostEqual(counter.duration, 0.6)
+
+    def test_encoded_file(self):
+        path = os.path.join(self.temp_dir.name, "tone.mp3")
+        subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-f", "lavfi", "-i", "sine=duration=2:sample_rate=24000",
+             "-ac", "1", "-b:a", "48k", path],
+            check=True,
+        )
+        # the encoder's Xing/Info frame does not count, the priming delay does
+        self.assertAlmostEqual(mp3.duration(path), 2.0, delta=0.1)
+
+    def test_concat_adds_durations(self):
+        first = self._write("a.mp3", FRAME * 10)
+        second = self._write("b.mp3", b"ID3\x04\x00\x00\x00\x00\x00\x00" + FRAME * 5)
+        output = os.path.join(self.temp_dir.name, "out.mp3")
+        mp3.concat([first, second], output)
+        self.assertEqual(os.path.getsize(output), len(FRAME) * 15)
+        self.assertAlmostEqual(mp3.duration(output), mp3.duration(first) + mp3.duration(second))
+
+    def test_concurrent_concat_to_one_path(self):
+        parts = [self._write(f"{i}.mp3", FRAME * 200) for i in range(3)]
+        output = os.path.join(self.temp_dir.name, "out.mp3")
+        threads = [threading.Thread(target=mp3.concat, args=(parts, output)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # each thread writes its own temp file, the last rename wins intact
+        self.assertEqual(os.path.getsize(output), len(FRAME) * 600)
+        self.assertEqual([n for n in os.listdir(self.temp_dir.name) if n.endswith(".part")], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import os
+import sys
+from pathlib import Path
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services.utils import mp4
+
+resources_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources")
+
+
+class TestMp4(unittest.TestCase):
+    def setUp(self):
+        self.video_path = os.path.join(resources_dir, "2.png.mp4")
+
+    def test_parse_file(self):
+        movie, mdat_complete = mp4.parse_file(self.video_path)
+        self.assertTrue(mdat_complete)
+        self.assertAlmostEqual(movie.duration_seconds, 3.0, places=1)
+
+        video = movie.video_track
+        self.assertIsNotNone(video)
+        self.assertEqual(video.codec, "avc1")
+        self.assertEqual(len(video.sample_sizes), len(video.sample_offsets))
+        self.assertGreater(video.fps, 0)
+
+    def test_locate_moov(self):
+        with open(self.video_path, "rb") as f:
+            head = f.read(1024)
+        # resource files are not faststart: mdat comes before moov
+        offset, size, faststart = mp4.locate_moov(head)
+        self.assertIsNone(offset)
+        self.assertFalse(faststart)
+
+    def test_window_byte_range(self):
+        movie, _ = mp4.parse_file(self.video_path)
+        keyframe_time, first_byte, last_byte = mp4.window_byte_range(movie, 1.0, 2.0)
+        self.assertLessEqual(keyframe_time, 1.0)
+        self.assertLess(first_byte, last_byte)
+        self.assertLessEqual(last_byte, os.path.getsize(self.video_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import json
+import os
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import onnx_backend
+from app.services.model_manager import ModelManager
+
+
+class _Tokenizer:
+    """Tokenises into character codes, padded to the longest text of the batch."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts, padding=True, truncation=True, max_length=16, return_tensors="np"):
+        self.batches.append(list(texts))
+        width = min(max(len(t) for t in texts), max_length)
+        ids = np.zeros((len(texts), width), dtype=np.int32)
+        mask = np.zeros((len(texts), width), dtype=np.int32)
+        for row, text in enumerate(texts):
+            codes = [ord(c) for c in text[:width]]
+            ids[row, : len(codes)] = codes
+            mask[row, : len(codes)] = 1
+        return {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+
+
+class _Session:
+    """Embeds a row as (token count, first token id); only declares the inputs the graph takes."""
+
+    def __init__(self, inputs=("input_ids", "attention_mask")):
+        self.inputs = inputs
+        self.feeds = []
+
+    def get_inputs(self):
+        return [SimpleNamespace(name=name) for name in self.inputs]
+
+    def run(self, output_names, feeds):
+        self.feeds.append(feeds)
+        if "pixel_values" in feeds:
+            return [feeds["pixel_values"].reshape(len(feeds["pixel_values"]), -1)[:, :2]]
+        counts = feeds["attention_mask"].sum(axis=1)
+        return [np.stack([counts, feeds["input_ids"][:, 0]], axis=1).astype(np.float32)]
+
+
+class TestOnnxSentenceEncoder(unittest.TestCase):
+    def setUp(self):
+        self.session = _Session()
+        self.tokenizer = _Tokenizer()
+        self.encoder = onnx_backend.OnnxSentenceEncoder("test-model", self.session, self.tokenizer, 16)
+
+    def test_encode_keeps_input_order(self):
+        texts = ["a", "ccc", "bb", "dddd"]
+        vectors = self.encoder.encode(texts, batch_size=2)
+        self.assertEqual(vectors.shape, (4, 2))
+        self.assertEqual(vectors[:, 0].tolist(), [1, 3, 2, 4])
+        self.assertEqual(vectors[:, 1].tolist(), [ord("a"), ord("c"), ord("b"), ord("d")])
+
+    def test_batches_are_length_sorted(self):
+        self.encoder.encode(["a", "ccc", "bb", "dddd"], batch_size=2)
+        self.assertEqual(self.tokenizer.batches, [["dddd", "ccc"], ["bb", "a"]])
+
+    def test_feeds_only_graph_inputs_as_int64(self):
+        self.encoder.encode(["hello"])
+        feeds = self.session.feeds[0]
+        self.assertEqual(set(feeds), {"input_ids", "attention_mask"})
+        self.assertTrue(all(v.dtype == np.int64 for v in feeds.values()))
+
+    def test_single_string_and_normalisation(self):
+        vector = self.encoder.encode("abc", normalize_embeddings=True)
+        self.assertEqual(vector.shape, (2,))
+        self.assertAlmostEqual(float(np.linalg.norm(vector)), 1.0, places=5)
+
+    def test_empty_input(self):
+        self.assertEqual(len(self.encoder.encode([])), 0)
+
+
+class TestOnnxClipModel(unittest.TestCase):
+    def test_features_are_torch_tensors(self):
+        model = onnx_backend.OnnxClipModel("clip", _Session(), _Session(inputs=("pixel_values",)))
+        self.assertIs(model.to("cpu"), model)
+        text = model.get_text_features(input_ids=np.array([[5, 6]]), attention_mask=np.array([[1, 1]]))
+        self.assertEqual(text.tolist(), [[2.0, 5.0]])
+        image = model.get_image_features(pixel_values=np.ones((3, 3, 2, 2)))
+        self.assertEqual(tuple(image.shape), (3, 2))
+
+
+class TestParity(unittest.TestCase):
+    def test_cosine_parity_is_lowest_row(self):
+        expected = np.array([[1.0, 0.0], [0.0, 1.0]])
+        actual = np.array([[2.0, 0.0], [1.0, 1.0]])
+        self.assertAlmostEqual(onnx_backend.cosine_parity(expected, actual), np.sqrt(0.5), places=5)
+
+    def test_failed_export_is_removed_and_not_retried(self):
+        with tempfile.TemporaryDirectory() as directory:
+            Path(directory, "model.onnx").write_bytes(b"graph")
+            with mock.patch.dict(onnx_backend.config.app, {"onnx_parity_threshold": 0.99}):
+                self.assertFalse(onnx_backend._check_parity("m", directory, {"text": 0.9}))
+            self.assertFalse(os.path.exists(os.path.join(directory, "model.onnx")))
+            with open(os.path.join(directory, onnx_backend.EXPORT_FILE)) as f:
+                self.assertFalse(json.load(f)["passed"])
+            with self.assertRaises(RuntimeError):
+                onnx_backend._exported("m", directory)
+
+    def test_passed_export_is_reused(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(onnx_backend._exported("m", directory))
+            self.assertTrue(onnx_backend._check_parity("m", directory, {"text": 0.999}))
+            onnx_backend._write_export(directory, {"model": "m", "passed": True})
+            self.assertEqual(onnx_backend._exported("m", directory)["model"], "m")
+
+
+class TestModelManagerBackend(unittest.TestCase):
+    def setUp(self):
+        ModelManager.reset_instance()
+        self.manager = ModelManager.get_instance()
+        self.manager._device = "cpu"
+
+    def tearDown(self):
+        ModelManager.reset_instance()
+
+    def test_onnx_encoder_is_used_on_cpu(self):
+        encoder = object()
+        with mock.patch.object(onnx_backend, "backend_enabled", return_value=True), \
+                mock.patch.object(onnx_backend, "ONNX_AVAILABLE", True), \
+                mock.patch.object(onnx_backend, "load_sentence_encoder", return_value=encoder) as load:
+            self.assertIs(self.manager.get_sentence_transformer("m"), encoder)
+            self.assertIs(self.manager.get_sentence_transformer("m"), encoder)
+            self.assertEqual(load.call_count, 1)
+            self.assertEqual(self.manager.get_status()["inference_backend"], "onnx")
+
+    def test_torch_is_kept_on_gpu_and_without_onnxruntime(self):
+        with mock.patch.object(onnx_backend, "backend_enabled", return_value=True):
+            with mock.patch.object(onnx_backend, "ONNX_AVAILABLE", False):
+                self.assertFalse(self.manager._use_onnx())
+            with mock.patch.object(onnx_backend, "ONNX_AVAILABLE", True):
+                self.manager._device = "cuda"
+                self.assertFalse(self.manager._use_onnx())
+
+
+if __name__ == "__main__":
+    unittest.main()
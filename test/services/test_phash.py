@@ -0,0 +1,43 @@
+import unittest
+import os
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from moviepy.config import FFMPEG_BINARY
+
+from app.services.utils import phash
+
+resources_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "resources")
+
+
+class TestPhash(unittest.TestCase):
+    def test_resized_image_is_near_duplicate(self):
+        with Image.open(os.path.join(resources_dir, "1.png")) as image:
+            original = phash.hash_image(image)
+            smaller = phash.hash_image(image.resize((image.width // 3, image.height // 3)))
+        self.assertLessEqual(phash.distance(original, smaller), 4)
+
+    def test_different_images_are_far_apart(self):
+        with Image.open(os.path.join(resources_dir, "1.png")) as a, Image.open(os.path.join(resources_dir, "4.png")) as b:
+            self.assertGreater(phash.distance(phash.hash_image(a), phash.hash_image(b)), 10)
+
+    def test_video_matches_its_source_image(self):
+        with Image.open(os.path.join(resources_dir, "2.png")) as image:
+            image_hash = phash.hash_image(image)
+        video_hash = phash.hash_video(os.path.join(resources_dir, "2.png.mp4"), 3.0, ffmpeg=FFMPEG_BINARY)
+        self.assertIsNotNone(video_hash)
+        self.assertLessEqual(phash.distance(image_hash, video_hash), 6)
+
+    def test_hex_round_trip(self):
+        value = 0x0123456789ABCDEF
+        self.assertEqual(phash.from_hex(phash.to_hex(value)), value)
+        self.assertEqual(phash.to_hex(None), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import semantic_video
+from app.services.embedding_store import EmbeddingStore
+
+
+class _BagOfWordsModel:
+    """Stand-in encoder: one dimension per known word, so similarities are predictable."""
+
+    vocabulary = ["ocean", "city", "forest", "night"]
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        self.calls += 1
+        vectors = np.array(
+            [[1.0 if word in text.lower() else 0.0 for word in self.vocabulary] + [0.01] for text in texts]
+        )
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+class TestSemanticVideo(unittest.TestCase):
+    def setUp(self):
+        self.model = _BagOfWordsModel()
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        store = EmbeddingStore("bag-of-words", temp_dir.name)
+        for patcher in (
+            mock.patch.object(semantic_video, "load_model", lambda *args, **kwargs: self.model),
+            mock.patch.object(EmbeddingStore, "get_instance", lambda model_name, kind="text": store),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_similarity_matrix_is_batched(self):
+        sentences = ["Waves on the ocean", "The city at night"]
+        terms = ["ocean", "city", "ocean", "forest"]
+        matrix = semantic_video.compute_similarity_matrix(sentences, terms)
+
+        self.assertEqual(matrix.shape, (2, 4))
+        self.assertEqual(self.model.calls, 2)
+
+        # search terms come from the embedding store the second time
+        semantic_video.compute_similarity_matrix(sentences, terms)
+        self.assertEqual(self.model.calls, 3)
+        self.assertEqual(int(np.argmax(matrix[0])), 0)
+        self.assertAlmostEqual(matrix[0][0], matrix[0][2], places=3)
+        self.assertEqual(int(np.argmax(matrix[1])), 1)
+
+    def test_find_best_video_uses_matrix_row(self):
+        videos = [{"video_path": "a.mp4", "search_term": "ocean"}, {"video_path": "b.mp4", "search_term": "city"}]
+        best, scores = semantic_video.find_best_video_for_sentence(
+            "anything", videos, {}, text_similarities=[0.2, 0.9]
+        )
+        self.assertEqual(best["video_path"], "b.mp4")
+        self.assertAlmostEqual(scores["text_similarity"], 0.9)
+        self.assertEqual(self.model.calls, 0)
+
+
+class TestGlobalAssignment(unittest.TestCase):
+    def _greedy_total(self, scores, max_video_reuse):
+        usage = {}
+        total = 0.0
+        for row in scores:
+            unused = max_video_reuse == 1 and any(usage.get(v, 0) == 0 for v in range(len(row)))
+            adjusted = [
+                row[v] - semantic_video.diversity_penalty_for(usage.get(v, 0), max_video_reuse, unused)
+                for v in range(len(row))
+            ]
+            best = int(np.argmax(adjusted))
+            usage[best] = usage.get(best, 0) + 1
+            total += adjusted[best]
+        return total
+
+    def _total(self, scores, assignment, max_video_reuse):
+        usage = {}
+        total = 0.0
+        for row, video in enumerate(assignment):
+            total += scores[row][video] - semantic_video.diversity_penalty_for(usage.get(video, 0), max_video_reuse)
+            usage[video] = usage.get(video, 0) + 1
+        return total
+
+    def test_solver_matches_or_beats_greedy(self):
+        rng = np.random.default_rng(7)
+        for selections, max_video_reuse in ((15, 1), (30, 2)):
+            scores = rng.random((selections, 20))
+            assignment = semantic_video.solve_assignment(scores, max_video_reuse)
+            self.assertEqual(len(assignment), selections)
+            self.assertGreaterEqual(
+                self._total(scores, assignment, max_video_reuse) + 1e-9,
+                self._greedy_total(scores, max_video_reuse),
+            )
+
+    def test_solver_respects_reuse_limit(self):
+        scores = np.array([[0.9, 0.1], [0.8, 0.2], [0.7, 0.3]])
+        assignment = semantic_video.solve_assignment(scores, 2)
+        self.assertEqual(sorted(assignment), [0, 0, 1])
+
+        # more selections than slots: every selection still gets a video
+        self.assertEqual(len(semantic_video.solve_assignment(scores, 1)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
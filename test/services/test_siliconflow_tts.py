@@ -0,0 +1,95 @@
+import os
+import unittest
+import sys
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import voice as vs
+from app.services.utils import mp3
+
+# MPEG-2 layer III, 48 kbps, 24 kHz, mono: 24 ms per frame
+FRAME = b"\xff\xf3\x64\xc4" + bytes(140)
+text = "今天天气很好，我们去公园散步吧。"
+
+
+class _FakeResponse:
+    def __init__(self, status_code=200, chunks=()):
+        self.status_code = status_code
+        self.chunks = list(chunks)
+        self.text = "rate limited"
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        yield from self.chunks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.closed = True
+
+
+class _FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def post(self, url, **kwargs):
+        self.calls.append(kwargs)
+        return self.responses.pop(0)
+
+
+class TestSiliconflowTts(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.voice_file = os.path.join(self.temp_dir.name, "audio.mp3")
+        patch = mock.patch.dict(vs.config.siliconflow, {"api_key": "test-key"})
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _tts(self, session):
+        with mock.patch.object(vs, "_get_siliconflow_session", return_value=session):
+            return vs.siliconflow_tts(text, "FunAudioLLM/CosyVoice2-0.5B", "FunAudioLLM/CosyVoice2-0.5B:alex",
+                                      1.0, self.voice_file)
+
+    def test_stream_is_written_as_it_arrives(self):
+        # 50 frames (1.2s), cut at arbitrary byte boundaries
+        data = FRAME * 50
+        response = _FakeResponse(chunks=[data[i:i + 1000] for i in range(0, len(data), 1000)])
+        session = _FakeSession([response])
+        sub_maker = self._tts(session)
+
+        self.assertTrue(session.calls[0]["stream"])
+        self.assertTrue(session.calls[0]["json"]["stream"])
+        self.assertEqual(session.calls[0]["timeout"], (10.0, 120.0))
+        self.assertTrue(response.closed)
+        with open(self.voice_file, "rb") as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(sub_maker.subs, ["今天天气很好", "我们去公园散步吧"])
+        # the sentences share the audio duration by character count
+        self.assertEqual(sub_maker.offset[0], (0, 5142857))
+        self.assertEqual(sub_maker.offset[-1][1], 5142857 + 6857142)
+        self.assertAlmostEqual(vs.get_audio_duration(sub_maker), mp3.duration(self.voice_file), places=2)
+
+    def test_errors_are_retried(self):
+        session = _FakeSession([
+            _FakeResponse(status_code=429),
+            _FakeResponse(chunks=[b"not audio"]),
+            _FakeResponse(chunks=[FRAME * 10]),
+        ])
+        sub_maker = self._tts(session)
+        self.assertEqual(len(session.calls), 3)
+        self.assertAlmostEqual(vs.get_audio_duration(sub_maker), 0.24, places=2)
+
+    def test_session_is_shared(self):
+        with mock.patch.object(vs, "_siliconflow_session", None):
+            self.assertIs(vs._get_siliconflow_session(), vs._get_siliconflow_session())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import os
+import unittest
+import sys
+import tempfile
+import wave
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from edge_tts import SubMaker
+
+# add project root to python path
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services import tts_cache, voice
+from app.services.tts_cache import TtsCache
+
+script = "The sun rises over the hills. Birds start to sing! A new day begins."
+
+
+class _FakeTts:
+    """Writes 0.1s of audio per word (as WAV, like Chatterbox) with one boundary per word."""
+
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, text, voice_name, voice_rate, voice_file, voice_volume=1.0):
+        self.texts.append(text)
+        words = text.split()
+        wav_file = voice_file.replace(".mp3", ".wav")
+        with wave.open(wav_file, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(16000)
+            f.writeframes(np.zeros(1600 * len(words), dtype=np.int16).tobytes())
+        sub_maker = voice.ensure_submaker_compatibility(SubMaker())
+        for i, word in enumerate(words):
+            sub_maker.subs.append(word)
+            sub_maker.offset.append((i * 1000000, i * 1000000 + 800000))
+        sub_maker._actual_audio_file = wav_file
+        return sub_maker
+
+
+class TestTtsCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cache = TtsCache(os.path.join(self.temp_dir.name, "cache"))
+        self.tts = _FakeTts()
+
+    def _synthesize(self, text, name="audio.mp3", voice_name="en-US-JennyNeural"):
+        voice_file = os.path.join(self.temp_dir.name, name)
+        return self.cache.synthesize(text, voice_name, 1.0, voice_file, tts=self.tts), voice_file
+
+    def test_split_sentences(self):
+        self.assertEqual(
+            tts_cache.split_sentences(script),
+            ["The sun rises over the hills.", "Birds start to sing!", "A new day begins."],
+        )
+        self.assertEqual(tts_cache.split_sentences("今天天气很好。我们去公园吧！"), ["今天天气很好。", "我们去公园吧！"])
+        self.assertEqual(tts_cache.split_sentences("Line one\nLine  two"), ["Line one", "Line two"])
+
+    def test_offsets_are_shifted_per_sentence(self):
+        sub_maker, voice_file = self._synthesize(script)
+        self.assertEqual(len(self.tts.texts), 3)
+        self.assertEqual(sub_maker.subs, script.split())
+        # "Birds" follows the 6 words (0.6s) of the first sentence
+        self.assertEqual(sub_maker.offset[6], (6000000, 6800000))
+        self.assertEqual(sub_maker.offset[10], (10000000, 10800000))
+        self.assertEqual(sub_maker._actual_audio_file, voice_file)
+        self.assertAlmostEqual(tts_cache.audio_duration(voice_file), 1.4, places=1)
+
+    def test_only_new_sentences_are_synthesized(self):
+        self._synthesize(script)
+        self.tts.texts.clear()
+        edited = script.replace("Birds start to sing!", "Dogs start to bark!")
+        sub_maker, _ = self._synthesize(edited, name="edited.mp3")
+        self.assertEqual(self.tts.texts, ["Dogs start to bark!"])
+        self.assertEqual(sub_maker.subs, edited.split())
+        self.assertEqual(self.cache.get_stats()["hits"], 2)
+
+    def test_key_covers_voice_rate_and_whitespace(self):
+        key = TtsCache.key("Hello  world.", "en-US-JennyNeural", 1.0)
+        self.assertEqual(key, TtsCache.key(" Hello world. ", "en-US-JennyNeural", 1.0))
+        self.assertNotEqual(key, TtsCache.key("Hello world.", "en-US-GuyNeural", 1.0))
+        self.assertNotEqual(key, TtsCache.key("Hello world.", "en-US-JennyNeural", 1.2))
+
+    def test_failed_sentence_fails_the_script(self):
+        failing = mock.Mock(return_value=None)
+        voice_file = os.path.join(self.temp_dir.name, "failed.mp3")
+        self.assertIsNone(self.cache.synthesize(script, "en-US-JennyNeural", 1.0, voice_file, tts=failing))
+
+    def test_lru_eviction(self):
+        self._synthesize(script)
+        self.cache.max_size = 1
+        # just used: may be about to be assembled by another task
+        self.assertEqual(self.cache.evict(), 0)
+        with mock.patch.object(tts_cache, "_eviction_grace_seconds", 0):
+            self.assertEqual(self.cache.evict(), 3)
+        self.assertEqual([files for _, _, files in os.walk(self.cache.cache_dir) if files], [])
+
+    def test_eviction_tolerates_files_removed_concurrently(self):
+        self._synthesize(script)
+        self.cache.max_size = 1
+        real_remove = os.remove
+
+        def remove(path):
+            # another worker evicted the same sentence first
+            real_remove(path)
+            raise FileNotFoundError(path)
+
+        with mock.patch.object(tts_cache, "_eviction_grace_seconds", 0), \
+                mock.patch.object(tts_cache.os, "remove", side_effect=remove):
+            self.assertEqual(self.cache.evict(), 3)
+        self.assertEqual([files for _, _, files in os.walk(self.cache.cache_dir) if files], [])
+
+    def test_eviction_is_rate_limited(self):
+        with mock.patch.object(self.cache, "evict", wraps=self.cache.evict) as evict:
+            self._synthesize(script)
+            self._synthesize("Another sentence entirely.", name="other.mp3")
+        self.assertEqual(evict.call_count, 1)
+
+    def test_cache_is_for_edge_voices_by_default(self):
+        with mock.patch.dict(tts_cache.config.app, {"tts_cache": True, "tts_cache_all_voices": False}):
+            self.assertTrue(tts_cache.cache_enabled("en-US-JennyNeural"))
+            self.assertFalse(tts_cache.cache_enabled("siliconflow:FunAudioLLM/CosyVoice2-0.5B:alex"))
+            self.assertFalse(tts_cache.cache_enabled("chatterbox:default:Default Voice-Neutral"))
+            self.assertFalse(tts_cache.cache_enabled("en-US-AvaMultilingualNeural-V2"))
+        with mock.patch.dict(tts_cache.config.app, {"tts_cache": True, "tts_cache_all_voices": True}):
+            self.assertTrue(tts_cache.cache_enabled("gtts:en:English-US"))
+        with mock.patch.dict(tts_cache.config.app, {"tts_cache": False}):
+            self.assertFalse(tts_cache.cache_enabled("en-US-JennyNeural"))
+
+
+if __name__ == "__main__":
+    unittest.main()
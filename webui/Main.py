@@ -544,6 +544,8 @@ with middle_panel:
         video_sources = [
             (tr("Pexels"), "pexels"),
             (tr("Pixabay"), "pixabay"),
+            (tr("Federated search"), "federated"),
+            (tr("Material library"), "library"),
             (tr("Local file"), "local"),
             (tr("TikTok"), "douyin"),
             (tr("Bilibili"), "bilibili"),
@@ -1215,7 +1217,7 @@ if start_button:
         scroll_to_bottom()
         st.stop()
 
-    if params.video_source not in ["pexels", "pixabay", "local"]:
+    if params.video_source not in ["pexels", "pixabay", "federated", "library", "local"]:
         st.error(tr("Please Select a Valid Video Source"))
         scroll_to_bottom()
         st.stop()
@@ -1230,6 +1232,11 @@ if start_button:
         scroll_to_bottom()
         st.stop()
 
+    if params.video_source == "library" and not config.app.get("library_directory", ""):
+        st.error(tr("Please Set the Material Library Directory"))
+        scroll_to_bottom()
+        st.stop()
+
     if uploaded_files:
         local_videos_dir = utils.storage_dir("local_videos", create=True)
         for file in uploaded_files: